@@ -1,10 +1,12 @@
 from django.contrib import admin
-from .models import Appointment
+from .models import Appointment, AppointmentDailyRollup, AppointmentDayCount
 # Register your models here.
 
 @admin.register(Appointment)
 class AppointmentAdmin(admin.ModelAdmin):
     list_display = ['id','doctor', 'patient__user__username','appointment_type','appointment_status','time','cancel']
+    # time is nullable, so the admin won't follow it on its own.
+    list_select_related = ['doctor__user', 'patient__user', 'time']
     
     def doctor(self, obj):
         return obj.doctor
@@ -13,4 +15,20 @@ class AppointmentAdmin(admin.ModelAdmin):
         return obj.pateint
     
     def doctor(self, obj):
-        return obj.time
\ No newline at end of file
+        return obj.time
+
+@admin.register(AppointmentDayCount)
+class AppointmentDayCountAdmin(admin.ModelAdmin):
+    list_display = ['doctor', 'date', 'time', 'status', 'count']
+    list_filter = ['status', 'date']
+    list_select_related = ['doctor__user', 'time']
+    # Maintained by appointment.counters; use rebuild_appointment_counts to fix them.
+    readonly_fields = ['doctor', 'date', 'time', 'status', 'count']
+
+
+@admin.register(AppointmentDailyRollup)
+class AppointmentDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'doctor', 'appointment_type', 'status', 'count']
+    list_filter = ['appointment_type', 'status', 'date']
+    list_select_related = ['doctor__user']
+    readonly_fields = ['date', 'doctor', 'appointment_type', 'status', 'count']
@@ -0,0 +1,186 @@
+"""
+Batch create / update / cancel for appointments.
+
+Every id in a batch is resolved with one in_bulk() query per model, rows
+are written with bulk_create / bulk_update, and each item gets its own
+result. In atomic mode one bad item rejects the whole batch; in partial
+mode the good items are written and the bad ones reported.
+"""
+from collections import Counter
+from django.db import transaction
+from doctor.models import AvailableTime, Doctor, Slot
+from doctor.scheduling import SlotUnavailable, release_slot, reserve_slot
+from hospital_management.table_versions import mark_changed
+from .counters import apply_counts, count_changes
+from .models import Appointment
+from .serializers import BulkAppointmentSerializer
+
+MAX_ITEMS = 500
+
+
+class BatchFailed(Exception):
+    """Raised inside the transaction to roll an atomic batch back."""
+
+
+def _id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _field_ids(items, name):
+    ids = {_id(item.get(name)) for item in items if isinstance(item, dict)}
+    ids.discard(None)
+    return ids
+
+
+class AppointmentBatch:
+    def __init__(self, queryset, patient, context, create=(), update=(), cancel=(), atomic=True):
+        self.patient = patient
+        self.create, self.update, self.cancel = list(create), list(update), list(cancel)
+        self.atomic = atomic
+        self.results = {'create': [], 'update': [], 'cancel': []}
+        self.failed = False
+        items = self.create + self.update
+        self.context = {**context, 'in_bulk': {
+            Doctor: Doctor.objects.in_bulk(_field_ids(items, 'doctor')),
+            AvailableTime: AvailableTime.objects.in_bulk(_field_ids(items, 'time')),
+            Slot: Slot.objects.select_related('doctor').in_bulk(_field_ids(items, 'slot')),
+        }}
+        cancel_ids = {_id(value) for value in self.cancel} - {None}
+        self.instances = queryset.select_related('slot').in_bulk(_field_ids(self.update, 'id') | cancel_ids)
+
+    def fail(self, section, index, status, errors):
+        self.failed = True
+        self.results[section].append({'index': index, 'status': status, 'errors': errors})
+
+    def succeed(self, section, index, status, appointment):
+        self.results[section].append({'index': index, 'status': status, 'id': appointment.id})
+
+    def validate(self):
+        """Validate every item; returns (create, update, cancel) lists of what passed."""
+        creates, updates, cancels = [], [], []
+        for index, item in enumerate(self.create):
+            serializer = BulkAppointmentSerializer(data=item, context=self.context)
+            if serializer.is_valid():
+                creates.append((index, serializer.validated_data))
+            else:
+                self.fail('create', index, 'invalid', serializer.errors)
+
+        for index, item in enumerate(self.update):
+            instance = self.instances.get(_id(item.get('id'))) if isinstance(item, dict) else None
+            if instance is None:
+                self.fail('update', index, 'not_found', {'id': 'No such appointment.'})
+                continue
+            serializer = BulkAppointmentSerializer(instance, data=item, partial=True, context=self.context)
+            if serializer.is_valid():
+                updates.append((index, instance, serializer.validated_data))
+            else:
+                self.fail('update', index, 'invalid', serializer.errors)
+
+        for index, appointment_id in enumerate(self.cancel):
+            instance = self.instances.get(_id(appointment_id))
+            if instance is None:
+                self.fail('cancel', index, 'not_found', {'id': 'No such appointment.'})
+            else:
+                cancels.append((index, instance))
+        return creates, updates, cancels
+
+    def save(self):
+        creates, updates, cancels = self.validate()
+        if self.failed and self.atomic:
+            # Report the valid items as skipped, nothing is written.
+            for section, items in (('create', creates), ('update', updates), ('cancel', cancels)):
+                self.results[section] += [{'index': item[0], 'status': 'skipped'} for item in items]
+        else:
+            try:
+                with transaction.atomic():
+                    self.write(creates, updates, cancels)
+                    if self.failed and self.atomic:
+                        raise BatchFailed
+            except BatchFailed:
+                # Rolled back: the items that went through weren't written either.
+                for results in self.results.values():
+                    for result in results:
+                        if 'errors' not in result:
+                            result['status'] = 'skipped'
+                            result.pop('id')
+        for results in self.results.values():
+            results.sort(key=lambda result: result['index'])
+        return self.results
+
+    def write(self, creates, updates, cancels):
+        # (patient, slot) pairs that already hold a place, to keep the
+        # one-live-booking-per-slot rule without tripping the constraint.
+        slot_ids = {data['slot'].id for _, data in creates if data.get('slot')}
+        slot_ids |= {instance.slot_id for _, instance, _ in updates if instance.slot_id}
+        live = set(Appointment.objects.filter(slot__in=slot_ids, cancel=False).values_list('patient_id', 'slot_id'))
+        released = Counter()
+        changed, fields = {}, {'cancel'}
+        # Re-read the cancel flags under a row lock so two batches can't
+        # both cancel (and release) the same booking.
+        locked = Appointment.objects.select_for_update().filter(pk__in=list(self.instances))
+        for pk, cancel in locked.values_list('pk', 'cancel'):
+            self.instances[pk].cancel = cancel
+        counted_before = {pk: instance.counted_as for pk, instance in self.instances.items()}
+
+        # Cancels first, so their places are free for the rest of the batch.
+        for index, instance in cancels:
+            if not instance.cancel:
+                if instance.slot_id:
+                    released[instance.slot_id] += 1
+                    live.discard((instance.patient_id, instance.slot_id))
+                instance.cancel = True
+                changed[instance.pk] = instance
+            self.succeed('cancel', index, 'cancelled', instance)
+        for slot_id, count in released.items():
+            release_slot(slot_id, count)
+
+        for index, instance, data in updates:
+            uncancel = instance.cancel and data.get('cancel') is False
+            if instance.slot_id and not instance.cancel and data.get('cancel') is True:
+                release_slot(instance.slot_id)
+                live.discard((instance.patient_id, instance.slot_id))
+            elif instance.slot_id and uncancel:
+                if not self.take_place('update', index, instance.patient_id, instance.slot_id, live):
+                    continue
+            for name, value in data.items():
+                setattr(instance, name, value)
+            fields.update(data)
+            changed[instance.pk] = instance
+            self.succeed('update', index, 'updated', instance)
+
+        new = []
+        for index, data in creates:
+            slot = data.get('slot')
+            if slot and not self.take_place('create', index, self.patient.pk, slot.pk, live):
+                continue
+            new.append((index, Appointment(patient=self.patient, **data)))
+
+        if new:
+            Appointment.objects.bulk_create([appointment for _, appointment in new])
+            for index, appointment in new:
+                self.succeed('create', index, 'created', appointment)
+        if changed:
+            Appointment.objects.bulk_update(changed.values(), sorted(fields))
+        if new or changed:
+            # bulk_create / bulk_update skip the signals that keep the
+            # counters and table versions up to date.
+            apply_counts(count_changes(
+                [counted_before[pk] for pk in changed],
+                [instance.counted_as for instance in changed.values()] + [appointment.counted_as for _, appointment in new],
+            ))
+            mark_changed(Appointment)
+
+    def take_place(self, section, index, patient_id, slot_id, live):
+        if (patient_id, slot_id) in live:
+            self.fail(section, index, 'conflict', {'slot': 'This patient already has a booking for this slot.'})
+            return False
+        try:
+            reserve_slot(slot_id)
+        except SlotUnavailable:
+            self.fail(section, index, 'conflict', {'slot': 'This slot is no longer available.'})
+            return False
+        live.add((patient_id, slot_id))
+        return True
@@ -0,0 +1,84 @@
+"""
+Appointment counters: AppointmentDayCount (the doctor calendar) and
+AppointmentDailyRollup (the reports).
+
+Every appointment with a date is counted once in each table, under the
+key Appointment.counted_as gives. Saves and deletes move it between rows
+with single UPDATEs, so neither the calendar nor the reports ever group
+over the appointment table.
+"""
+from collections import Counter
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from .models import Appointment, AppointmentDailyRollup, AppointmentDayCount
+
+COUNTER_MODELS = (AppointmentDayCount, AppointmentDailyRollup)
+# The appointment fields counted_as reads: every counter key field but
+# status, which comes from appointment_status and cancel.
+COUNTED_FIELDS = [
+    *dict.fromkeys(field for model in COUNTER_MODELS for field in model.key_fields if field != 'status'),
+    'appointment_status', 'cancel',
+]
+
+
+def apply_counts(deltas):
+    """Add {(counter model, key): delta} to the counters."""
+    for (model, key), delta in deltas.items():
+        if not delta:
+            continue
+        fields = dict(zip(model.key_fields, key))
+        rows = model.objects.filter(**fields)
+        if rows.update(count=F('count') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(count=delta, **fields)
+        except IntegrityError:
+            # Someone else created the row first.
+            rows.update(count=F('count') + delta)
+
+
+def count_changes(before, after):
+    """
+    Counter deltas for appointments going from `before` to `after`, both
+    lists of Appointment.counted_as values.
+    """
+    deltas = Counter()
+    for counted_as in after:
+        deltas.update(counted_as)
+    for counted_as in before:
+        deltas.subtract(counted_as)
+    return deltas
+
+
+def rebuild_counts(batch_size=1000):
+    """Recompute every counter from the appointment table. Returns the number of rows written."""
+    rows = (
+        Appointment.objects.filter(date__isnull=False).order_by()
+        .values('doctor_id', 'date', 'time_id', 'appointment_type', 'appointment_status')
+        .annotate(
+            live=Count('id', filter=Q(cancel=False)),
+            cancelled=Count('id', filter=Q(cancel=True)),
+        )
+    )
+    counts = Counter()
+    for row in rows.iterator():
+        for cancel, count in ((False, row['live']), (True, row['cancelled'])):
+            appointment = Appointment(
+                doctor_id=row['doctor_id'], date=row['date'], time_id=row['time_id'], cancel=cancel,
+                appointment_type=row['appointment_type'], appointment_status=row['appointment_status'],
+            )
+            for key in appointment.counted_as:
+                counts[key] += count
+
+    written = 0
+    with transaction.atomic():
+        for model in COUNTER_MODELS:
+            model.objects.all().delete()
+            counters = [
+                model(count=count, **dict(zip(model.key_fields, key)))
+                for (counter_model, key), count in counts.items() if counter_model is model and count
+            ]
+            model.objects.bulk_create(counters, batch_size=batch_size)
+            written += len(counters)
+    return written
@@ -0,0 +1,90 @@
+"""
+Moving stale appointments through their lifecycle in bounded batches.
+
+Each rule walks the appointment table in primary key order (keyset
+iteration) and changes one batch per short transaction with a single
+UPDATE, so a large table is never locked for long. The last id done is
+saved in SweepProgress after every batch.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from doctor.scheduling import release_slot
+from hospital_management.table_versions import mark_changed
+from .counters import COUNTED_FIELDS, apply_counts, count_changes
+from .models import Appointment, SweepProgress
+
+# rule: (rows it applies to, changes it makes)
+RULES = {
+    # Started but never closed: done by now.
+    'complete': ({'appointment_status': 'Runing', 'cancel': False}, {'appointment_status': 'Complated'}),
+    # Never started: expired, cancelled as a no-show.
+    'expire': ({'appointment_status': 'Pendding', 'cancel': False}, {'cancel': True}),
+}
+
+
+def stale_appointments(rule, cutoff):
+    """
+    Appointments `rule` applies to that are dated before `cutoff`. Rows
+    from before appointments had a date go by their slot's start, and
+    legacy time-window bookings without one are always stale: every
+    booking made since is dated.
+    """
+    lookups, _ = RULES[rule]
+    cutoff_start = timezone.make_aware(datetime.combine(cutoff, time.min))
+    undated = Q(date__isnull=True) & (Q(slot__isnull=True) | Q(slot__start__lt=cutoff_start))
+    return Appointment.objects.filter(Q(date__lt=cutoff) | undated, **lookups)
+
+
+def default_cutoff(grace_days=1):
+    return timezone.localdate() - timedelta(days=grace_days)
+
+
+def sweep(rule, cutoff, batch_size=1000, restart=False):
+    """
+    Apply `rule` to every stale appointment, resuming after the last
+    finished batch unless `restart`. Yields the number of rows changed per
+    batch.
+    """
+    _, changes = RULES[rule]
+    progress, _ = SweepProgress.objects.get_or_create(rule=rule)
+    if restart or progress.finished_at or not progress.started_at:
+        progress.last_id, progress.rows = 0, 0
+        progress.started_at, progress.finished_at = timezone.now(), None
+        progress.save()
+
+    # Everything counted_as and booked_slot_id read, so the deltas below are right.
+    fields = ['pk', 'slot_id', *COUNTED_FIELDS]
+    while True:
+        with transaction.atomic():
+            rows = list(
+                stale_appointments(rule, cutoff).filter(pk__gt=progress.last_id)
+                .select_for_update(of=('self',)).order_by('pk').values_list(*fields)[:batch_size]
+            )
+            if not rows:
+                break
+            changed = Appointment.objects.filter(pk__in=[row[0] for row in rows]).update(**changes)
+
+            # UPDATE skips Appointment.save, so do its bookkeeping here.
+            before = [Appointment(**dict(zip(fields, row))) for row in rows]
+            after = [Appointment(**{**dict(zip(fields, row)), **changes}) for row in rows]
+            apply_counts(count_changes(
+                [appointment.counted_as for appointment in before],
+                [appointment.counted_as for appointment in after],
+            ))
+            released = Counter(appointment.booked_slot_id for appointment in before)
+            released.subtract(appointment.booked_slot_id for appointment in after)
+            for slot_id, count in released.items():
+                if slot_id and count:
+                    release_slot(slot_id, count)
+            mark_changed(Appointment)
+
+            progress.last_id = rows[-1][0]
+            progress.rows += changed
+            progress.save(update_fields=['last_id', 'rows'])
+        yield changed
+
+    progress.finished_at = timezone.now()
+    progress.save(update_fields=['finished_at'])
@@ -0,0 +1,76 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from appointment.models import Appointment
+from doctor.models import Doctor, Slot
+from doctor.scheduling import SlotUnavailable
+from patient.models import Patient
+
+
+class Command(BaseCommand):
+    help = (
+        'Fires parallel bookings at a handful of slots from several threads and '
+        'reports throughput and any overbooked slot. The rows it creates are '
+        'committed (threads need to see them) and deleted at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=500)
+        parser.add_argument('--slots', type=int, default=10)
+        parser.add_argument('--capacity', type=int, default=3)
+
+    def handle(self, *args, **options):
+        doctor_user = User.objects.create(username='bench_booking_doctor')
+        users = []
+        try:
+            doctor = Doctor.objects.create(user=doctor_user, fee=500)
+            start = timezone.now() + timedelta(days=1)
+            slots = Slot.objects.bulk_create([
+                Slot(doctor=doctor, start=start + timedelta(minutes=30 * i), end=start + timedelta(minutes=30 * (i + 1)),
+                     capacity=options['capacity'])
+                for i in range(options['slots'])
+            ])
+            users = User.objects.bulk_create([User(username=f'bench_booking_{i}') for i in range(options['attempts'])])
+            patients = Patient.objects.bulk_create([Patient(user=user) for user in users])
+            jobs = [(patient, slots[i % len(slots)]) for i, patient in enumerate(patients)]
+
+            def book(job):
+                patient, slot = job
+                try:
+                    Appointment.objects.create(patient=patient, doctor=doctor, slot=slot, appointment_type='Online', symptoms='-')
+                    return 'booked'
+                except SlotUnavailable:
+                    return 'full'
+                except OperationalError:  # e.g. SQLite's "database is locked"
+                    return 'error'
+                finally:
+                    connection.close()
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(options['threads']) as pool:
+                outcomes = Counter(pool.map(book, jobs))
+            elapsed = time.perf_counter() - started
+
+            overbooked = (
+                Slot.objects.filter(pk__in=[slot.pk for slot in slots])
+                .annotate(live=Count('appointments', filter=Q(appointments__cancel=False)))
+                .exclude(live=F('booked_count'))
+                .count()
+            ) + Slot.objects.filter(pk__in=[slot.pk for slot in slots], booked_count__gt=F('capacity')).count()
+            self.stdout.write(
+                f"{len(jobs)} attempts on {len(slots)} slots x {options['capacity']} places with {options['threads']} threads: "
+                f"{outcomes['booked']} booked, {outcomes['full']} full, {outcomes['error']} errors "
+                f"in {elapsed:.2f}s ({len(jobs) / elapsed:,.0f} attempts/s)"
+            )
+            self.stdout.write(f'Slots overbooked or out of step with their appointments: {overbooked}')
+        finally:
+            Appointment.objects.filter(doctor__user=doctor_user).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            doctor_user.delete()
@@ -0,0 +1,72 @@
+import time
+from urllib.parse import parse_qs, urlsplit
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from appointment.models import Appointment
+from appointment.views import AppointmentAPIView
+from doctor.models import AvailableTime, Doctor
+from hospital_management.paginations import KeysetOrPageNumberPagination
+from patient.models import Patient
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the cost of shallow and deep appointment pages with page-number '
+        'and keyset pagination. Runs in a transaction that is rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=10000, help='Deepest page to fetch')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        pages, page_size = options['pages'], options['page_size']
+        with transaction.atomic():
+            self.seed(pages * page_size)
+            deep_cursor = self.cursor_for_page(pages, page_size)
+            for label, params in [
+                ('page-number page 1', {'page': 1}),
+                (f'page-number page {pages}', {'page': pages}),
+                ('keyset page 1', {'pagination': 'keyset'}),
+                (f'keyset page {pages}', {'cursor': deep_cursor}),
+            ]:
+                params['limits'] = page_size
+                elapsed = self.time_page(params, options['repeat'])
+                self.stdout.write(f'{label:28} {elapsed:8.2f} ms')
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        user = User.objects.create(username='bench_pagination_patient')
+        patient = Patient.objects.get_or_create(user=user)[0]
+        doctor = Doctor.objects.create(user=User.objects.create(username='bench_pagination_doctor'), fee=500)
+        slot = AvailableTime.objects.create(time='9:00 AM - 12:00 PM')
+        Appointment.objects.bulk_create(
+            (Appointment(patient=patient, doctor=doctor, time=slot, appointment_type='Online', symptoms='-') for _ in range(count)),
+            batch_size=5000,
+        )
+        self.stdout.write(f'Seeded {count} appointments')
+
+    def paginate(self, params):
+        request = Request(APIRequestFactory().get('/appointments/', params))
+        paginator = KeysetOrPageNumberPagination()
+        return paginator, paginator.paginate_queryset(Appointment.objects.order_by('id'), request, AppointmentAPIView())
+
+    def cursor_for_page(self, page, page_size):
+        # Walk to the row just before the deep page once, outside the timing.
+        last_row = Appointment.objects.order_by('id')[(page - 1) * page_size - 1]
+        paginator = KeysetOrPageNumberPagination().keyset_class()
+        paginator.base_url = 'http://testserver/appointments/'
+        paginator.sort_field = Appointment._meta.get_field('id')
+        url = paginator.encode_cursor(last_row, reverse=False)
+        return parse_qs(urlsplit(url).query)['cursor'][0]
+
+    def time_page(self, params, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            paginator, rows = self.paginate(params)
+            paginator.get_paginated_response([row.pk for row in rows])
+        return (time.perf_counter() - started) / repeat * 1000
@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from appointment.lifecycle import RULES, default_cutoff, sweep
+
+
+class Command(BaseCommand):
+    help = (
+        'Closes stale appointments: running ones dated before the cutoff are '
+        'completed and pending ones are cancelled. Works in small batches and '
+        'resumes where an interrupted run stopped. Safe to run from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rules', default=','.join(RULES), help=f"Comma separated, any of: {', '.join(RULES)}")
+        parser.add_argument('--grace-days', type=int, default=1, help='Only touch appointments older than this many days')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows changed per transaction')
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to wait between batches')
+        parser.add_argument('--restart', action='store_true', help='Start from the beginning instead of resuming')
+
+    def handle(self, *args, **options):
+        rules = [rule.strip() for rule in options['rules'].split(',') if rule.strip()]
+        unknown = set(rules) - set(RULES)
+        if unknown:
+            raise CommandError(f"Unknown rules: {', '.join(sorted(unknown))}")
+        cutoff = default_cutoff(options['grace_days'])
+
+        for rule in rules:
+            started = time.perf_counter()
+            total = batches = 0
+            for changed in sweep(rule, cutoff, batch_size=options['batch_size'], restart=options['restart']):
+                total += changed
+                batches += 1
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'{rule}: {total} appointments before {cutoff} in {batches} batches, '
+                f'{elapsed:.2f}s ({total / elapsed if elapsed else 0:,.0f} rows/s)'
+            ))
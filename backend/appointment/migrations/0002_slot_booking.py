@@ -0,0 +1,30 @@
+# Generated by Django 5.1.11 on 2026-10-18 16:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0001_initial'),
+        ('doctor', '0006_slot_booking'),
+        ('patient', '0003_alter_patient_phone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='slot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='appointments', to='doctor.slot'),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='time',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='doctor.availabletime'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('cancel', False)), fields=('patient', 'slot'), name='unique_active_slot_booking'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.1.11 on 2026-10-18 17:00
+
+import django.db.models.deletion
+from collections import Counter
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_dates_and_counts(apps, schema_editor):
+    """Slot bookings get their date from the slot; then count every dated appointment."""
+    Appointment = apps.get_model('appointment', 'Appointment')
+    AppointmentDayCount = apps.get_model('appointment', 'AppointmentDayCount')
+    dated = []
+    for appointment in Appointment.objects.filter(slot__isnull=False, date__isnull=True).select_related('slot').iterator():
+        appointment.date = timezone.localdate(appointment.slot.start)
+        dated.append(appointment)
+    Appointment.objects.bulk_update(dated, ['date'], batch_size=1000)
+
+    counts = Counter(
+        (doctor_id, date, time_id, 'Cancelled' if cancel else status)
+        for doctor_id, date, time_id, cancel, status in Appointment.objects.filter(date__isnull=False)
+        .values_list('doctor_id', 'date', 'time_id', 'cancel', 'appointment_status').iterator()
+    )
+    AppointmentDayCount.objects.bulk_create([
+        AppointmentDayCount(doctor_id=doctor_id, date=date, time_id=time_id, status=status, count=count)
+        for (doctor_id, date, time_id, status), count in counts.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0002_slot_booking'),
+        ('doctor', '0006_slot_booking'),
+        ('patient', '0003_alter_patient_phone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentDayCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(max_length=50)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'date'], name='appointment_doctor_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='appointmentdaycount',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_day_counts', to='doctor.doctor'),
+        ),
+        migrations.AddField(
+            model_name='appointmentdaycount',
+            name='time',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='doctor.availabletime'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointmentdaycount',
+            constraint=models.UniqueConstraint(fields=('doctor', 'date', 'time', 'status'), name='unique_appointment_day_count'),
+        ),
+        migrations.RunPython(backfill_dates_and_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.11 on 2026-10-18 17:06
+
+import django.db.models.deletion
+from collections import Counter
+from django.db import migrations, models
+
+
+def build_rollups(apps, schema_editor):
+    Appointment = apps.get_model('appointment', 'Appointment')
+    AppointmentDailyRollup = apps.get_model('appointment', 'AppointmentDailyRollup')
+    counts = Counter(
+        (date, doctor_id, appointment_type, 'Cancelled' if cancel else status)
+        for date, doctor_id, appointment_type, cancel, status in Appointment.objects.filter(date__isnull=False)
+        .values_list('date', 'doctor_id', 'appointment_type', 'cancel', 'appointment_status').iterator()
+    )
+    AppointmentDailyRollup.objects.bulk_create([
+        AppointmentDailyRollup(date=date, doctor_id=doctor_id, appointment_type=appointment_type, status=status, count=count)
+        for (date, doctor_id, appointment_type, status), count in counts.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0004_sweepprogress'),
+        ('doctor', '0006_slot_booking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('appointment_type', models.CharField(choices=[('Online', 'Online'), ('Offline', 'Offline')], max_length=50)),
+                ('status', models.CharField(max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_rollups', to='doctor.doctor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'doctor', 'appointment_type', 'status'), name='unique_appointment_daily_rollup')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from patient.models import Patient
-from doctor.models import Doctor, AvailableTime
-from hospital_management.constant import APPOINTMENT_STATUS, APPOINTMENT_TYPE
+from doctor.models import Doctor, AvailableTime, Slot
+from doctor.scheduling import reserve_slot, release_slot
+from hospital_management.constant import APPOINTMENT_STATUS, APPOINTMENT_TYPE, CANCELLED
 # Create your models here.
 
 
@@ -11,8 +13,123 @@ class Appointment(models.Model):
     appointment_type = models.CharField(choices=APPOINTMENT_TYPE, max_length=50)
     appointment_status = models.CharField(choices=APPOINTMENT_STATUS, max_length=50, default='Pendding')
     symptoms = models.TextField()
-    time = models.ForeignKey(AvailableTime, on_delete=models.CASCADE)
+    # Either a legacy time window or a concrete slot.
+    time = models.ForeignKey(AvailableTime, on_delete=models.CASCADE, null=True, blank=True)
+    slot = models.ForeignKey(Slot, on_delete=models.RESTRICT, null=True, blank=True, related_name='appointments')
+    date = models.DateField(null=True, blank=True)
     cancel = models.BooleanField(default=False)
-    
+
+    class Meta:
+        constraints = [
+            # A patient can hold at most one live booking per slot.
+            models.UniqueConstraint(fields=['patient', 'slot'], condition=models.Q(cancel=False), name='unique_active_slot_booking'),
+        ]
+        indexes = [
+            # A doctor's queue for a day or a date range.
+            models.Index(fields=['doctor', 'date'], name='appointment_doctor_date_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.id}'
+
+    @property
+    def booked_slot_id(self):
+        """The slot this appointment currently holds a place in, if any."""
+        return None if self.cancel else self.slot_id
+
+    @property
+    def counted_as(self):
+        """
+        The counter rows this appointment is counted in, as (model, key)
+        pairs; none without a date. See appointment.counters.
+        """
+        if self.date is None:
+            return ()
+        status = CANCELLED if self.cancel else self.appointment_status
+        return (
+            (AppointmentDayCount, (self.doctor_id, self.date, self.time_id, status)),
+            (AppointmentDailyRollup, (self.doctor_id, self.date, self.appointment_type, status)),
+        )
+
+    def save(self, *args, **kwargs):
+        """
+        Keep the slot's booked_count in step with the appointment. The
+        reservation and the row write share one transaction, so a full slot
+        (SlotUnavailable) or a failed insert leaves both untouched. A slot
+        booking takes its date from the slot, any other one defaults to today.
+        """
+        if self.slot_id and self.date is None:
+            start = Slot.objects.filter(pk=self.slot_id).values_list('start', flat=True).first()
+            self.date = start and timezone.localdate(start)
+        elif self.date is None:
+            # As in the API: a time window without a date is for today.
+            self.date = timezone.localdate()
+        with transaction.atomic():
+            previous = Appointment.objects.select_for_update().filter(pk=self.pk).first() if self.pk else None
+            # Read back by the post_save signal that updates the day counters.
+            self._previous_counted_as = previous.counted_as if previous else ()
+            held = previous and previous.booked_slot_id
+            wanted = self.booked_slot_id
+            if wanted != held:
+                if wanted:
+                    reserve_slot(wanted)
+                if held:
+                    release_slot(held)
+            super().save(*args, **kwargs)
+
+
+class AppointmentDayCount(models.Model):
+    """
+    How many appointments a doctor has per day, available time and status
+    (cancelled ones are counted under CANCELLED). Kept up to date by
+    appointment.counters so the calendar never has to scan appointments.
+    """
+    key_fields = ('doctor_id', 'date', 'time_id', 'status')
+    doctor = models.ForeignKey(to=Doctor, on_delete=models.CASCADE, related_name='appointment_day_counts')
+    date = models.DateField()
+    time = models.ForeignKey(AvailableTime, on_delete=models.CASCADE, null=True, blank=True)
+    status = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date', 'time', 'status'], name='unique_appointment_day_count'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.doctor} - {self.date} - {self.status}: {self.count}"
+
+
+class AppointmentDailyRollup(models.Model):
+    """
+    Appointments per day, doctor, appointment type and status, for the
+    reports. Maintained like AppointmentDayCount.
+    """
+    key_fields = ('doctor_id', 'date', 'appointment_type', 'status')
+
+    date = models.DateField()
+    doctor = models.ForeignKey(to=Doctor, on_delete=models.CASCADE, related_name='appointment_rollups')
+    appointment_type = models.CharField(choices=APPOINTMENT_TYPE, max_length=50)
+    status = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Leads with date: reports always filter on a date range.
+            models.UniqueConstraint(fields=['date', 'doctor', 'appointment_type', 'status'], name='unique_appointment_daily_rollup'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.date} - {self.doctor} - {self.appointment_type} - {self.status}: {self.count}"
+
+
+class SweepProgress(models.Model):
+    """Where the last sweep_appointments run of a rule got to, so an interrupted run can resume."""
+    rule = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    rows = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
     def __str__(self) -> str:
-        return f'{self.id}'
\ No newline at end of file
+        return f"{self.rule} @ {self.last_id}"
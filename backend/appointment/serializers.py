@@ -1,4 +1,6 @@
+from django.utils import timezone
 from rest_framework import serializers
+from doctor.models import AvailableTime, Doctor, Slot
 from . import models
 
 
@@ -12,4 +14,48 @@ class AppointmentSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             "patient": {"read_only": True},
             "appointment_status": {"read_only": True},
+            "doctor": {"required": False},
         }
+
+    def validate(self, attrs):
+        slot = attrs.get('slot')
+        if self.instance:
+            # Moving a booking means cancelling it and booking the new slot.
+            if 'slot' in attrs and slot != self.instance.slot:
+                raise serializers.ValidationError({"slot": "A booked slot can't be changed, cancel and book again."})
+            return attrs
+        if slot:
+            if attrs.get('doctor', slot.doctor) != slot.doctor:
+                raise serializers.ValidationError({"doctor": "The slot belongs to another doctor."})
+            if slot.start <= timezone.now():
+                raise serializers.ValidationError({"slot": "This slot has already started."})
+            attrs['doctor'] = slot.doctor
+            attrs['date'] = timezone.localdate(slot.start)
+        elif not attrs.get('time'):
+            raise serializers.ValidationError("Either a time or a slot is required.")
+        elif not attrs.get('doctor'):
+            raise serializers.ValidationError({"doctor": "This field is required."})
+        else:
+            # A time window without a date is for today.
+            attrs.setdefault('date', timezone.localdate())
+        return attrs
+
+
+class InBulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Looks ids up in `context['in_bulk'][model]`, a dict loaded once for a
+    whole batch with in_bulk(), instead of running a query per item.
+    """
+    def to_internal_value(self, data):
+        try:
+            return self.context['in_bulk'][self.queryset.model][int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class BulkAppointmentSerializer(AppointmentSerializer):
+    doctor = InBulkPrimaryKeyRelatedField(queryset=Doctor.objects.all(), required=False)
+    time = InBulkPrimaryKeyRelatedField(queryset=AvailableTime.objects.all(), required=False, allow_null=True)
+    slot = InBulkPrimaryKeyRelatedField(queryset=Slot.objects.all(), required=False, allow_null=True)
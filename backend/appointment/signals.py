@@ -0,0 +1,29 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from doctor.scheduling import release_slot
+from hospital_management.table_versions import track_models
+from .counters import apply_counts, count_changes
+from .models import Appointment
+
+track_models(Appointment)
+
+
+@receiver(post_delete, sender=Appointment)
+def release_booked_slot(sender, instance, **kwargs):
+    """Give the slot back when a live booking is deleted (also on cascades)"""
+    if instance.booked_slot_id:
+        release_slot(instance.booked_slot_id)
+
+
+@receiver(post_save, sender=Appointment)
+def update_counts_on_save(sender, instance, **kwargs):
+    """Move the appointment to its new counter rows; Appointment.save stores the old ones"""
+    previous = getattr(instance, '_previous_counted_as', ())
+    current = instance.counted_as
+    if previous != current:
+        apply_counts(count_changes([previous], [current]))
+
+
+@receiver(post_delete, sender=Appointment)
+def update_counts_on_delete(sender, instance, **kwargs):
+    apply_counts(count_changes([instance.counted_as], []))
@@ -0,0 +1,11 @@
+from datetime import timedelta
+from task_queue.queue import task
+from .lifecycle import RULES, default_cutoff, sweep
+
+
+@task(every=timedelta(days=1))
+def sweep_appointments():
+    """What `sweep_appointments` does with its defaults, once a day."""
+    for rule in RULES:
+        for _ in sweep(rule, default_cutoff()):
+            pass
@@ -1,3 +1,477 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import threading
+from datetime import timedelta
+from types import SimpleNamespace
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from doctor.models import AvailableTime, Doctor, Slot
+from doctor.scheduling import SlotUnavailable
+from hospital_management.paginations import KeysetPagination
+from .counters import rebuild_counts
+from .lifecycle import sweep
+from .models import Appointment, AppointmentDailyRollup, AppointmentDayCount, SweepProgress
 
-# Create your tests here.
+
+class AppointmentTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='patient')
+        self.patient = self.user.patient
+        self.doctor = Doctor.objects.create(user=User.objects.create(username='doctor'), fee=500)
+        self.time = AvailableTime.objects.create(time='9:00 AM - 12:00 PM')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_appointments(self, count, **fields):
+        fields = {'patient': self.patient, 'doctor': self.doctor, 'time': self.time,
+                  'appointment_type': 'Online', 'symptoms': '-', **fields}
+        return Appointment.objects.bulk_create([Appointment(**fields) for _ in range(count)])
+
+
+class KeysetPaginationTest(AppointmentTestCase):
+    def test_walk_forward_and_back(self):
+        ids = [appointment.id for appointment in self.create_appointments(25)]
+        response = self.client.get('/appointments/', {'pagination': 'keyset', 'limits': 10})
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+
+        pages = [response.data]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).data)
+        self.assertEqual([row['id'] for page in pages for row in page['results']], ids)
+
+        back = self.client.get(pages[-1]['previous']).data
+        self.assertEqual([row['id'] for row in back['results']], ids[10:20])
+        back = self.client.get(back['previous']).data
+        self.assertEqual([row['id'] for row in back['results']], ids[:10])
+        self.assertIsNone(back['previous'])
+
+    def test_page_number_clients_keep_working(self):
+        self.create_appointments(3)
+        response = self.client.get('/appointments/', {'page': 1})
+        self.assertEqual(response.data['count'], 3)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/appointments/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_ties_on_sort_key_are_broken_by_id(self):
+        User.objects.bulk_create([User(username=f'user{i}', last_name=f'name{i % 3}') for i in range(12)])
+        view = SimpleNamespace(keyset_ordering='-last_name')
+        expected = list(User.objects.order_by('-last_name', '-id').values_list('id', flat=True))
+        seen, url = [], '/users/?limits=5'
+        while url:
+            paginator = KeysetPagination()
+            request = Request(APIRequestFactory().get(url))
+            seen += [user.id for user in paginator.paginate_queryset(User.objects.all(), request, view)]
+            url = paginator.next
+        self.assertEqual(seen, expected)
+
+
+class ConditionalAppointmentTest(AppointmentTestCase):
+    def test_validators_differ_per_user(self):
+        appointment = self.create_appointments(1)[0]
+        other = APIClient()
+        other.force_authenticate(User.objects.create(username='other'))
+        for url in ('/appointments/', f'/appointments/{appointment.id}/'):
+            response = self.client.get(url)
+            self.assertIn('Authorization', response['Vary'])
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+            self.assertEqual(other.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class SlotBookingTest(AppointmentTestCase):
+    def setUp(self):
+        super().setUp()
+        start = timezone.now() + timedelta(days=1)
+        self.slot, self.later = Slot.objects.bulk_create([
+            Slot(doctor=self.doctor, start=start, end=start + timedelta(minutes=30)),
+            Slot(doctor=self.doctor, start=start + timedelta(minutes=30), end=start + timedelta(minutes=60)),
+        ])
+
+    def book(self, slot, client=None):
+        return (client or self.client).post('/appointments/', {'slot': slot.id, 'appointment_type': 'Online', 'symptoms': '-'})
+
+    def test_booking_fills_the_slot(self):
+        response = self.book(self.slot)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['doctor'], self.doctor.id)
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.booked_count, 1)
+        self.assertTrue(self.slot.is_booked)
+
+    def test_full_slot_is_a_conflict_with_alternatives(self):
+        self.book(self.slot)
+        other = APIClient()
+        other.force_authenticate(User.objects.create(username='other'))
+        response = self.book(self.slot, other)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([slot['id'] for slot in response.data['alternatives']], [self.later.id])
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_same_patient_cannot_hold_two_places(self):
+        Slot.objects.filter(pk=self.slot.pk).update(capacity=2)
+        self.book(self.slot)
+        response = self.book(self.slot)
+        self.assertEqual(response.status_code, 409)
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.booked_count, 1)
+
+    def test_cancel_and_delete_release_the_slot(self):
+        appointment_id = self.book(self.slot).data['id']
+        self.client.patch(f'/appointments/{appointment_id}/', {'cancel': True})
+        self.slot.refresh_from_db()
+        self.assertEqual((self.slot.booked_count, self.slot.is_booked), (0, False))
+
+        appointment_id = self.book(self.slot).data['id']
+        self.client.delete(f'/appointments/{appointment_id}/')
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.booked_count, 0)
+
+    def test_schedule_edits_keep_slots_of_cancelled_bookings(self):
+        available_time = AvailableTime.objects.create(time='Sun-Sat 9:00 AM - 10:00 AM')
+        self.doctor.available_time.add(available_time)
+        slot = self.doctor.slots.filter(schedule__isnull=False, start__gt=timezone.now()).earliest('start')
+        appointment_id = self.book(slot).data['id']
+        self.client.patch(f'/appointments/{appointment_id}/', {'cancel': True})
+
+        schedule = slot.schedule
+        schedule.end_time = schedule.end_time.replace(hour=11)
+        schedule.save()
+        self.doctor.available_time.remove(available_time)
+        # Only the slot the cancelled appointment points at outlives the schedule.
+        future = self.doctor.slots.filter(start__gt=timezone.now()).exclude(pk__in=[self.slot.pk, self.later.pk])
+        self.assertEqual(list(future), [slot])
+
+    def test_time_or_slot_is_required(self):
+        response = self.client.post('/appointments/', {'doctor': self.doctor.id, 'appointment_type': 'Online', 'symptoms': '-'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/appointments/', {'doctor': self.doctor.id, 'time': self.time.id, 'appointment_type': 'Online', 'symptoms': '-'})
+        self.assertEqual(response.status_code, 201)
+
+
+class ConcurrentBookingTest(TransactionTestCase):
+    def test_parallel_bookings_never_overbook(self):
+        doctor = Doctor.objects.create(user=User.objects.create(username='doctor'), fee=500)
+        start = timezone.now() + timedelta(days=1)
+        slot = Slot.objects.create(doctor=doctor, start=start, end=start + timedelta(minutes=30), capacity=3)
+        patients = [User.objects.create(username=f'patient{i}').patient for i in range(40)]
+        outcomes = []
+
+        def book(patient):
+            try:
+                Appointment.objects.create(patient=patient, doctor=doctor, slot=slot, appointment_type='Online', symptoms='-')
+                outcomes.append('booked')
+            except (SlotUnavailable, OperationalError):
+                outcomes.append('rejected')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(patient,)) for patient in patients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        slot.refresh_from_db()
+        self.assertEqual(len(outcomes), len(patients))
+        self.assertEqual(outcomes.count('booked'), slot.booked_count)
+        self.assertEqual(Appointment.objects.filter(slot=slot).count(), slot.booked_count)
+        self.assertLessEqual(slot.booked_count, slot.capacity)
+        self.assertGreater(slot.booked_count, 0)
+
+
+class BulkAppointmentTest(AppointmentTestCase):
+    def setUp(self):
+        super().setUp()
+        start = timezone.now() + timedelta(days=1)
+        self.slot = Slot.objects.create(doctor=self.doctor, start=start, end=start + timedelta(minutes=30))
+
+    def item(self, **fields):
+        return {'doctor': self.doctor.id, 'time': self.time.id, 'appointment_type': 'Online', 'symptoms': '-', **fields}
+
+    def post(self, **body):
+        return self.client.post('/appointments/bulk/', body, format='json')
+
+    def test_create_many_with_a_fixed_number_of_queries(self):
+        self.post(create=[self.item()])
+        with self.assertNumQueries(7):
+            response = self.post(create=[self.item() for _ in range(30)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data['create']], ['created'] * 30)
+        self.assertEqual(Appointment.objects.count(), 31)
+
+    def test_atomic_batch_writes_nothing_on_error(self):
+        response = self.post(create=[self.item(), self.item(doctor=999999)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['status'] for result in response.data['create']], ['skipped', 'invalid'])
+        self.assertIn('doctor', response.data['create'][1]['errors'])
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_atomic_batch_rolls_back_slot_conflicts(self):
+        response = self.post(create=[self.item(time=None, slot=self.slot.id), self.item(time=None, slot=self.slot.id)])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([result['status'] for result in response.data['create']], ['skipped', 'conflict'])
+        self.assertFalse(Appointment.objects.exists())
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.booked_count, 0)
+
+    def test_partial_batch(self):
+        existing = self.create_appointments(2)
+        response = self.post(
+            atomic=False,
+            create=[self.item(time=None, slot=self.slot.id), self.item(appointment_type='nope')],
+            update=[{'id': existing[0].id, 'symptoms': 'fever'}, {'id': 999999}],
+            cancel=[existing[1].id],
+        )
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result['status'] for result in response.data['create']], ['created', 'invalid'])
+        self.assertEqual([result['status'] for result in response.data['update']], ['updated', 'not_found'])
+        self.assertEqual(Appointment.objects.get(pk=existing[0].id).symptoms, 'fever')
+        self.assertTrue(Appointment.objects.get(pk=existing[1].id).cancel)
+        self.slot.refresh_from_db()
+        self.assertTrue(self.slot.is_booked)
+
+    def test_cancel_frees_the_slot(self):
+        appointment_id = self.post(create=[self.item(time=None, slot=self.slot.id)]).data['create'][0]['id']
+        response = self.post(cancel=[appointment_id])
+        self.assertEqual(response.data['cancel'][0]['status'], 'cancelled')
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.booked_count, 0)
+
+
+class DayCalendarTest(AppointmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.staff = APIClient()
+        self.staff.force_authenticate(User.objects.create(username='staff', is_staff=True))
+
+    def book(self, **fields):
+        fields = {'patient': self.patient, 'doctor': self.doctor, 'time': self.time, 'date': self.today,
+                  'appointment_type': 'Online', 'symptoms': '-', **fields}
+        return Appointment.objects.create(**fields)
+
+    def counts(self):
+        return dict(AppointmentDayCount.objects.filter(count__gt=0).values_list('status', 'count'))
+
+    def test_counters_follow_status_changes(self):
+        first, second = self.book(), self.book()
+        self.assertEqual(self.counts(), {'Pendding': 2})
+        first.appointment_status = 'Runing'
+        first.save()
+        second.cancel = True
+        second.save()
+        self.assertEqual(self.counts(), {'Runing': 1, 'Cancelled': 1})
+        first.delete()
+        self.assertEqual(self.counts(), {'Cancelled': 1})
+
+    def test_rebuild_matches_incremental_counts(self):
+        self.book()
+        self.book(appointment_status='Complated')
+        self.book(cancel=True)
+        incremental = self.counts()
+        rebuild_counts()
+        self.assertEqual(self.counts(), incremental)
+
+    def test_calendar_reads_counters_and_queue(self):
+        evening = AvailableTime.objects.create(time='5:00 PM - 8:00 PM')
+        waiting = self.book()
+        running = self.book(appointment_status='Runing', time=evening)
+        self.book(cancel=True)
+        with self.assertNumQueries(2):
+            response = self.staff.get('/appointments/calendar/', {'doctor_id': self.doctor.id})
+        self.assertEqual(response.status_code, 200)
+        [day] = response.data['days']
+        self.assertEqual(day['total'], 2)
+        self.assertEqual(day['statuses'], {'Pendding': 1, 'Runing': 1, 'Cancelled': 1})
+        self.assertEqual({time['time']: time['statuses'] for time in day['times']},
+                         {self.time.id: {'Pendding': 1, 'Cancelled': 1}, evening.id: {'Runing': 1}})
+        self.assertEqual([row['id'] for row in response.data['queue']], [running.id, waiting.id])
+
+    def test_calendar_validates_range(self):
+        response = self.staff.get('/appointments/calendar/', {'doctor_id': self.doctor.id, 'start': '2025-01-01', 'end': '2025-03-01'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/appointments/calendar/')
+        self.assertEqual(response.status_code, 400)
+        response = self.staff.get('/appointments/calendar/', {'doctor_id': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_calendar_is_for_the_doctor_and_staff(self):
+        self.book()
+        response = self.client.get('/appointments/calendar/', {'doctor_id': self.doctor.id})
+        self.assertEqual(response.status_code, 403)
+        doctor = APIClient()
+        doctor.force_authenticate(self.doctor.user)
+        response = doctor.get('/appointments/calendar/')
+        self.assertEqual((response.status_code, response.data['doctor']), (200, self.doctor.id))
+        other = Doctor.objects.create(user=User.objects.create(username='other'), fee=500)
+        self.assertEqual(doctor.get('/appointments/calendar/', {'doctor_id': other.id}).status_code, 403)
+
+    def test_api_bookings_are_dated(self):
+        response = self.client.post('/appointments/', {'doctor': self.doctor.id, 'time': self.time.id, 'appointment_type': 'Online', 'symptoms': '-'})
+        self.assertEqual(response.data['date'], str(self.today))
+        self.assertEqual(self.counts(), {'Pendding': 1})
+
+
+class SweepTest(AppointmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.old = self.today - timedelta(days=3)
+
+    def test_closes_stale_appointments_only(self):
+        running = self.create_appointments(3, date=self.old, appointment_status='Runing')
+        pending = self.create_appointments(2, date=self.old)
+        current = self.create_appointments(2, date=self.today, appointment_status='Runing')
+        rebuild_counts()
+
+        self.assertEqual(list(sweep('complete', self.today, batch_size=2)), [2, 1])
+        self.assertEqual(list(sweep('expire', self.today, batch_size=2)), [2])
+        self.assertEqual(Appointment.objects.filter(pk__in=[a.pk for a in running], appointment_status='Complated').count(), 3)
+        self.assertEqual(Appointment.objects.filter(pk__in=[a.pk for a in pending], cancel=True).count(), 2)
+        self.assertEqual(Appointment.objects.filter(pk__in=[a.pk for a in current], appointment_status='Runing').count(), 2)
+
+        counts = dict(AppointmentDayCount.objects.filter(date=self.old, count__gt=0).values_list('status', 'count'))
+        self.assertEqual(counts, {'Complated': 3, 'Cancelled': 2})
+
+    def test_counters_match_a_rebuild_after_a_sweep(self):
+        self.create_appointments(3, date=self.old)
+        self.create_appointments(2, date=self.old, appointment_type='Offline', appointment_status='Runing')
+        rebuild_counts()
+        list(sweep('expire', self.today))
+        list(sweep('complete', self.today))
+
+        def rows(model, *fields):
+            return sorted(model.objects.filter(count__gt=0).values_list(*fields, 'count'))
+        swept = rows(AppointmentDailyRollup, 'appointment_type', 'status'), rows(AppointmentDayCount, 'time_id', 'status')
+        self.assertFalse(AppointmentDailyRollup.objects.filter(count__lt=0).exists())
+        rebuild_counts()
+        rebuilt = rows(AppointmentDailyRollup, 'appointment_type', 'status'), rows(AppointmentDayCount, 'time_id', 'status')
+        self.assertEqual(swept, rebuilt)
+        self.assertEqual(swept[0], [('Offline', 'Complated', 2), ('Online', 'Cancelled', 3)])
+
+    def test_interrupted_run_resumes(self):
+        stale = self.create_appointments(5, date=self.old, appointment_status='Runing')
+        batches = sweep('complete', self.today, batch_size=2)
+        next(batches)
+        batches.close()  # e.g. killed by cron's timeout
+        progress = SweepProgress.objects.get(rule='complete')
+        self.assertEqual(progress.last_id, stale[1].pk)
+        self.assertIsNone(progress.finished_at)
+
+        self.assertEqual(list(sweep('complete', self.today, batch_size=2)), [2, 1])
+        progress.refresh_from_db()
+        self.assertEqual(progress.rows, 5)
+        self.assertIsNotNone(progress.finished_at)
+
+    def test_undated_legacy_appointments_are_stale(self):
+        legacy = self.create_appointments(2, appointment_status='Runing')
+        start = timezone.now() + timedelta(days=1)
+        upcoming = Slot.objects.create(doctor=self.doctor, start=start, end=start + timedelta(minutes=30))
+        self.create_appointments(1, slot=upcoming, appointment_status='Runing')
+        self.assertEqual(list(sweep('complete', self.today)), [2])
+        self.assertEqual(Appointment.objects.filter(pk__in=[a.pk for a in legacy], appointment_status='Complated').count(), 2)
+
+    def test_expiring_a_booking_frees_its_slot(self):
+        start = timezone.now() - timedelta(days=3)
+        slot = Slot.objects.create(doctor=self.doctor, start=start, end=start + timedelta(minutes=30), booked_count=1)
+        self.create_appointments(1, slot=slot, date=self.old)
+        list(sweep('expire', self.today))
+        slot.refresh_from_db()
+        self.assertEqual((slot.booked_count, slot.is_booked), (0, False))
+
+
+class ReportTest(AppointmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = True
+        self.user.save()
+
+    def book(self, date, **fields):
+        fields = {'patient': self.patient, 'doctor': self.doctor, 'time': self.time, 'date': date,
+                  'appointment_type': 'Online', 'symptoms': '-', **fields}
+        return Appointment.objects.create(**fields)
+
+    def test_breakdowns_come_from_the_rollups(self):
+        monday = timezone.localdate() - timedelta(days=timezone.localdate().weekday() + 7)
+        self.book(monday)
+        self.book(monday + timedelta(days=1), appointment_type='Offline')
+        self.book(monday + timedelta(days=2), cancel=True)
+        self.book(monday + timedelta(days=7))
+
+        params = {'start': monday, 'end': monday + timedelta(days=13), 'group_by': 'appointment_type,status'}
+        with self.assertNumQueries(1):
+            response = self.client.get('/appointments/reports/', {**params, 'granularity': 'week'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(str(row['period'])[:10], row['appointment_type'], row['status'], row['count']) for row in response.data['results']],
+            [(str(monday), 'Offline', 'Pendding', 1), (str(monday), 'Online', 'Cancelled', 1), (str(monday), 'Online', 'Pendding', 1),
+             (str(monday + timedelta(days=7)), 'Online', 'Pendding', 1)],
+        )
+        response = self.client.get('/appointments/reports/', {**params, 'group_by': 'doctor'})
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertEqual(response.data['total'], 4)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        day = timezone.localdate()
+        self.book(day)
+        self.book(day, appointment_type='Offline', appointment_status='Runing')
+        incremental = set(AppointmentDailyRollup.objects.values_list('date', 'doctor', 'appointment_type', 'status', 'count'))
+        rebuild_counts()
+        self.assertEqual(set(AppointmentDailyRollup.objects.values_list('date', 'doctor', 'appointment_type', 'status', 'count')), incremental)
+
+    def test_invalid_doctor_id(self):
+        response = self.client.get('/appointments/reports/', {'doctor_id': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('doctor_id', response.data)
+
+    def test_staff_only(self):
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get('/appointments/reports/').status_code, 403)
+
+
+class ExportTest(AppointmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = True
+        self.user.save()
+        self.appointments = self.create_appointments(5)
+
+    def test_ndjson_export(self):
+        response = self.client.get('/appointments/export/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [appointment.id for appointment in self.appointments])
+
+    def test_csv_export_respects_filters(self):
+        other = Doctor.objects.create(user=User.objects.create(username='other'), fee=1)
+        self.create_appointments(2, doctor=other)
+        response = self.client.get('/appointments/export/', {'as': 'csv', 'doctor_id': other.id})
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row['doctor'] for row in rows}, {str(other.id)})
+        self.assertIn('attachment;', response['Content-Disposition'])
+
+    def test_staff_only(self):
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get('/appointments/export/').status_code, 403)
+
+    def test_streamed_page_matches_the_normal_one(self):
+        for params in ({'limits': 2}, {'pagination': 'keyset', 'limits': 2}):
+            expected = self.client.get('/appointments/', params).json()
+            response = self.client.get('/appointments/', {**params, 'stream': 'json'})
+            self.assertTrue(response.streaming)
+            streamed = json.loads(b''.join(response.streaming_content))
+            self.assertEqual(streamed['results'], expected['results'])
+            self.assertEqual(streamed.get('count'), expected.get('count'))
+            # Following links keep streaming.
+            self.assertIn('stream=json', streamed['next'])
@@ -1,17 +1,41 @@
+from datetime import timedelta
+from django.db import IntegrityError
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.throttling import UserRateThrottle
-from rest_framework.permissions import IsAuthenticated
-from hospital_management.paginations import StandardResultsSetPagination
-from . models import Appointment
+from hospital_management.throttling import UserRateThrottle
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from hospital_management.paginations import KeysetOrPageNumberPagination
+from hospital_management.permissions import request_claims
+from hospital_management.conditional import ConditionalRequestMixin
+from hospital_management.streaming import StreamingExportMixin
+from hospital_management.constant import APPOINTMENT_STATUS, CALENDAR_MAX_DAYS, CANCELLED
+from doctor.models import Slot
+from doctor.scheduling import SlotUnavailable, next_free_slots
+from doctor.serializers import SlotSerializer
+from . models import Appointment, AppointmentDailyRollup, AppointmentDayCount
+from .bulk import MAX_ITEMS, AppointmentBatch
 from .serializers import AppointmentSerializer
 # Create your views here.
 
-class AppointmentAPIView(ModelViewSet):
-    queryset= Appointment.objects.all()
+REPORT_PERIODS = {'day': None, 'week': TruncWeek, 'month': TruncMonth}
+REPORT_GROUPS = {'doctor': 'doctor_id', 'status': 'status', 'appointment_type': 'appointment_type'}
+
+
+class AppointmentAPIView(ConditionalRequestMixin, StreamingExportMixin, ModelViewSet):
+    queryset= Appointment.objects.order_by('id')
     serializer_class = AppointmentSerializer
     throttle_classes = (UserRateThrottle,)
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetOrPageNumberPagination
+    # Only signed-in users may read appointments.
+    conditional_per_user = True
     # You can customize your queryset using get_queryset(self) method.
     def get_queryset(self): 
         queryset= super().get_queryset()
@@ -39,4 +63,183 @@ class AppointmentAPIView(ModelViewSet):
         Setting the pateint: By calling serializer.save(author=self.request.user.pateint), you automatically set the author field to the currently authenticated user when a post is created.
         This ensures that the pateint is set correctly and prevents users from tampering with the field.
         """
-        serializer.save(patient=self.request.user.patient)
\ No newline at end of file
+        serializer.save(patient=self.request.user.patient)
+
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except SlotUnavailable as exc:
+            return self.booking_conflict(exc)
+        except IntegrityError:
+            if not request.data.get('slot'):
+                raise
+            return Response({'detail': 'You already have a booking for this slot.'}, status=status.HTTP_409_CONFLICT)
+
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        except SlotUnavailable as exc:
+            return self.booking_conflict(exc)
+        except IntegrityError:
+            if not request.data.get('slot'):
+                raise
+            return Response({'detail': 'You already have a booking for this slot.'}, status=status.HTTP_409_CONFLICT)
+
+    def booking_conflict(self, exc):
+        """
+        A lost race for a slot is a 409 listing the doctor's next free
+        slots, so clients pick another one instead of retrying the same.
+        """
+        slot = Slot.objects.get(pk=exc.args[0])
+        alternatives = next_free_slots(doctor=slot.doctor_id, after=slot.start, limit=3)
+        return Response({
+            'detail': 'This slot is no longer available.',
+            'alternatives': SlotSerializer(alternatives, many=True).data,
+        }, status=status.HTTP_409_CONFLICT)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Create, update and cancel many appointments in one request.
+        example body: {"atomic": false, "create": [{...}, ...], "update": [{"id": 1, ...}], "cancel": [2, 3]}
+        With "atomic" (the default) nothing is written unless every item succeeds.
+        """
+        sections = {}
+        for name in ('create', 'update', 'cancel'):
+            sections[name] = request.data.get(name, [])
+            if not isinstance(sections[name], list):
+                raise ValidationError({name: 'Expected a list.'})
+        if sum(len(items) for items in sections.values()) > MAX_ITEMS:
+            raise ValidationError(f'At most {MAX_ITEMS} items per request.')
+        atomic = request.data.get('atomic', True) not in (False, 'false', '0')
+
+        batch = AppointmentBatch(self.get_queryset(), request.user.patient, self.get_serializer_context(), atomic=atomic, **sections)
+        results = batch.save()
+        if not batch.failed:
+            code = status.HTTP_200_OK
+        elif not atomic:
+            code = status.HTTP_207_MULTI_STATUS
+        elif any(result['status'] == 'conflict' for items in results.values() for result in items):
+            code = status.HTTP_409_CONFLICT
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response({'atomic': atomic, **results}, status=code)
+
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """
+        A doctor's per-day counts (by available time and status) and queue.
+        example: /appointments/calendar/?doctor_id=1&start=2025-01-01&end=2025-01-07&queue=false
+        Defaults to the logged in doctor and today. Only that doctor and staff may see it.
+        """
+        doctor_id = request.query_params.get('doctor_id') or getattr(getattr(request.user, 'doctor', None), 'id', None)
+        if not doctor_id:
+            raise ValidationError({'doctor_id': 'This field is required.'})
+        try:
+            doctor_id = int(doctor_id)
+        except ValueError:
+            raise ValidationError({'doctor_id': 'A valid integer is required.'})
+        # The queue shows patients' names, so it is not for other users.
+        if not request.user.is_staff and doctor_id != request_claims(request).get('doctor_id'):
+            raise PermissionDenied("You can only see your own calendar.")
+        dates = {}
+        for name in ('start', 'end'):
+            value = request.query_params.get(name)
+            dates[name] = parse_date(value) if value else None
+            if value and dates[name] is None:
+                raise ValidationError({name: 'Enter a valid date (YYYY-MM-DD).'})
+        start = dates['start'] or timezone.localdate()
+        end = dates['end'] or start
+        if not start <= end < start + timedelta(days=CALENDAR_MAX_DAYS):
+            raise ValidationError({'end': f'end must be within {CALENDAR_MAX_DAYS} days on or after start.'})
+
+        # Counter rows may be split (e.g. two rows for a NULL time), so sum them.
+        counts = (
+            AppointmentDayCount.objects.filter(doctor_id=doctor_id, date__range=(start, end), count__gt=0)
+            .values('date', 'time_id', 'time__time', 'status')
+            .annotate(total=Sum('count'))
+            .order_by('date', 'time_id')
+        )
+        days = {}
+        for row in counts:
+            day = days.setdefault(row['date'], {'date': row['date'], 'total': 0, 'statuses': {}, 'times': {}})
+            time = day['times'].setdefault(row['time_id'], {'time': row['time_id'], 'label': row['time__time'], 'statuses': {}})
+            time['statuses'][row['status']] = row['total']
+            day['statuses'][row['status']] = day['statuses'].get(row['status'], 0) + row['total']
+            if row['status'] != CANCELLED:
+                day['total'] += row['total']
+        for day in days.values():
+            day['times'] = list(day['times'].values())
+
+        data = {'doctor': doctor_id, 'start': start, 'end': end, 'days': list(days.values())}
+        if request.query_params.get('queue') not in ('false', '0'):
+            # Running first, then pending, then completed; in time order within each.
+            status_order = {'Runing': 0, 'Pendding': 1, 'Complated': 2}
+            queue = list(
+                Appointment.objects.filter(doctor_id=doctor_id, date__range=(start, end), cancel=False)
+                .order_by('date', 'time_id', 'slot__start', 'id')
+                .values('id', 'date', 'time_id', 'slot_id', 'slot__start', 'appointment_status', 'appointment_type',
+                        'patient_id', 'patient__user__first_name', 'patient__user__last_name')
+            )
+            queue.sort(key=lambda row: (row['date'], status_order.get(row['appointment_status'], len(APPOINTMENT_STATUS))))
+            data['queue'] = [{
+                'id': row['id'],
+                'date': row['date'],
+                'time': row['time_id'],
+                'slot': row['slot_id'],
+                'start': row['slot__start'],
+                'status': row['appointment_status'],
+                'appointment_type': row['appointment_type'],
+                'patient': row['patient_id'],
+                'patient_name': f"{row['patient__user__first_name']} {row['patient__user__last_name']}".strip(),
+            } for row in queue]
+        return Response(data)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def reports(self, request):
+        """
+        Appointment volume per day, week or month, broken down by any of
+        doctor, status and appointment_type. Read from the daily rollups,
+        never from the appointment table.
+        example: /appointments/reports/?granularity=week&group_by=doctor,status&start=2025-01-01&end=2025-03-31
+        """
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in REPORT_PERIODS:
+            raise ValidationError({'granularity': f"Choose one of: {', '.join(REPORT_PERIODS)}."})
+        group_by = [name for name in request.query_params.get('group_by', 'status').split(',') if name]
+        unknown = set(group_by) - set(REPORT_GROUPS)
+        if unknown:
+            raise ValidationError({'group_by': f"Choose from: {', '.join(REPORT_GROUPS)}."})
+        dates = {}
+        for name in ('start', 'end'):
+            value = request.query_params.get(name)
+            dates[name] = parse_date(value) if value else None
+            if value and dates[name] is None:
+                raise ValidationError({name: 'Enter a valid date (YYYY-MM-DD).'})
+        end = dates['end'] or timezone.localdate()
+        start = dates['start'] or end - timedelta(days=30)
+
+        rollups = AppointmentDailyRollup.objects.filter(date__range=(start, end), count__gt=0)
+        doctor_id = request.query_params.get('doctor_id')
+        if doctor_id:
+            try:
+                doctor_id = int(doctor_id)
+            except ValueError:
+                raise ValidationError({'doctor_id': 'A valid integer is required.'})
+            rollups = rollups.filter(doctor_id=doctor_id)
+        trunc = REPORT_PERIODS[granularity]
+        rollups = rollups.annotate(period=trunc('date') if trunc else F('date'))
+        columns = ['period'] + [REPORT_GROUPS[name] for name in group_by]
+        rows = rollups.values(*columns).annotate(count=Sum('count')).order_by(*columns)
+        results = [
+            {'period': row['period'], **{name: row[REPORT_GROUPS[name]] for name in group_by}, 'count': row['count']}
+            for row in rows
+        ]
+        return Response({
+            'granularity': granularity,
+            'start': start,
+            'end': end,
+            'group_by': group_by,
+            'total': sum(row['count'] for row in results),
+            'results': results,
+        })
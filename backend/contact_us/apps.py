@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ContactUsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'contact_us'
+
+    def ready(self):
+        import contact_us.signals
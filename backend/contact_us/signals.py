@@ -0,0 +1,4 @@
+from hospital_management.response_cache import track_tags
+from .models import ContactUs
+
+track_tags(ContactUs, 'contact')
@@ -1,11 +1,12 @@
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import viewsets
-from rest_framework.throttling import ScopedRateThrottle
+from hospital_management.response_cache import ResponseCacheMixin
+from hospital_management.throttling import ScopedRateThrottle
 from .models import ContactUs
 from .serializers import ContactUsSerializer
 
 
-class ContactUsViewSet(viewsets.ModelViewSet):
+class ContactUsViewSet(ResponseCacheMixin, viewsets.ModelViewSet):
     queryset = ContactUs.objects.all()
     serializer_class = ContactUsSerializer
     permission_classes = [IsAuthenticated]
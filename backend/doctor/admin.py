@@ -36,3 +36,25 @@ class ReviewAdmin(admin.ModelAdmin):
         return obj.reviwer
     
 
+
+@admin.register(models.DoctorRating)
+class DoctorRatingAdmin(admin.ModelAdmin):
+    list_display = ['doctor', 'average', 'review_count']
+    list_select_related = ['doctor__user']
+
+
+@admin.register(models.Schedule)
+class ScheduleAdmin(admin.ModelAdmin):
+    list_display = ['id', 'doctor', 'weekday', 'start_time', 'end_time', 'slot_minutes']
+    list_filter = ['weekday']
+    list_select_related = ['doctor__user']
+
+
+@admin.register(models.Slot)
+class SlotAdmin(admin.ModelAdmin):
+    list_display = ['id', 'doctor', 'start', 'end', 'capacity', 'booked_count', 'is_booked']
+    list_filter = ['is_booked']
+    list_select_related = ['doctor__user']
+    raw_id_fields = ['doctor', 'schedule']
+    # Maintained by bookings.
+    readonly_fields = ['booked_count', 'is_booked']
@@ -0,0 +1,29 @@
+import django_filters
+from rest_framework.filters import SearchFilter
+from .models import Doctor
+from .search import search_doctors
+
+
+class DoctorFilter(django_filters.FilterSet):
+    min_rating = django_filters.NumberFilter(field_name='rating_summary__average', lookup_expr='gte')
+    max_rating = django_filters.NumberFilter(field_name='rating_summary__average', lookup_expr='lte')
+    min_reviews = django_filters.NumberFilter(field_name='rating_summary__review_count', lookup_expr='gte')
+
+    class Meta:
+        model = Doctor
+        fields = ['specialisation', 'designation', 'fee', 'available_time']
+
+
+class DoctorSearchFilter(SearchFilter):
+    """
+    `?search=` backed by the doctor search index instead of `icontains`
+    scans. Matches come back ranked by relevance unless `?ordering=` asks
+    for something else.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        return search_doctors(queryset, ' '.join(terms))
@@ -0,0 +1,62 @@
+import random
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from doctor.models import Doctor, Designation, Specialisation
+from doctor.search import search_doctor_ids, rebuild_index
+
+FIRST_NAMES = ['Rahim', 'Karim', 'Nusrat', 'Farhana', 'Tanvir', 'Sadia', 'Imran', 'Ayesha', 'Mahmud', 'Sabrina']
+LAST_NAMES = ['Ahmed', 'Hossain', 'Islam', 'Rahman', 'Chowdhury', 'Khan', 'Akter', 'Sarkar', 'Das', 'Uddin']
+SPECIALISATIONS = ['Cardiology', 'Neurology', 'Dermatology', 'Pediatrics', 'Orthopedics', 'Oncology', 'Psychiatry', 'Urology']
+DESIGNATIONS = ['Consultant', 'Professor', 'Associate Professor', 'Medical Officer', 'Surgeon']
+QUERIES = ['cardiology', 'rahman', 'neuro', 'professor budget', 'farhana dermatology', 'surgeon premium', 'zzz']
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures doctor search latency as the doctor table grows. '
+        'Everything runs in a transaction that is rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query at each size')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            specialisations = [Specialisation.objects.create(name=name, slug=f'bench-{name.lower()}') for name in SPECIALISATIONS]
+            designations = [Designation.objects.create(name=name, slug=f'bench-{name.lower().replace(" ", "-")}') for name in DESIGNATIONS]
+            created = 0
+            for size in sorted(options['sizes']):
+                self.create_doctors(rng, created, size - created, specialisations, designations)
+                created = size
+                rebuild_index()
+                self.report(size, options['repeat'])
+            transaction.set_rollback(True)
+
+    def create_doctors(self, rng, start, count, specialisations, designations):
+        users = User.objects.bulk_create([
+            User(username=f'bench_doctor_{i}', first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES))
+            for i in range(start, start + count)
+        ], batch_size=2000)
+        doctors = Doctor.objects.bulk_create(
+            [Doctor(user=user, fee=rng.choice([300, 500, 800, 1200, 2000])) for user in users], batch_size=2000
+        )
+        Doctor.specialisation.through.objects.bulk_create([
+            Doctor.specialisation.through(doctor=doctor, specialisation=rng.choice(specialisations)) for doctor in doctors
+        ], batch_size=2000)
+        Doctor.designation.through.objects.bulk_create([
+            Doctor.designation.through(doctor=doctor, designation=rng.choice(designations)) for doctor in doctors
+        ], batch_size=2000)
+
+    def report(self, size, repeat):
+        self.stdout.write(f'{size} doctors')
+        for query in QUERIES:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                matches = search_doctor_ids(query, limit=100)
+            elapsed = (time.perf_counter() - started) / repeat * 1000
+            self.stdout.write(f'  {query!r:24} {elapsed:8.2f} ms  ({len(matches)} shown)')
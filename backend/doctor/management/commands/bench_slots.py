@@ -0,0 +1,80 @@
+import random
+import time
+from datetime import time as clock, timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from doctor.models import Doctor, Schedule, Slot, Specialisation
+from doctor.scheduling import generate_slots, next_free_slots, overlapping_slots
+
+SPECIALISATIONS = ['Cardiology', 'Neurology', 'Dermatology', 'Pediatrics', 'Orthopedics', 'Oncology', 'Psychiatry', 'Urology']
+WINDOWS = [(clock(9), clock(12)), (clock(14), clock(17)), (clock(17), clock(21))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates slots for many doctors and measures the next-free-slot search. '
+        'Runs in a transaction that is rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--booked', type=float, default=0.6, help='Share of slots marked as booked')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            specialisations = self.seed(rng, options['doctors'])
+
+            started = time.perf_counter()
+            generate_slots(days=options['days'])
+            elapsed = time.perf_counter() - started
+            total = Slot.objects.count()
+            self.stdout.write(f'Generated {total} slots in {elapsed:.1f}s ({total / elapsed:,.0f} slots/s)')
+
+            booked = int(total * options['booked'])
+            Slot.objects.filter(pk__in=Slot.objects.order_by('start')[:booked].values('pk')).update(booked_count=F('capacity'), is_booked=True)
+            self.stdout.write(f'Marked the {booked} earliest slots as booked')
+
+            now = timezone.now()
+            for label, kwargs in [
+                ('next 10, any specialisation', {}),
+                ('next 10, one specialisation', {'specialisation': specialisations[0].slug}),
+                ('next 10, one specialisation in 30 days', {'specialisation': specialisations[-1].id, 'after': now + timedelta(days=30)}),
+            ]:
+                self.report(label, lambda: list(next_free_slots(limit=10, **kwargs)), options['repeat'])
+
+            doctor = Doctor.objects.order_by('?').first()
+            start = now + timedelta(days=7)
+            self.report('overlap check for one doctor', lambda: overlapping_slots(doctor, start, start + timedelta(hours=2)).exists(), options['repeat'])
+            transaction.set_rollback(True)
+
+    def seed(self, rng, count):
+        specialisations = [
+            Specialisation.objects.create(name=name, slug=f'bench-slots-{name.lower()}') for name in SPECIALISATIONS
+        ]
+        users = User.objects.bulk_create([User(username=f'bench_slots_doctor_{i}') for i in range(count)], batch_size=2000)
+        doctors = Doctor.objects.bulk_create([Doctor(user=user, fee=500) for user in users], batch_size=2000)
+        Doctor.specialisation.through.objects.bulk_create([
+            Doctor.specialisation.through(doctor=doctor, specialisation=rng.choice(specialisations)) for doctor in doctors
+        ], batch_size=2000)
+        # Six working days a week with one window each; bulk_create skips
+        # the post_save signal so slots are generated in one pass below.
+        Schedule.objects.bulk_create([
+            Schedule(doctor=doctor, weekday=weekday, start_time=start, end_time=end, slot_minutes=rng.choice([15, 20, 30]))
+            for doctor in doctors
+            for weekday, (start, end) in zip(rng.sample(range(7), 6), (rng.choice(WINDOWS) for _ in range(6)))
+        ], batch_size=2000)
+        return specialisations
+
+    def report(self, label, run, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+        self.stdout.write(f'{label:42} {elapsed:8.2f} ms')
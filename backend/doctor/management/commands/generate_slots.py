@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from doctor.scheduling import generate_slots
+from hospital_management.constant import SLOT_HORIZON_DAYS
+
+
+class Command(BaseCommand):
+    help = 'Creates the concrete appointment slots of every weekly schedule (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=SLOT_HORIZON_DAYS,
+            help='How many days ahead to generate'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = generate_slots(days=options['days'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} slots for the next {options["days"]} days in {elapsed:.2f}s.'))
@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+from doctor.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds every doctor rating summary from the review table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of summaries written per INSERT'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_ratings(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} doctor rating summaries in {elapsed:.2f}s.'))
@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+from doctor.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the doctor full-text search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of doctors indexed per batch'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_index(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} doctors in {elapsed:.2f}s.'))
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.11 on 2026-10-18 16:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    Doctor = apps.get_model('doctor', 'Doctor')
+    DoctorRating = apps.get_model('doctor', 'DoctorRating')
+    Review = apps.get_model('doctor', 'Review')
+    histogram = {f'rating_{value}': Count('id', filter=Q(rating=value)) for value in range(1, 6)}
+    totals = {
+        row['doctor_id']: row
+        for row in Review.objects.order_by().values('doctor_id').annotate(
+            review_count=Count('id'), rating_sum=Sum('rating'), **histogram
+        )
+    }
+    summaries = []
+    for doctor_id in Doctor.objects.values_list('id', flat=True):
+        row = totals.get(doctor_id, {})
+        count = row.get('review_count', 0)
+        total = row.get('rating_sum') or 0
+        summaries.append(DoctorRating(
+            doctor_id=doctor_id,
+            review_count=count,
+            rating_sum=total,
+            average=total / count if count else 0,
+            **{field: row.get(field, 0) for field in histogram},
+        ))
+    DoctorRating.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0002_alter_review_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorRating',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('average', models.FloatField(db_index=True, default=0)),
+                ('rating_1', models.IntegerField(default=0)),
+                ('rating_2', models.IntegerField(default=0)),
+                ('rating_3', models.IntegerField(default=0)),
+                ('rating_4', models.IntegerField(default=0)),
+                ('rating_5', models.IntegerField(default=0)),
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rating_summary', to='doctor.doctor')),
+            ],
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
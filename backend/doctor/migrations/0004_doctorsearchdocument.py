@@ -0,0 +1,88 @@
+# Generated by Django 5.1.11 on 2026-10-18 16:42
+
+import django.db.models.deletion
+from collections import defaultdict
+from django.db import migrations, models
+
+SQLITE_INDEX = [
+    """CREATE VIRTUAL TABLE doctor_search_fts USING fts5(
+        body,
+        content='doctor_doctorsearchdocument',
+        content_rowid='doctor_id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    """CREATE TRIGGER doctor_search_fts_insert AFTER INSERT ON doctor_doctorsearchdocument BEGIN
+        INSERT INTO doctor_search_fts(rowid, body) VALUES (new.doctor_id, new.body);
+    END""",
+    """CREATE TRIGGER doctor_search_fts_delete AFTER DELETE ON doctor_doctorsearchdocument BEGIN
+        INSERT INTO doctor_search_fts(doctor_search_fts, rowid, body) VALUES ('delete', old.doctor_id, old.body);
+    END""",
+    """CREATE TRIGGER doctor_search_fts_update AFTER UPDATE ON doctor_doctorsearchdocument BEGIN
+        INSERT INTO doctor_search_fts(doctor_search_fts, rowid, body) VALUES ('delete', old.doctor_id, old.body);
+        INSERT INTO doctor_search_fts(rowid, body) VALUES (new.doctor_id, new.body);
+    END""",
+]
+
+SQLITE_DROP_INDEX = [
+    'DROP TRIGGER IF EXISTS doctor_search_fts_insert',
+    'DROP TRIGGER IF EXISTS doctor_search_fts_delete',
+    'DROP TRIGGER IF EXISTS doctor_search_fts_update',
+    'DROP TABLE IF EXISTS doctor_search_fts',
+]
+
+POSTGRESQL_INDEX = [
+    """ALTER TABLE doctor_doctorsearchdocument ADD COLUMN vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED""",
+    'CREATE INDEX doctor_search_vector_idx ON doctor_doctorsearchdocument USING GIN (vector)',
+]
+
+POSTGRESQL_DROP_INDEX = [
+    'DROP INDEX IF EXISTS doctor_search_vector_idx',
+    'ALTER TABLE doctor_doctorsearchdocument DROP COLUMN IF EXISTS vector',
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+def backfill_documents(apps, schema_editor):
+    Doctor = apps.get_model('doctor', 'Doctor')
+    DoctorSearchDocument = apps.get_model('doctor', 'DoctorSearchDocument')
+    names = defaultdict(list)
+    for relation in ('specialisation', 'designation'):
+        through = getattr(Doctor, relation).through
+        for doctor_id, name in through.objects.values_list('doctor_id', f'{relation}__name'):
+            names[doctor_id].append(name)
+    documents = []
+    for doctor_id, first_name, last_name, fee in Doctor.objects.values_list('id', 'user__first_name', 'user__last_name', 'fee'):
+        band = 'budget' if fee <= 500 else 'standard' if fee <= 1500 else 'premium'
+        parts = [first_name, last_name, *names[doctor_id], band]
+        documents.append(DoctorSearchDocument(doctor_id=doctor_id, body=' '.join(part for part in parts if part)))
+    DoctorSearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0003_doctorrating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorSearchDocument',
+            fields=[
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='doctor.doctor')),
+                ('body', models.TextField()),
+            ],
+        ),
+        migrations.RunPython(
+            run_for_vendor({'sqlite': SQLITE_INDEX, 'postgresql': POSTGRESQL_INDEX}),
+            run_for_vendor({'sqlite': SQLITE_DROP_INDEX, 'postgresql': POSTGRESQL_DROP_INDEX}),
+        ),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.1.11 on 2026-10-18 16:51
+
+import re
+import django.db.models.deletion
+from datetime import time
+from django.db import migrations, models
+
+# A copy of doctor.scheduling.parse_available_time as it was when this
+# migration was written, so later changes to it don't change the migration.
+DAY_NAMES = {
+    'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6,
+}
+DAY_PATTERN = r'(mon|tue|wed|thu|fri|sat|sun)[a-z]*'
+TIME_PATTERN = r'(\d{1,2})(?:[:.](\d{2}))?\s*([ap])?\.?\s*m?\.?'
+RANGE_RE = re.compile(rf'{TIME_PATTERN}\s*(?:-|–|to)\s*{TIME_PATTERN}', re.IGNORECASE)
+DAY_RANGE_RE = re.compile(rf'{DAY_PATTERN}\s*(?:-|–|to)\s*{DAY_PATTERN}', re.IGNORECASE)
+DAY_RE = re.compile(DAY_PATTERN, re.IGNORECASE)
+
+
+def _to_time(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.lower() == 'p' else 0)
+    return time(hour % 24, minute)
+
+
+def parse_weekdays(text):
+    days = set()
+    for first, last in DAY_RANGE_RE.findall(text):
+        day, last = DAY_NAMES[first.lower()], DAY_NAMES[last.lower()]
+        days.add(day)
+        while day != last:
+            day = (day + 1) % 7
+            days.add(day)
+    for name in DAY_RE.findall(DAY_RANGE_RE.sub(' ', text)):
+        days.add(DAY_NAMES[name.lower()])
+    return sorted(days) if days else list(range(7))
+
+
+def parse_available_time(text):
+    windows = []
+    for hour1, minute1, meridiem1, hour2, minute2, meridiem2 in RANGE_RE.findall(text):
+        if not meridiem1 and meridiem2:
+            start = _to_time(hour1, minute1, meridiem2)
+            if start >= _to_time(hour2, minute2, meridiem2):
+                start = _to_time(hour1, minute1, 'a')
+        else:
+            start = _to_time(hour1, minute1, meridiem1)
+        end = _to_time(hour2, minute2, meridiem2)
+        if start < end:
+            windows.append((start, end))
+    return [(weekday, start, end) for weekday in parse_weekdays(text) for start, end in windows]
+
+
+def schedules_from_available_times(apps, schema_editor):
+    """Turn every doctor's free-text available times into weekly schedules."""
+    AvailableTime = apps.get_model('doctor', 'AvailableTime')
+    Doctor = apps.get_model('doctor', 'Doctor')
+    Schedule = apps.get_model('doctor', 'Schedule')
+    windows = {available_time.id: parse_available_time(available_time.time) for available_time in AvailableTime.objects.all()}
+    schedules = [
+        Schedule(doctor_id=doctor_id, available_time_id=available_time_id, weekday=weekday, start_time=start, end_time=end)
+        for doctor_id, available_time_id in Doctor.available_time.through.objects.values_list('doctor_id', 'availabletime_id')
+        for weekday, start, end in windows[available_time_id]
+    ]
+    Schedule.objects.bulk_create(schedules, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0004_doctorsearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Schedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=30)),
+                ('available_time', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='schedules', to='doctor.availabletime')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedules', to='doctor.doctor')),
+            ],
+            options={
+                'ordering': ['doctor', 'weekday', 'start_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Slot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('is_booked', models.BooleanField(default=False)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='doctor.doctor')),
+                ('schedule', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='slots', to='doctor.schedule')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('is_booked', False)), fields=['start'], name='slot_free_start_idx'), models.Index(fields=['doctor', 'end'], name='slot_doctor_end_idx')],
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'start'), name='unique_doctor_slot_start')],
+            },
+        ),
+        migrations.RunPython(schedules_from_available_times, migrations.RunPython.noop),
+    ]
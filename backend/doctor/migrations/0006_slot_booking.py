@@ -0,0 +1,33 @@
+# Generated by Django 5.1.11 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+def count_booked_slots(apps, schema_editor):
+    Slot = apps.get_model('doctor', 'Slot')
+    Slot.objects.filter(is_booked=True).update(booked_count=models.F('capacity'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0005_schedule_slot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='slot',
+            name='booked_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='slot',
+            name='capacity',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.RunPython(count_booked_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='slot',
+            constraint=models.CheckConstraint(condition=models.Q(('booked_count__lte', models.F('capacity'))), name='slot_booked_within_capacity'),
+        ),
+    ]
@@ -1,7 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
 from patient.models import Patient
-from hospital_management.constant import RATING_CHOICES
+from hospital_management.constant import RATING_CHOICES, WEEKDAYS
+from hospital_management.storage import blob_storage
 # Create your models here.
 class Specialisation(models.Model):
     name = models.CharField(max_length=50)
@@ -25,7 +26,7 @@ class AvailableTime(models.Model):
 
 class Doctor(models.Model):
     user = models.OneToOneField(to=User, on_delete=models.CASCADE, related_name="doctor")
-    profile = models.ImageField(upload_to="doctor/images", null=True, blank=True)
+    profile = models.ImageField(upload_to="doctor/images", storage=blob_storage, null=True, blank=True)
     designation = models.ManyToManyField(to=Designation)
     specialisation = models.ManyToManyField(to=Specialisation)
     available_time = models.ManyToManyField(to=AvailableTime)
@@ -45,3 +46,82 @@ class Review(models.Model):
     def __str__(self):
         return f"Review by {self.reviwer} for Dr. {self.doctor} - {self.rating}★"
 
+
+class DoctorRating(models.Model):
+    """Per-doctor review aggregates, kept up to date by doctor.signals."""
+    doctor = models.OneToOneField(to=Doctor, on_delete=models.CASCADE, related_name='rating_summary')
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    average = models.FloatField(default=0, db_index=True)
+    rating_1 = models.IntegerField(default=0)
+    rating_2 = models.IntegerField(default=0)
+    rating_3 = models.IntegerField(default=0)
+    rating_4 = models.IntegerField(default=0)
+    rating_5 = models.IntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.doctor} - {self.average:.2f}★ ({self.review_count})"
+
+    @property
+    def histogram(self):
+        return {value: getattr(self, f'rating_{value}') for value, _ in RATING_CHOICES}
+
+class DoctorSearchDocument(models.Model):
+    """
+    Denormalised text used by the doctor search index (see doctor.search).
+    The FTS5 table on SQLite and the tsvector column on PostgreSQL are
+    created by the migration and are kept in sync by the database.
+    """
+    doctor = models.OneToOneField(to=Doctor, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    body = models.TextField()
+
+    def __str__(self) -> str:
+        return self.body
+
+
+class Schedule(models.Model):
+    """A recurring weekly window in which a doctor takes appointments."""
+    doctor = models.ForeignKey(to=Doctor, on_delete=models.CASCADE, related_name='schedules')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAYS)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+    # The free-text AvailableTime this window was parsed from, if any.
+    available_time = models.ForeignKey(to=AvailableTime, on_delete=models.SET_NULL, null=True, blank=True, related_name='schedules')
+
+    class Meta:
+        ordering = ['doctor', 'weekday', 'start_time']
+
+    def __str__(self) -> str:
+        return f"{self.doctor} - {self.get_weekday_display()} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+
+class Slot(models.Model):
+    """A concrete, bookable appointment slot generated from a Schedule."""
+    doctor = models.ForeignKey(to=Doctor, on_delete=models.CASCADE, related_name='slots')
+    schedule = models.ForeignKey(to=Schedule, on_delete=models.SET_NULL, null=True, blank=True, related_name='slots')
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    capacity = models.PositiveSmallIntegerField(default=1)
+    booked_count = models.PositiveSmallIntegerField(default=0)
+    # booked_count >= capacity, kept in step by doctor.scheduling.reserve_slot/release_slot.
+    is_booked = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'start'], name='unique_doctor_slot_start'),
+            models.CheckConstraint(condition=models.Q(booked_count__lte=models.F('capacity')), name='slot_booked_within_capacity'),
+        ]
+        indexes = [
+            # "Next free slot" scans: only free slots, in start order.
+            models.Index(fields=['start'], condition=models.Q(is_booked=False), name='slot_free_start_idx'),
+            # Overlap checks for one doctor: start < x AND end > y.
+            models.Index(fields=['doctor', 'end'], name='slot_doctor_end_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.doctor} - {self.start:%Y-%m-%d %H:%M}"
+
+    def save(self, *args, **kwargs):
+        self.is_booked = self.booked_count >= self.capacity
+        super().save(*args, **kwargs)
@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+from hospital_management.constant import RATING_CHOICES
+from hospital_management.response_cache import invalidate_models
+from .models import Doctor, DoctorRating, Review
+
+RATING_VALUES = [value for value, _ in RATING_CHOICES]
+
+
+def apply_rating_delta(doctor_id, rating, delta):
+    """
+    Add (delta=1) or remove (delta=-1) a single rating from a doctor's
+    aggregates with one UPDATE, so the cost doesn't depend on how many
+    reviews the doctor already has.
+    """
+    rating = int(rating)
+    new_count = F('review_count') + delta
+    new_sum = F('rating_sum') + rating * delta
+    changes = {
+        'review_count': new_count,
+        'rating_sum': new_sum,
+        f'rating_{rating}': F(f'rating_{rating}') + delta,
+        # Every expression in an UPDATE reads the old row, so the average is
+        # computed from the same new count and sum as above.
+        'average': Case(
+            When(review_count__lte=-delta, then=Value(0.0)),
+            default=Cast(new_sum, FloatField()) / new_count,
+            output_field=FloatField(),
+        ),
+    }
+    updated = DoctorRating.objects.filter(doctor_id=doctor_id).update(**changes)
+    if not updated:
+        DoctorRating.objects.get_or_create(doctor_id=doctor_id)
+        DoctorRating.objects.filter(doctor_id=doctor_id).update(**changes)
+
+
+def rebuild_ratings(batch_size=1000):
+    """Recompute every doctor's aggregates from the review table in one pass."""
+    histogram = {
+        f'rating_{value}': Count('id', filter=Q(rating=value)) for value in RATING_VALUES
+    }
+    totals = {
+        row['doctor_id']: row
+        for row in Review.objects.order_by().values('doctor_id').annotate(
+            review_count=Count('id'), rating_sum=Sum('rating'), **histogram
+        )
+    }
+
+    summaries = []
+    for doctor_id in Doctor.objects.values_list('id', flat=True).iterator():
+        row = totals.get(doctor_id, {})
+        count = row.get('review_count', 0)
+        total = row.get('rating_sum') or 0
+        summaries.append(DoctorRating(
+            doctor_id=doctor_id,
+            review_count=count,
+            rating_sum=total,
+            average=total / count if count else 0,
+            **{field: row.get(field, 0) for field in histogram},
+        ))
+
+    with transaction.atomic():
+        DoctorRating.objects.all().delete()
+        DoctorRating.objects.bulk_create(summaries, batch_size=batch_size)
+        invalidate_models(Doctor)
+    return len(summaries)
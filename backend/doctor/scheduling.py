@@ -0,0 +1,147 @@
+"""
+Weekly schedules, the concrete slots generated from them and the
+"next free slot" search.
+"""
+import re
+from datetime import datetime, time, timedelta
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from hospital_management.constant import SLOT_HORIZON_DAYS
+from .models import Doctor, Schedule, Slot
+
+DAY_NAMES = {
+    'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6,
+}
+DAY_PATTERN = r'(mon|tue|wed|thu|fri|sat|sun)[a-z]*'
+TIME_PATTERN = r'(\d{1,2})(?:[:.](\d{2}))?\s*([ap])?\.?\s*m?\.?'
+RANGE_RE = re.compile(rf'{TIME_PATTERN}\s*(?:-|–|to)\s*{TIME_PATTERN}', re.IGNORECASE)
+DAY_RANGE_RE = re.compile(rf'{DAY_PATTERN}\s*(?:-|–|to)\s*{DAY_PATTERN}', re.IGNORECASE)
+DAY_RE = re.compile(DAY_PATTERN, re.IGNORECASE)
+
+
+def _to_time(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.lower() == 'p' else 0)
+    return time(hour % 24, minute)
+
+
+def parse_weekdays(text):
+    """Return the weekdays named in `text` ("Sat-Thu", "Sun, Tue"), or every day if none are."""
+    days = set()
+    for first, last in DAY_RANGE_RE.findall(text):
+        day, last = DAY_NAMES[first.lower()], DAY_NAMES[last.lower()]
+        days.add(day)
+        while day != last:
+            day = (day + 1) % 7
+            days.add(day)
+    for name in DAY_RE.findall(DAY_RANGE_RE.sub(' ', text)):
+        days.add(DAY_NAMES[name.lower()])
+    return sorted(days) if days else list(range(7))
+
+
+def parse_available_time(text):
+    """
+    Turn a legacy AvailableTime string such as "Sat-Thu 9:00 AM - 12:00 PM"
+    into [(weekday, start, end), ...]. Returns [] when no time range can
+    be found.
+    """
+    windows = []
+    for hour1, minute1, meridiem1, hour2, minute2, meridiem2 in RANGE_RE.findall(text):
+        # "9 - 12 PM": the first time borrows the second one's meridiem
+        # unless that would put it after the end.
+        if not meridiem1 and meridiem2:
+            start = _to_time(hour1, minute1, meridiem2)
+            if start >= _to_time(hour2, minute2, meridiem2):
+                start = _to_time(hour1, minute1, 'a')
+        else:
+            start = _to_time(hour1, minute1, meridiem1)
+        end = _to_time(hour2, minute2, meridiem2)
+        if start < end:
+            windows.append((start, end))
+    return [(weekday, start, end) for weekday in parse_weekdays(text) for start, end in windows]
+
+
+def schedule_slots(schedule, day):
+    """Yield the (start, end) datetimes of `schedule` on `day`."""
+    length = timedelta(minutes=schedule.slot_minutes)
+    start = timezone.make_aware(datetime.combine(day, schedule.start_time))
+    end_of_window = timezone.make_aware(datetime.combine(day, schedule.end_time))
+    while start + length <= end_of_window:
+        yield start, start + length
+        start += length
+
+
+def generate_slots(start_date=None, days=SLOT_HORIZON_DAYS, schedules=None, batch_size=5000):
+    """
+    Create the slots of `schedules` (default: all) for `days` days starting
+    at `start_date`. Existing slots are left alone, so this is safe to run
+    repeatedly, e.g. nightly from cron. Returns the number of slots
+    written, including ones that already existed.
+    """
+    start_date = start_date or timezone.localdate()
+    if schedules is None:
+        schedules = Schedule.objects.all()
+    by_weekday = {}
+    for schedule in schedules:
+        by_weekday.setdefault(schedule.weekday, []).append(schedule)
+
+    written = 0
+    batch = []
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        for schedule in by_weekday.get(day.weekday(), []):
+            for start, end in schedule_slots(schedule, day):
+                batch.append(Slot(doctor_id=schedule.doctor_id, schedule=schedule, start=start, end=end))
+        if len(batch) >= batch_size:
+            written += len(Slot.objects.bulk_create(batch, ignore_conflicts=True))
+            batch = []
+    if batch:
+        written += len(Slot.objects.bulk_create(batch, ignore_conflicts=True))
+    return written
+
+
+def next_free_slots(specialisation=None, after=None, limit=10, doctor=None):
+    """
+    The next `limit` free slots starting at or after `after` (default: now),
+    across every doctor with the given specialisation (an id or slug).
+    Walks the partial index on free slots in start order.
+    """
+    slots = Slot.objects.filter(is_booked=False, start__gte=after or timezone.now())
+    if specialisation is not None:
+        lookup = 'specialisation' if str(specialisation).isdigit() else 'specialisation__slug'
+        slots = slots.filter(doctor__in=Doctor.objects.filter(**{lookup: specialisation}).values('id'))
+    if doctor is not None:
+        slots = slots.filter(doctor=doctor)
+    return slots.select_related('doctor__user').order_by('start', 'id')[:limit]
+
+
+def overlapping_slots(doctor, start, end):
+    """Slots of `doctor` that overlap the interval [start, end)."""
+    return Slot.objects.filter(doctor=doctor, start__lt=end, end__gt=start)
+
+
+class SlotUnavailable(Exception):
+    """The slot is full, already started or doesn't exist."""
+
+
+def reserve_slot(slot_id):
+    """
+    Take one place in a slot. The capacity check and the increment are a
+    single conditional UPDATE, so concurrent bookings can never push a
+    slot past its capacity: the database serialises them on the row and
+    the losers simply match zero rows.
+    """
+    updated = Slot.objects.filter(
+        pk=slot_id, booked_count__lt=F('capacity'), start__gt=timezone.now()
+    ).update(
+        booked_count=F('booked_count') + 1,
+        is_booked=Case(When(booked_count__gte=F('capacity') - 1, then=Value(True)), default=Value(False)),
+    )
+    if not updated:
+        raise SlotUnavailable(slot_id)
+
+
+def release_slot(slot_id, count=1):
+    """Give `count` places in a slot back."""
+    Slot.objects.filter(pk=slot_id, booked_count__gte=count).update(booked_count=F('booked_count') - count, is_booked=False)
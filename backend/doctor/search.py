@@ -0,0 +1,125 @@
+"""
+Full-text search over doctors.
+
+Each doctor has a DoctorSearchDocument row holding their name,
+specialisations, designations and fee band. The database indexes that
+text itself: an FTS5 table on SQLite and a generated tsvector column with
+a GIN index on PostgreSQL (both created in migration 0004). Other
+databases fall back to a plain `icontains` scan.
+"""
+import re
+from collections import defaultdict
+from django.db import connection
+from hospital_management.constant import FEE_BANDS
+from .models import Doctor, DoctorSearchDocument
+
+FTS_TABLE = 'doctor_search_fts'
+
+# Upper bound on the number of ranked ids search_doctor_ids returns.
+SEARCH_LIMIT = 1000
+
+
+def fee_band(fee):
+    for limit, label in FEE_BANDS:
+        if limit is None or fee <= limit:
+            return label
+
+
+def build_documents(doctor_ids):
+    """Return {doctor_id: body} for the given doctors in four queries."""
+    names = defaultdict(list)
+    for relation in ('specialisation', 'designation'):
+        through = getattr(Doctor, relation).through
+        rows = through.objects.filter(doctor_id__in=doctor_ids).values_list('doctor_id', f'{relation}__name')
+        for doctor_id, name in rows:
+            names[doctor_id].append(name)
+
+    documents = {}
+    doctors = Doctor.objects.filter(pk__in=doctor_ids).values_list('id', 'user__first_name', 'user__last_name', 'fee')
+    for doctor_id, first_name, last_name, fee in doctors:
+        parts = [first_name, last_name, *names[doctor_id], fee_band(fee)]
+        documents[doctor_id] = ' '.join(part for part in parts if part)
+    return documents
+
+
+def index_doctors(doctor_ids):
+    """(Re)build the search documents of the given doctors."""
+    doctor_ids = list(doctor_ids)
+    if not doctor_ids:
+        return 0
+    documents = build_documents(doctor_ids)
+    DoctorSearchDocument.objects.bulk_create(
+        [DoctorSearchDocument(doctor_id=doctor_id, body=body) for doctor_id, body in documents.items()],
+        update_conflicts=True,
+        unique_fields=['doctor'],
+        update_fields=['body'],
+    )
+    return len(documents)
+
+
+def rebuild_index(batch_size=1000):
+    """Re-index every doctor, `batch_size` doctors at a time."""
+    total = 0
+    batch = []
+    for doctor_id in Doctor.objects.order_by('id').values_list('id', flat=True).iterator():
+        batch.append(doctor_id)
+        if len(batch) == batch_size:
+            total += index_doctors(batch)
+            batch = []
+    return total + index_doctors(batch)
+
+
+def match_query(term):
+    """
+    The full-text query for `term` in this database's syntax, or None if it
+    has no words. The last word is treated as a prefix so results show up
+    while the user is still typing.
+    """
+    tokens = re.findall(r'\w+', term.lower())
+    if not tokens:
+        return None
+    if connection.vendor == 'postgresql':
+        return ' & '.join(f'{token}:*' for token in tokens)
+    if connection.vendor == 'sqlite':
+        return ' '.join(f'"{token}"*' for token in tokens)
+    return tokens
+
+
+def search_doctors(queryset, term):
+    """
+    Narrow `queryset` to the doctors matching every word of `term` and
+    annotate `search_rank`, lower for a better match. The index is joined
+    into the query, so it still counts and pages the whole match set and
+    each match is ranked once.
+    """
+    query = match_query(term)
+    if query is None:
+        return queryset.none()
+    doctor_id = f'{connection.ops.quote_name(Doctor._meta.db_table)}.{connection.ops.quote_name("id")}'
+    if connection.vendor == 'sqlite':
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {doctor_id}', f'{FTS_TABLE} MATCH %s'],
+            params=[query],
+            select={'search_rank': f'bm25({FTS_TABLE})'},
+        )
+    elif connection.vendor == 'postgresql':
+        table = DoctorSearchDocument._meta.db_table
+        queryset = queryset.extra(
+            tables=[table],
+            where=[f'{table}.doctor_id = {doctor_id}', f"{table}.vector @@ to_tsquery('simple', %s)"],
+            params=[query],
+            select={'search_rank': f"-ts_rank_cd({table}.vector, to_tsquery('simple', %s))"},
+            select_params=[query],
+        )
+    else:
+        documents = DoctorSearchDocument.objects.all()
+        for token in query:
+            documents = documents.filter(body__icontains=token)
+        queryset = queryset.filter(pk__in=documents.values('doctor_id')).extra(select={'search_rank': '0'})
+    return queryset.order_by('search_rank', 'pk')
+
+
+def search_doctor_ids(term, limit=SEARCH_LIMIT):
+    """Return the ids of the first `limit` doctors matching `term`, best match first."""
+    return list(search_doctors(Doctor.objects.all(), term).values_list('pk', flat=True)[:limit])
@@ -1,5 +1,18 @@
 from rest_framework import serializers
-from .models import Doctor, AvailableTime, Designation, Specialisation, Review
+from hospital_management.images import RenditionsField
+from .models import Doctor, DoctorRating, AvailableTime, Designation, Specialisation, Review, Schedule, Slot
+
+
+class DoctorRatingSerializer(serializers.ModelSerializer):
+    histogram = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DoctorRating
+        fields = ['average', 'review_count', 'histogram']
+
+    def get_histogram(self, obj):
+        # JSON object keys are strings, so key the stars the same way RATING_CHOICES labels them.
+        return {str(value): count for value, count in obj.histogram.items()}
 
 
 class DoctorSerializer(serializers.ModelSerializer):
@@ -14,18 +27,32 @@ class DoctorSerializer(serializers.ModelSerializer):
         read_only=True,
         slug_field='name'
     )
-
+    rating = serializers.SerializerMethodField()
+    profile_renditions = RenditionsField(source='profile')
 
     class Meta:
         model = Doctor
         fields = [
-            'id', 'user', 'profile', 'designation',
-            'specialisation', 'available_time', 'fee', 'meet_link'
+            'id', 'user', 'profile', 'profile_renditions', 'designation',
+            'specialisation', 'available_time', 'fee', 'meet_link', 'rating'
         ]
 
     def get_user(self, obj):
+        # `full_name` is annotated by DoctorViewSet's queryset.
+        full_name = getattr(obj, 'full_name', None)
+        if full_name is not None:
+            return full_name
         return f"{obj.user.first_name} {obj.user.last_name}"
 
+    def get_rating(self, obj):
+        try:
+            summary = obj.rating_summary
+        except DoctorRating.DoesNotExist:
+            # Doctors created with bulk_create have no summary until
+            # `rebuild_doctor_ratings` runs.
+            summary = DoctorRating(doctor=obj)
+        return DoctorRatingSerializer(summary).data
+
 
 class DesignationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -48,3 +75,24 @@ class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = ['id', 'reviewer', 'doctor', 'rating', 'body', 'created_on']
+
+
+class ScheduleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Schedule
+        fields = '__all__'
+
+    def validate(self, attrs):
+        start_time = attrs.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = attrs.get('end_time', getattr(self.instance, 'end_time', None))
+        if start_time and end_time and start_time >= end_time:
+            raise serializers.ValidationError("start_time must be before end_time")
+        return attrs
+
+
+class SlotSerializer(serializers.ModelSerializer):
+    doctor_name = serializers.CharField(source='doctor.__str__', read_only=True)
+
+    class Meta:
+        model = Slot
+        fields = ['id', 'doctor', 'doctor_name', 'start', 'end', 'capacity', 'booked_count', 'is_booked']
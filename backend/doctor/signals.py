@@ -0,0 +1,129 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from hospital_management.images import track_images
+from hospital_management.response_cache import track_tags
+from hospital_management.table_versions import track_models
+from .models import AvailableTime, Doctor, DoctorRating, Designation, Specialisation, Review, Schedule, Slot
+from .ratings import apply_rating_delta
+from .search import index_doctors
+from .scheduling import generate_slots, parse_available_time
+
+track_models(Doctor, Review, Specialisation, Designation, AvailableTime)
+# A doctor shows its user's name, the names of its specialisations and
+# designations, and its rating, which follows its reviews.
+track_tags(
+    Doctor, 'doctor', partitions=('specialisation', 'designation'),
+    follows=('user', 'specialisation', 'designation', 'reviews'),
+)
+track_tags(Review, 'review', partitions=('doctor',), follows=('reviwer__user',))
+track_images(Doctor, 'profile')
+
+
+@receiver(post_save, sender=Doctor)
+def create_doctor_rating(sender, instance, created, **kwargs):
+    """Give every new doctor an empty rating summary"""
+    if created:
+        DoctorRating.objects.get_or_create(doctor=instance)
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    """Keep the stored doctor and rating so an edit can be undone from the aggregates"""
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = Review.objects.filter(pk=instance.pk).values_list('doctor_id', 'rating').first()
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, **kwargs):
+    previous = instance._previous_rating
+    current = (instance.doctor_id, int(instance.rating))
+    if previous == current:
+        return
+    if previous:
+        apply_rating_delta(*previous, delta=-1)
+    apply_rating_delta(*current, delta=1)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    apply_rating_delta(instance.doctor_id, instance.rating, delta=-1)
+
+
+# Search index ---------------------------------------------------------------
+
+@receiver(post_save, sender=Doctor)
+def index_doctor(sender, instance, **kwargs):
+    index_doctors([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def index_doctor_user(sender, instance, created, **kwargs):
+    """A doctor's name lives on their user"""
+    if not created:
+        index_doctors(Doctor.objects.filter(user=instance).values_list('id', flat=True))
+
+
+@receiver(m2m_changed, sender=Doctor.specialisation.through)
+@receiver(m2m_changed, sender=Doctor.designation.through)
+def index_doctor_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            index_doctors([instance.pk])
+    elif action == 'pre_clear':
+        instance._search_doctor_ids = list(instance.doctor_set.values_list('id', flat=True))
+    elif action == 'post_clear':
+        index_doctors(instance._search_doctor_ids)
+    elif action in ('post_add', 'post_remove'):
+        index_doctors(pk_set)
+
+
+@receiver(post_save, sender=Specialisation)
+@receiver(post_save, sender=Designation)
+def index_renamed_relation(sender, instance, created, **kwargs):
+    if not created:
+        index_doctors(instance.doctor_set.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Specialisation)
+@receiver(pre_delete, sender=Designation)
+def remember_related_doctors(sender, instance, **kwargs):
+    instance._search_doctor_ids = list(instance.doctor_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Specialisation)
+@receiver(post_delete, sender=Designation)
+def index_deleted_relation(sender, instance, **kwargs):
+    index_doctors(instance._search_doctor_ids)
+
+
+# Slots ----------------------------------------------------------------------
+
+@receiver(post_save, sender=Schedule)
+def generate_schedule_slots(sender, instance, created, **kwargs):
+    """Keep a schedule's future free slots in line with its window"""
+    if not created:
+        # A cancelled appointment frees its place but still points at the slot.
+        instance.slots.filter(booked_count=0, appointments__isnull=True, start__gte=timezone.now()).delete()
+    generate_slots(schedules=[instance])
+
+
+@receiver(m2m_changed, sender=Doctor.available_time.through)
+def schedules_from_available_time(sender, instance, action, reverse, pk_set, **kwargs):
+    """Doctors still pick free-text available times; turn them into weekly schedules"""
+    if reverse or action not in ('post_add', 'post_remove'):
+        return
+    if action == 'post_remove':
+        schedules = Schedule.objects.filter(doctor=instance, available_time__in=pk_set)
+        Slot.objects.filter(
+            schedule__in=schedules, booked_count=0, appointments__isnull=True, start__gte=timezone.now()
+        ).delete()
+        schedules.delete()
+        return
+    for available_time in AvailableTime.objects.filter(pk__in=pk_set):
+        for weekday, start, end in parse_available_time(available_time.time):
+            Schedule.objects.get_or_create(
+                doctor=instance, available_time=available_time, weekday=weekday, start_time=start, end_time=end
+            )
@@ -1,3 +1,432 @@
-from django.test import TestCase
+import tempfile
+import threading
+from datetime import date, datetime, time, timedelta
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models.signals import pre_save
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from hospital_management import caching, response_cache
 
-# Create your tests here.
+from .models import Doctor, DoctorRating, Designation, Specialisation, AvailableTime, Review, Schedule, Slot
+from .ratings import rebuild_ratings
+from .search import rebuild_index, search_doctor_ids
+from .scheduling import generate_slots, parse_available_time
+
+
+def create_doctors(count, start=0):
+    """Bulk create `count` doctors, each linked to every M2M option."""
+    users = User.objects.bulk_create([
+        User(username=f'doctor{i}', first_name='Doc', last_name=str(i))
+        for i in range(start, start + count)
+    ])
+    doctors = Doctor.objects.bulk_create([Doctor(user=user, fee=500) for user in users])
+    designation = Designation.objects.get_or_create(name='Consultant', slug='consultant')[0]
+    specialisation = Specialisation.objects.get_or_create(name='Cardiology', slug='cardiology')[0]
+    available_time = AvailableTime.objects.get_or_create(time='9:00 AM - 12:00 PM')[0]
+    Doctor.designation.through.objects.bulk_create([
+        Doctor.designation.through(doctor=doctor, designation=designation) for doctor in doctors
+    ])
+    Doctor.specialisation.through.objects.bulk_create([
+        Doctor.specialisation.through(doctor=doctor, specialisation=specialisation) for doctor in doctors
+    ])
+    Doctor.available_time.through.objects.bulk_create([
+        Doctor.available_time.through(doctor=doctor, availabletime=available_time) for doctor in doctors
+    ])
+    return doctors
+
+
+class DoctorListQueryCountTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/doctors/', {'limits': 1000})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.data
+
+    def test_query_count_is_flat_from_10_to_1000_doctors(self):
+        create_doctors(10)
+        small_count, data = self.count_list_queries()
+        self.assertEqual(len(data['results']), 10)
+
+        create_doctors(990, start=10)
+        large_count, data = self.count_list_queries()
+        self.assertEqual(len(data['results']), 1000)
+
+        self.assertEqual(small_count, large_count)
+
+    def test_display_name_and_relations(self):
+        create_doctors(1)
+        _, data = self.count_list_queries()
+        doctor = data['results'][0]
+        self.assertEqual(doctor['user'], 'Doc 0')
+        self.assertEqual(doctor['designation'], ['Consultant'])
+        self.assertEqual(doctor['specialisation'], ['Cardiology'])
+        self.assertEqual(len(doctor['available_time']), 1)
+
+
+class DoctorRatingTest(TestCase):
+    def setUp(self):
+        self.doctor = Doctor.objects.create(user=User.objects.create(username='dr'), fee=500)
+        self.other = Doctor.objects.create(user=User.objects.create(username='dr2'), fee=800)
+        self.patient = User.objects.create(username='patient').patient
+
+    def summary(self, doctor):
+        return DoctorRating.objects.get(doctor=doctor)
+
+    def review(self, rating, doctor=None):
+        return Review.objects.create(reviwer=self.patient, doctor=doctor or self.doctor, body='-', rating=rating)
+
+    def test_create_edit_delete_keep_aggregates_in_sync(self):
+        first = self.review(5)
+        self.review(3)
+        summary = self.summary(self.doctor)
+        self.assertEqual((summary.review_count, summary.rating_sum, summary.average), (2, 8, 4.0))
+        self.assertEqual(summary.histogram, {1: 0, 2: 0, 3: 1, 4: 0, 5: 1})
+
+        first.rating = 1
+        first.save()
+        summary = self.summary(self.doctor)
+        self.assertEqual((summary.review_count, summary.average), (2, 2.0))
+        self.assertEqual(summary.histogram, {1: 1, 2: 0, 3: 1, 4: 0, 5: 0})
+
+        first.doctor = self.other
+        first.save()
+        self.assertEqual(self.summary(self.doctor).review_count, 1)
+        self.assertEqual(self.summary(self.other).average, 1.0)
+
+        first.delete()
+        summary = self.summary(self.other)
+        self.assertEqual((summary.review_count, summary.average), (0, 0.0))
+
+    def test_rebuild_fixes_drift(self):
+        self.review(4)
+        self.review(2, doctor=self.other)
+        DoctorRating.objects.update(review_count=99, average=0)
+        rebuild_ratings()
+        self.assertEqual(self.summary(self.doctor).average, 4.0)
+        self.assertEqual(self.summary(self.other).histogram[2], 1)
+
+    def test_filter_and_sort_by_rating(self):
+        self.review(2)
+        self.review(5, doctor=self.other)
+        client = APIClient()
+        response = client.get('/doctors/', {'ordering': '-avg_rating'})
+        self.assertEqual([d['id'] for d in response.data['results']], [self.other.id, self.doctor.id])
+        self.assertEqual(response.data['results'][0]['rating']['histogram']['5'], 1)
+        response = client.get('/doctors/', {'min_rating': 4})
+        self.assertEqual([d['id'] for d in response.data['results']], [self.other.id])
+
+
+class DoctorSearchTest(TestCase):
+    def setUp(self):
+        self.cardiology = Specialisation.objects.create(name='Cardiology', slug='cardiology')
+        self.neurology = Specialisation.objects.create(name='Neurology', slug='neurology')
+        self.rahman = Doctor.objects.create(user=User.objects.create(username='a', first_name='Nusrat', last_name='Rahman'), fee=400)
+        self.khan = Doctor.objects.create(user=User.objects.create(username='b', first_name='Imran', last_name='Khan'), fee=2000)
+        self.rahman.specialisation.add(self.cardiology)
+        self.khan.specialisation.add(self.neurology)
+
+    def search(self, term):
+        response = APIClient().get('/doctors/', {'search': term})
+        return [doctor['id'] for doctor in response.data['results']]
+
+    def test_search_by_name_specialisation_and_fee_band(self):
+        self.assertEqual(self.search('rahman'), [self.rahman.id])
+        self.assertEqual(self.search('neuro'), [self.khan.id])
+        self.assertEqual(self.search('cardiology budget'), [self.rahman.id])
+        self.assertEqual(self.search('cardiology premium'), [])
+
+    def test_results_are_ranked(self):
+        self.khan.user.last_name = 'Cardiology Khan'
+        self.khan.user.save()
+        self.khan.specialisation.add(self.cardiology)
+        # Khan matches "cardiology" twice, Rahman once.
+        self.assertEqual(search_doctor_ids('cardiology'), [self.khan.id, self.rahman.id])
+
+    def test_index_follows_relation_changes(self):
+        self.rahman.specialisation.remove(self.cardiology)
+        self.assertEqual(self.search('cardiology'), [])
+        self.neurology.name = 'Neurosurgery'
+        self.neurology.save()
+        self.assertEqual(self.search('neurosurgery'), [self.khan.id])
+        self.neurology.delete()
+        self.assertEqual(self.search('neurosurgery'), [])
+        self.khan.user.first_name = 'Tanvir'
+        self.khan.user.save()
+        self.assertEqual(self.search('tanvir'), [self.khan.id])
+
+    def test_rebuild_index(self):
+        create_doctors(3)
+        self.assertEqual(search_doctor_ids('consultant'), [])
+        rebuild_index()
+        self.assertEqual(len(search_doctor_ids('consultant')), 3)
+
+    def test_every_match_is_counted_and_paged(self):
+        doctors = create_doctors(1001)
+        rebuild_index()
+        response = APIClient().get('/doctors/', {'search': 'consultant', 'limits': 10, 'page': 101})
+        self.assertEqual(response.data['count'], 1001)
+        self.assertEqual([doctor['id'] for doctor in response.data['results']], [doctors[-1].id])
+
+
+@override_settings(TABLE_VERSION_DIR=tempfile.mkdtemp())
+class ReferenceDataCacheTest(TransactionTestCase):
+    def setUp(self):
+        caching.clear()
+        self.client = APIClient()
+        Specialisation.objects.create(name='Cardiology', slug='cardiology')
+
+    def get(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/specialisations/')
+        return response, len(ctx.captured_queries)
+
+    def test_hits_skip_the_database_until_the_table_changes(self):
+        response, queries = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(queries, 1)
+
+        response, queries = self.get()
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(queries, 0)
+        self.assertEqual(response.json()[0]['name'], 'Cardiology')
+
+        Specialisation.objects.create(name='Neurology', slug='neurology')
+        response, queries = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()), 2)
+        self.assertEqual(caching.get_stats()['hits'], 1)
+        self.assertEqual(caching.get_stats()['misses'], 2)
+
+
+@override_settings(TABLE_VERSION_DIR=tempfile.mkdtemp())
+class ResponseCacheTest(TransactionTestCase):
+    def setUp(self):
+        response_cache.clear()
+        self.client = APIClient()
+        self.cardiology = Specialisation.objects.create(name='Cardiology', slug='cardiology')
+        self.doctor = Doctor.objects.create(user=User.objects.create(username='dr', first_name='Ann'), fee=500)
+        self.other = Doctor.objects.create(user=User.objects.create(username='dr2'), fee=800)
+        self.doctor.specialisation.add(self.cardiology)
+        self.patient = User.objects.create(username='patient', first_name='Pat').patient
+
+    def review(self, doctor):
+        return Review.objects.create(reviwer=self.patient, doctor=doctor, body='-', rating=5)
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response['X-Cache']
+
+    def test_only_the_affected_partition_is_invalidated(self):
+        self.review(self.doctor)
+        mine, others = ('/reviews/', {'doctor': self.doctor.pk}), ('/reviews/', {'doctor': self.other.pk})
+        self.assertEqual([self.get(*mine), self.get(*others)], ['MISS', 'MISS'])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.get(*mine), 'HIT')
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        self.review(self.other)
+        self.assertEqual([self.get(*mine), self.get(*others)], ['HIT', 'MISS'])
+        self.review(self.doctor)
+        self.assertEqual(self.get(*mine), 'MISS')
+        self.assertEqual(len(self.client.get(*mine).json()['results']), 2)
+
+    def test_related_rows_invalidate_the_responses_showing_them(self):
+        listing = ('/doctors/', {'specialisation': self.cardiology.pk})
+        self.assertEqual([self.get(*listing), self.get(*listing)], ['MISS', 'HIT'])
+        self.assertEqual(self.get(f'/doctors/{self.other.pk}/'), 'MISS')
+
+        self.doctor.user.first_name = 'Anna'
+        self.doctor.user.save()
+        self.assertEqual(self.get(*listing), 'MISS')
+        self.assertEqual(self.client.get(*listing).json()['results'][0]['user'], 'Anna ')
+        # Neither the other doctor nor his reviews were touched.
+        self.assertEqual(self.get(f'/doctors/{self.other.pk}/'), 'HIT')
+
+        self.other.specialisation.add(self.cardiology)
+        self.assertEqual(self.get(*listing), 'MISS')
+        self.assertEqual(len(self.client.get(*listing).json()['results']), 2)
+
+        # A review changes the doctor's rating.
+        self.review(self.doctor)
+        self.assertEqual(self.get(f'/doctors/{self.doctor.pk}/'), 'MISS')
+        self.assertEqual(self.client.get(f'/doctors/{self.doctor.pk}/').json()['rating']['review_count'], 1)
+
+    def test_key_and_scope(self):
+        self.assertEqual(self.get('/doctors/', {'fee': 500, 'limits': 5}), 'MISS')
+        self.assertEqual(self.get('/doctors/?limits=5&fee=500'), 'HIT')
+        self.client.force_authenticate(self.patient.user)
+        self.assertEqual(self.get('/doctors/?limits=5&fee=500'), 'MISS')
+
+    def test_other_workers_see_invalidations(self):
+        self.get('/services/')
+        # Another worker bumps the tag in the shared file.
+        response_cache.TagVersions().bump(['services:all'])
+        self.assertEqual(self.get('/services/'), 'MISS')
+
+    def test_bulk_writes_and_stats(self):
+        self.get('/doctors/')
+        create_doctors(2)
+        stale = self.client.get('/doctors/')
+        self.assertEqual((stale['X-Cache'], len(stale.json()['results'])), ('HIT', 2))
+        response_cache.invalidate_models(Doctor)
+        self.assertEqual(self.get('/doctors/'), 'MISS')
+        fresh = self.client.get('/doctors/')
+        self.assertEqual((fresh['X-Cache'], len(fresh.json()['results'])), ('HIT', 4))
+        stats = response_cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['stale']), (2, 2, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertEqual(stats['bytes_saved'], len(stale.content) + len(fresh.content))
+
+
+@override_settings(TABLE_VERSION_DIR=tempfile.mkdtemp())
+class ConditionalRequestTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='dr', first_name='Nusrat')
+        self.doctor = Doctor.objects.create(user=self.user, fee=500)
+        self.client = APIClient()
+
+    def test_unchanged_list_is_answered_with_304_without_queries(self):
+        response = self.client.get('/doctors/')
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/doctors/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        response = self.client.get('/doctors/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        self.user.first_name = 'Sadia'
+        self.user.save()
+        response = self.client.get('/doctors/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_match_guards_updates(self):
+        self.client.force_authenticate(self.user)
+        url = f'/doctors/{self.doctor.id}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.patch(url, {'fee': 600}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.patch(url, {'fee': 700}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.doctor.refresh_from_db()
+        self.assertEqual(self.doctor.fee, 600)
+
+    def test_writes_to_other_rows_keep_an_objects_etag(self):
+        self.client.force_authenticate(self.user)
+        url = f'/doctors/{self.doctor.id}/'
+        etag = self.client.get(url)['ETag']
+        other = Doctor.objects.create(user=User.objects.create(username='dr2'), fee=300)
+        other.user.first_name = 'Sadia'
+        other.user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.patch(url, {'fee': 600}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentConditionalWriteTest(TransactionTestCase):
+    def test_only_one_of_two_writes_from_the_same_read_passes(self):
+        user = User.objects.create(username='dr')
+        doctor = Doctor.objects.create(user=user, fee=500)
+        url = f'/doctors/{doctor.id}/'
+        client = APIClient()
+        client.force_authenticate(user)
+        etag = client.get(url)['ETag']
+        saving, release = threading.Event(), threading.Event()
+
+        def hold_first_save(sender, instance, **kwargs):
+            if not saving.is_set():
+                saving.set()
+                release.wait(5)
+
+        statuses = {}
+
+        def patch(fee):
+            other = APIClient()
+            other.force_authenticate(user)
+            try:
+                statuses[fee] = other.patch(url, {'fee': fee}, HTTP_IF_MATCH=etag).status_code
+            finally:
+                connection.close()
+
+        pre_save.connect(hold_first_save, sender=Doctor)
+        try:
+            first = threading.Thread(target=patch, args=(600,))
+            first.start()
+            saving.wait(5)
+            # The second write reads the row while the first still holds it.
+            second = threading.Thread(target=patch, args=(700,))
+            second.start()
+            second.join(0.5)
+            release.set()
+            first.join()
+            second.join()
+        finally:
+            pre_save.disconnect(hold_first_save, sender=Doctor)
+
+        self.assertEqual(statuses, {600: 200, 700: 412})
+        doctor.refresh_from_db()
+        self.assertEqual(doctor.fee, 600)
+
+
+class ScheduleTest(TestCase):
+    def setUp(self):
+        self.cardiology = Specialisation.objects.create(name='Cardiology', slug='cardiology')
+        self.doctor = Doctor.objects.create(user=User.objects.create(username='dr'), fee=500)
+        self.doctor.specialisation.add(self.cardiology)
+        self.other = Doctor.objects.create(user=User.objects.create(username='dr2'), fee=500)
+
+    def test_parse_legacy_time_strings(self):
+        self.assertEqual(parse_available_time('Fri 2:00 PM - 5:30 PM'), [(4, time(14), time(17, 30))])
+        self.assertEqual(len(parse_available_time('Sat-Mon 9 - 12 pm')), 3)
+        self.assertEqual(parse_available_time('Morning'), [])
+
+    def test_generate_slots_is_idempotent(self):
+        monday = date(2030, 1, 7)
+        schedule = Schedule.objects.create(doctor=self.doctor, weekday=0, start_time=time(9), end_time=time(10, 45), slot_minutes=30)
+        Slot.objects.all().delete()
+        generate_slots(start_date=monday, days=14, schedules=[schedule])
+        generate_slots(start_date=monday, days=14, schedules=[schedule])
+        starts = list(Slot.objects.order_by('start').values_list('start', flat=True))
+        # 9:00, 9:30 and 10:00 on both Mondays; 10:30 doesn't fit.
+        self.assertEqual(len(starts), 6)
+        self.assertEqual(starts[0], timezone.make_aware(datetime(2030, 1, 7, 9)))
+
+    def test_available_times_become_schedules_and_slots(self):
+        available_time = AvailableTime.objects.create(time='Sun-Sat 9:00 AM - 10:00 AM')
+        self.doctor.available_time.add(available_time)
+        self.assertEqual(self.doctor.schedules.count(), 7)
+        self.assertTrue(self.doctor.slots.exists())
+        self.doctor.available_time.remove(available_time)
+        self.assertFalse(self.doctor.schedules.exists())
+
+    def test_next_free_slots_by_specialisation(self):
+        now = timezone.now()
+        Slot.objects.bulk_create([
+            Slot(doctor=self.doctor, start=now + timedelta(hours=1), end=now + timedelta(hours=2), booked_count=1, is_booked=True),
+            Slot(doctor=self.doctor, start=now + timedelta(hours=3), end=now + timedelta(hours=4)),
+            Slot(doctor=self.other, start=now + timedelta(hours=2), end=now + timedelta(hours=3)),
+            Slot(doctor=self.doctor, start=now - timedelta(hours=3), end=now - timedelta(hours=2)),
+        ])
+        response = APIClient().get('/slots/next-free/', {'specialisation': 'cardiology', 'limit': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['doctor'], self.doctor.id)
+        response = APIClient().get('/slots/next-free/', {'limit': 5})
+        self.assertEqual([slot['doctor'] for slot in response.data], [self.other.id, self.doctor.id])
+        response = APIClient().get('/slots/next-free/', {'doctor': self.other.id})
+        self.assertEqual([slot['doctor'] for slot in response.data], [self.other.id])
+        self.assertEqual(APIClient().get('/slots/next-free/', {'doctor': 'abc'}).status_code, 400)
@@ -8,6 +8,8 @@ router.register('available-time', views.AvailableTimeViewSet, basename='availabl
 router.register('reviews', views.ReviewViewSet, basename='reviews')
 router.register('designations', views.DesignationViewSet, basename='designations')
 router.register('specialisations', views.SpecialisationViewSet, basename='specialisations')
+router.register('schedules', views.ScheduleViewSet, basename='schedules')
+router.register('slots', views.SlotViewSet, basename='slots')
 
 # The API URLs are now determined automatically by the router.
 urlpatterns = [
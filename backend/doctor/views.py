@@ -1,24 +1,49 @@
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAdminUser, IsAuthenticatedOrReadOnly
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
+from django.contrib.auth.models import User
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from . import serializers
-from .models import Doctor, AvailableTime, Designation, Specialisation, Review
-from rest_framework.throttling import UserRateThrottle
+from .filters import DoctorFilter, DoctorSearchFilter
+from .models import Doctor, AvailableTime, Designation, Specialisation, Review, Schedule, Slot
+from .scheduling import next_free_slots
+from hospital_management.throttling import UserRateThrottle
 from hospital_management.permissions import IsOwnerOrReadOnly, IsAdminUserOrReadOnly
-from hospital_management.paginations import StandardResultsSetPagination
+from hospital_management.paginations import StandardResultsSetPagination, KeysetOrPageNumberPagination
+from hospital_management.caching import ReferenceDataCacheMixin
+from hospital_management.response_cache import ResponseCacheMixin
+from hospital_management.conditional import ConditionalRequestMixin
+from hospital_management.streaming import StreamingExportMixin
 # Create your views here.
 
-class DoctorViewSet(viewsets.ModelViewSet):
-    queryset = Doctor.objects.all()
+class DoctorViewSet(ConditionalRequestMixin, ResponseCacheMixin, viewsets.ModelViewSet):
+    # Join the user and batch-load the M2M relations so a page costs the same
+    # number of queries whatever its size. The display name is built in SQL.
+    queryset = Doctor.objects.select_related('user', 'rating_summary').prefetch_related(
+        'designation', 'specialisation', 'available_time'
+    ).annotate(
+        full_name=Concat('user__first_name', Value(' '), 'user__last_name'),
+        avg_rating=F('rating_summary__average'),
+        review_count=F('rating_summary__review_count'),
+    ).order_by('id')
     serializer_class = serializers.DoctorSerializer
+    conditional_models = [Doctor, User, Designation, Specialisation, AvailableTime, Review]
     permission_classes = [IsOwnerOrReadOnly]
     throttle_classes = [UserRateThrottle]
     pagination_class = StandardResultsSetPagination
-    filter_backends = [SearchFilter, DjangoFilterBackend]
-    filterset_fields = ['specialisation', 'designation', 'specialisation', 'fee', 'available_time']
+    filter_backends = [DoctorSearchFilter, DjangoFilterBackend, OrderingFilter]
+    filterset_class = DoctorFilter
+    # example: /doctors/?search=cardiology budget
+    # example: /doctors/?min_rating=4&ordering=-avg_rating
+    ordering_fields = ['fee', 'avg_rating', 'review_count']
 
     def create(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
@@ -31,30 +56,85 @@ class DoctorViewSet(viewsets.ModelViewSet):
         
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
-class AvailableTimeViewSet(viewsets.ModelViewSet):
+class AvailableTimeViewSet(ConditionalRequestMixin, ReferenceDataCacheMixin, viewsets.ModelViewSet):
     queryset = AvailableTime.objects.all()
     serializer_class = serializers.AvailableTimeSerializer
     permission_classes = [IsAdminUserOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['id']
      
-class DesignationViewSet(viewsets.ModelViewSet):
+class DesignationViewSet(ConditionalRequestMixin, ReferenceDataCacheMixin, viewsets.ModelViewSet):
     queryset = Designation.objects.all()
     serializer_class = serializers.DesignationSerializer
     permission_classes = [IsAdminUserOrReadOnly]
     
-class SpecialisationViewSet(viewsets.ModelViewSet):
+class SpecialisationViewSet(ConditionalRequestMixin, ReferenceDataCacheMixin, viewsets.ModelViewSet):
     queryset = Specialisation.objects.all()
     serializer_class = serializers.SpecialisationSerializer
     permission_classes = [IsAdminUserOrReadOnly]
 
-class ReviewViewSet(viewsets.ModelViewSet):
-    queryset = Review.objects.all()
+class ReviewViewSet(ConditionalRequestMixin, ResponseCacheMixin, StreamingExportMixin, viewsets.ModelViewSet):
+    queryset = Review.objects.select_related('reviwer__user')
     serializer_class = serializers.ReviewSerializer
+    conditional_models = [Review, User]
     permission_classes = [IsOwnerOrReadOnly]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetOrPageNumberPagination
     filter_backends = [DjangoFilterBackend, SearchFilter]
     filterset_fields = ['doctor', 'reviwer', 'rating']
     search_fields = ['doctor', 'reviwer']
+
     def perform_create(self, serializer):
         serializer.save(reviwer=self.request.user.patient)
+
+
+class ScheduleViewSet(viewsets.ModelViewSet):
+    queryset = Schedule.objects.select_related('doctor__user')
+    serializer_class = serializers.ScheduleSerializer
+    permission_classes = [IsAdminUserOrReadOnly]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['doctor', 'weekday']
+
+
+class SlotViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Slot.objects.select_related('doctor__user').order_by('start', 'id')
+    serializer_class = serializers.SlotSerializer
+    throttle_classes = [UserRateThrottle]
+    pagination_class = KeysetOrPageNumberPagination
+    keyset_ordering = 'start'
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {
+        'doctor': ['exact'],
+        'is_booked': ['exact'],
+        'start': ['gte', 'lt', 'date'],
+    }
+
+    @action(detail=False, methods=['get'], url_path='next-free')
+    def next_free(self, request):
+        """
+        The next free slots across doctors.
+        example: /slots/next-free/?specialisation=cardiology&after=2025-01-01T09:00:00Z&limit=5
+        """
+        after = request.query_params.get('after')
+        if after:
+            after = parse_datetime(after)
+            if after is None:
+                raise ValidationError({'after': 'Enter a valid ISO 8601 date/time.'})
+            if timezone.is_naive(after):
+                after = timezone.make_aware(after)
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 100)
+        except ValueError:
+            raise ValidationError({'limit': 'Enter a whole number.'})
+        doctor = request.query_params.get('doctor')
+        if doctor:
+            try:
+                doctor = int(doctor)
+            except ValueError:
+                raise ValidationError({'doctor': 'Enter a whole number.'})
+        slots = next_free_slots(
+            specialisation=request.query_params.get('specialisation'),
+            doctor=doctor,
+            after=after,
+            limit=limit,
+        )
+        return Response(self.get_serializer(slots, many=True).data)
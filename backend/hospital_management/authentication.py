@@ -0,0 +1,110 @@
+"""
+JWT authentication with a per-worker cache of the resolved user.
+
+The user is loaded once, together with its profile, patient and doctor
+rows, and kept in process memory with the versions of those four tables
+(see table_versions). While no row in them changes, a request with a
+valid token is authenticated without touching the database, and
+`request.user.patient` / `.doctor` / `.profile` cost nothing either.
+Any save or delete on those tables, e.g. a user being deactivated,
+bumps a version, and the next request in every worker reloads the user.
+The versions are only shared by the workers of one machine, so entries
+also expire after AUTH_USER_CACHE_SECONDS: a user deactivated through
+another server is refused here at most that long afterwards.
+
+Tokens carrying an older token_version than the user's profile are
+refused (see hospital_management.tokens).
+"""
+import os
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from . import table_versions
+from .tokens import TOKEN_VERSION_CLAIM
+
+MAX_ENTRIES = 4096
+MAX_AGE = 30
+# Everything a cached user carries; saving any of them invalidates it.
+CACHED_MODELS = ('auth.User', 'user_profile.UserProfile', 'patient.Patient', 'doctor.Doctor')
+RELATED = ('profile', 'patient', 'doctor')
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+stats = Counter()
+
+
+def get_stats():
+    with _lock:
+        return {'pid': os.getpid(), 'entries': len(_entries), **stats}
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        stats.clear()
+
+
+def max_age():
+    return getattr(settings, 'AUTH_USER_CACHE_SECONDS', MAX_AGE)
+
+
+def cache_labels():
+    return [table_versions.table_label(apps.get_model(name)) for name in CACHED_MODELS]
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """Drop-in replacement for JWTAuthentication."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = self.cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        profile = getattr(user, 'profile', None)
+        if validated_token.get(TOKEN_VERSION_CLAIM, 0) != (profile.token_version if profile else 0):
+            raise AuthenticationFailed(
+                _("Your account changed since this token was issued; log in again."), code="token_outdated"
+            )
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+    def cached_user(self, user_id):
+        key = str(user_id)
+        version = table_versions.get_versions(cache_labels())
+        now = time.monotonic()
+        with _lock:
+            entry = _entries.get(key)
+            if entry and entry[0] == version and now - entry[1] < max_age():
+                _entries.move_to_end(key)
+                stats['hits'] += 1
+                # Every request gets its own copy to change as it likes.
+                return pickle.loads(entry[2])
+            stats['misses'] += 1
+
+        user = self.user_model.objects.select_related(*RELATED).filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        # Rows read inside a transaction may never be committed.
+        if user is not None and not connection.in_atomic_block:
+            data = pickle.dumps(user)
+            with _lock:
+                _entries[key] = (version, now, data)
+                _entries.move_to_end(key)
+                while len(_entries) > MAX_ENTRIES:
+                    _entries.popitem(last=False)
+        return user
@@ -0,0 +1,87 @@
+"""
+Per-worker cache for small, rarely changing reference tables.
+
+Rendered JSON responses are kept in process memory together with the
+versions of the tables they were built from (see table_versions). A hit
+sends the stored bytes back without touching the database or the
+serializer; any save/delete on those tables bumps the version and the
+next request in every worker rebuilds its copy.
+"""
+import os
+import threading
+from collections import Counter, OrderedDict
+from django.db import connection
+from django.http import HttpResponse
+from . import table_versions
+
+MAX_ENTRIES = 1024
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+stats = Counter()
+
+
+def get_stats():
+    with _lock:
+        return {'pid': os.getpid(), 'entries': len(_entries), **stats}
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        stats.clear()
+
+
+class ReferenceDataCacheMixin:
+    """
+    Cache the JSON output of `list` and `retrieve`. `cache_models` lists
+    every model the response is built from; it defaults to the queryset's
+    model. Those models must be registered with `table_versions.track_models`.
+    """
+    cache_models = ()
+
+    def get_cache_labels(self):
+        models = self.cache_models or (self.queryset.model,)
+        return [table_versions.table_label(model) for model in models]
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+
+        # Image fields render absolute URLs, so the host is part of the key.
+        key = (type(self).__name__, request.get_host(), request.get_full_path())
+        version = table_versions.get_versions(self.get_cache_labels())
+        with _lock:
+            entry = _entries.get(key)
+            if entry and entry[0] == version:
+                _entries.move_to_end(key)
+                stats['hits'] += 1
+                return HttpResponse(entry[1], content_type=entry[2], headers={'X-Cache': 'HIT'})
+            stats['misses'] += 1
+
+        response = handler(request, *args, **kwargs)
+        response['X-Cache'] = 'MISS'
+        # Rows read inside a transaction may never be committed, so only
+        # responses built outside one are worth keeping.
+        if response.status_code == 200 and not connection.in_atomic_block:
+            response._reference_cache_entry = (key, version)
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        entry = getattr(response, '_reference_cache_entry', None)
+        if entry:
+            key, version = entry
+            response.render()
+            with _lock:
+                _entries[key] = (version, response.content, response['Content-Type'])
+                _entries.move_to_end(key)
+                while len(_entries) > MAX_ENTRIES:
+                    _entries.popitem(last=False)
+        return response
@@ -0,0 +1,133 @@
+"""
+Conditional requests (ETag / Last-Modified) for DRF viewsets.
+
+List validators are derived from the table versions of the models a
+response is built from (see table_versions), never from the rendered
+body, so a matching If-None-Match is answered with 304 before any query
+or serialization runs.
+
+A single object's ETag is a hash of its representation instead, so it
+only changes when something shown in that object does, not on every
+write to the table. Unsafe methods honour If-Match against it, which
+gives clients optimistic concurrency: an update based on a stale read
+gets 412 instead of overwriting someone else's change. The check and
+the write share one transaction with the row locked, so two writes made
+from the same read can't both pass it.
+"""
+import hashlib
+import json
+from django.db import connection, transaction
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe, parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from . import table_versions
+
+
+class ConditionalRequestMixin:
+    """
+    `conditional_models` lists every model whose rows appear in the
+    response; it defaults to the queryset's model. Those models must be
+    registered with `table_versions.track_models`. Set
+    `conditional_per_user` on views whose responses depend on who asks:
+    their validators then carry the user and responses vary on
+    Authorization, so a shared cache never answers one user for another.
+    """
+    conditional_models = ()
+    conditional_per_user = False
+    # Set while an If-Match write runs, so get_object() locks the row.
+    lock_for_write = False
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.lock_for_write:
+            # Only the object's own row; joined rows (and outer joins) stay unlocked.
+            of = ('self',) if connection.features.has_select_for_update_of else ()
+            queryset = queryset.select_for_update(of=of)
+        return queryset
+
+    def get_conditional_labels(self):
+        models = self.conditional_models or (self.queryset.model,)
+        return [table_versions.table_label(model) for model in models]
+
+    def make_etag(self, request, raw):
+        if self.conditional_per_user:
+            raw = f'{raw}|{request.user.pk}'
+        return '"%s"' % hashlib.md5(f'{type(self).__name__}|{raw}'.encode()).hexdigest()
+
+    def get_etag(self, request):
+        versions = table_versions.get_versions(self.get_conditional_labels())
+        # Image fields render absolute URLs, so the host is part of the tag.
+        return self.make_etag(request, f'{request.get_host()}|{request.get_full_path()}|{versions}')
+
+    def get_object_etag(self, request, data):
+        """The ETag of one object, given its serialized data."""
+        return self.make_etag(request, json.dumps(data, cls=JSONEncoder, sort_keys=True))
+
+    def vary(self, response):
+        if self.conditional_per_user:
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def not_modified(self, request, etag, last_modified):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            return if_none_match.strip() == '*' or etag in parse_etags(if_none_match)
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return bool(last_modified and if_modified_since and int(last_modified) <= if_modified_since)
+
+    def conditional_get(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        last_modified = table_versions.last_modified(self.get_conditional_labels())
+        if self.not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+        return self.vary(response)
+
+    def conditional_retrieve(self, handler, request, *args, **kwargs):
+        response = handler(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return self.vary(response)
+        # A response cache hit has no data left, only the JSON it rendered.
+        data = response.data if hasattr(response, 'data') else json.loads(response.content)
+        etag = self.get_object_etag(request, data)
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        return self.vary(response)
+
+    def conditional_write(self, handler, request, *args, **kwargs):
+        if_match = request.headers.get('If-Match')
+        if not if_match or if_match.strip() == '*':
+            return handler(request, *args, **kwargs)
+        with transaction.atomic():
+            self.lock_for_write = True
+            try:
+                etag = self.get_object_etag(request, self.get_serializer(self.get_object()).data)
+                if etag not in parse_etags(if_match):
+                    return Response(
+                        {'error': 'This resource has changed since you last fetched it.'},
+                        status=status.HTTP_412_PRECONDITION_FAILED,
+                    )
+                return handler(request, *args, **kwargs)
+            finally:
+                self.lock_for_write = False
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_get(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_retrieve(super().retrieve, request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        return self.conditional_write(super().update, request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        return self.conditional_write(super().destroy, request, *args, **kwargs)
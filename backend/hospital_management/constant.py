@@ -6,7 +6,33 @@ APPOINTMENT_STATUS = [
     ("Complated", "Complated"),
 ]
 
+# Counter bucket for cancelled appointments, whatever their status.
+CANCELLED = "Cancelled"
+
+# Longest date range the doctor calendar returns at once.
+CALENDAR_MAX_DAYS = 31
+
 APPOINTMENT_TYPE = [
     ("Online", "Online"),
     ("Offline", "Offline"),
 ]
+
+# Fee bands used by the doctor search index, as (upper fee limit, label).
+FEE_BANDS = [
+    (500, "budget"),
+    (1500, "standard"),
+    (None, "premium"),
+]
+
+WEEKDAYS = [
+    (0, "Monday"),
+    (1, "Tuesday"),
+    (2, "Wednesday"),
+    (3, "Thursday"),
+    (4, "Friday"),
+    (5, "Saturday"),
+    (6, "Sunday"),
+]
+
+# How far ahead concrete slots are generated from weekly schedules.
+SLOT_HORIZON_DAYS = 90
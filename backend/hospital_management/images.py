@@ -0,0 +1,182 @@
+"""
+Resized copies of uploaded images.
+
+Every image registered with `track_images` gets renditions at each of
+IMAGE_RENDITION_SIZES (the longest side, never upscaled) in each of
+IMAGE_RENDITION_FORMATS, stored next to the other media as
+
+    renditions/<original name without extension>/<size>.<format>
+
+They are rendered on a small thread pool once the upload is committed,
+so the request that saved it doesn't wait. Until they exist, serializers
+show no renditions and clients use the original. `render_images` renders
+the ones missing for media uploaded before.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_save
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+from . import response_cache
+from .table_versions import mark_changed
+
+logger = logging.getLogger(__name__)
+
+SIZES = (64, 256, 1024)
+FORMATS = ('webp', 'jpeg')
+QUALITY = {'webp': 80, 'jpeg': 82}
+RENDER_WORKERS = 2
+
+# (model, field name) of every tracked image field.
+image_fields = []
+
+_executor = None
+_pending = {}
+_lock = threading.Lock()
+
+
+def rendition_sizes():
+    return sorted(getattr(settings, 'IMAGE_RENDITION_SIZES', SIZES), reverse=True)
+
+
+def rendition_formats():
+    return tuple(getattr(settings, 'IMAGE_RENDITION_FORMATS', FORMATS))
+
+
+def rendition_name(name, size, format):
+    return f'renditions/{os.path.splitext(name)[0]}/{size}.{format}'
+
+
+def ready_name(name):
+    """The rendition written last; once it exists, all of them do."""
+    return rendition_name(name, rendition_sizes()[-1], rendition_formats()[-1])
+
+
+def rendition_urls(name, storage=default_storage):
+    """{size: {format: url}} for an image, or None if it hasn't been rendered yet."""
+    if not storage.exists(ready_name(name)):
+        return None
+    return {
+        size: {format: storage.url(rendition_name(name, size, format)) for format in rendition_formats()}
+        for size in sorted(rendition_sizes())
+    }
+
+
+def flatten(image):
+    """JPEG has no transparency: put the image on white."""
+    if image.mode in ('RGB', 'L'):
+        return image
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def render(name, force=False, storage=default_storage):
+    """
+    Write the renditions of the image stored as `name`; returns how many
+    were written. Already rendered images are skipped unless `force`.
+    """
+    if not force and storage.exists(ready_name(name)):
+        return 0
+    sizes, formats = rendition_sizes(), rendition_formats()
+    with storage.open(name, 'rb') as original:
+        image = Image.open(original)
+        # JPEGs can be decoded at a fraction of their size, which is much faster.
+        image.draft('RGB', (sizes[0], sizes[0]))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    written = 0
+    # Largest first, each one shrunk from the last: cheaper than from the original.
+    for size in sizes:
+        image.thumbnail((size, size), Image.LANCZOS)
+        for format in formats:
+            buffer = io.BytesIO()
+            output = flatten(image) if format == 'jpeg' else image
+            output.save(buffer, format=format.upper(), quality=QUALITY.get(format, 80), optimize=True)
+            target = rendition_name(name, size, format)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+            written += 1
+    return written
+
+
+def render_for(model, pk, name):
+    try:
+        written = render(name)
+    except (OSError, UnidentifiedImageError, ValueError, Image.DecompressionBombError):
+        logger.exception('Could not render %s', name)
+        return
+    finally:
+        with _lock:
+            _pending.pop(name, None)
+    if written:
+        # Cached responses and ETags of the row still say there are no renditions.
+        mark_changed(model)
+        response_cache.invalidate_rows(model, [pk])
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            workers = getattr(settings, 'IMAGE_RENDER_WORKERS', RENDER_WORKERS)
+            _executor = ThreadPoolExecutor(workers, thread_name_prefix='image-render')
+        return _executor
+
+
+def render_later(model, pk, name):
+    """Queue the image for rendering, unless it already is."""
+    executor = get_executor()
+    with _lock:
+        if name not in _pending:
+            _pending[name] = executor.submit(render_for, model, pk, name)
+        return _pending[name]
+
+
+def wait_for_renders(timeout=None):
+    """Block until every queued image is rendered; for tests and commands."""
+    with _lock:
+        futures = list(_pending.values())
+    wait(futures, timeout=timeout)
+
+
+def track_images(model, field_name):
+    """Render the image in `field_name` whenever a row is saved with one."""
+    image_fields.append((model, field_name))
+
+    def saved(sender, instance, **kwargs):
+        image = getattr(instance, field_name)
+        if image and image.name:
+            pk, name = instance.pk, image.name
+            transaction.on_commit(lambda: render_later(sender, pk, name))
+
+    post_save.connect(saved, sender=model, weak=False, dispatch_uid=f'images:{model._meta.label}:{field_name}')
+
+
+class RenditionsField(serializers.ReadOnlyField):
+    """
+    The renditions of an image field as {size: {format: url}}, or None
+    until they are rendered. e.g. `RenditionsField(source='profile')`
+    """
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        urls = rendition_urls(value.name)
+        if urls is None:
+            return None
+        request = self.context.get('request')
+        absolute = request.build_absolute_uri if request else str
+        return {str(size): {format: absolute(url) for format, url in by_format.items()} for size, by_format in urls.items()}
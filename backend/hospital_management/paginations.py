@@ -1,5 +1,135 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 100 # Default page limits
     page_size_query_param = 'limits' # User can set page limits.
-    max_page_size = 1000 # Max page limits. so we can't over it.
\ No newline at end of file
+    max_page_size = 1000 # Max page limits. so we can't over it.
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (a.k.a. seek) pagination. Rows are ordered by (sort key, id) and
+    each page starts right after the last row of the previous one, so deep
+    pages cost the same as the first and nothing is ever counted.
+
+    The sort key comes from the view's `keyset_ordering` (default 'id',
+    prefix with '-' for descending) and must be a non-null field.
+    Cursors are opaque base64 strings.
+    """
+    page_size = StandardResultsSetPagination.page_size
+    page_size_query_param = StandardResultsSetPagination.page_size_query_param
+    max_page_size = StandardResultsSetPagination.max_page_size
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def get_ordering(self, view):
+        ordering = getattr(view, 'keyset_ordering', 'id')
+        return ordering.lstrip('-'), ordering.startswith('-')
+
+    def encode_cursor(self, obj, reverse):
+        payload = {'v': self.sort_value(obj), 'i': obj.pk, 'r': int(reverse)}
+        cursor = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            value = self.sort_field.to_python(payload['v'])
+            return value, int(payload['i']), bool(payload['r'])
+        except (TypeError, ValueError, KeyError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def sort_value(self, obj):
+        value = getattr(obj, self.sort_field.attname)
+        # Dates, times and decimals go through their string form and come
+        # back through the model field's to_python.
+        return value if isinstance(value, (int, float, str)) else str(value)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        sort, descending = self.get_ordering(view)
+        self.sort_field = queryset.model._meta.get_field(sort)
+        cursor = self.decode_cursor(request)
+        reverse = cursor[2] if cursor else False
+
+        # Walking backwards means flipping both the ordering and the comparison.
+        flipped = descending != reverse
+        prefix = '-' if flipped else ''
+        ordering = [f'{prefix}{sort}'] if sort == 'id' else [f'{prefix}{sort}', f'{prefix}id']
+        queryset = queryset.order_by(*ordering)
+
+        if cursor:
+            value, pk, _ = cursor
+            lookup = 'lt' if flipped else 'gt'
+            if sort == 'id':
+                queryset = queryset.filter(**{f'id__{lookup}': pk})
+            else:
+                queryset = queryset.filter(Q(**{f'{sort}__{lookup}': value}) | Q(**{sort: value, f'id__{lookup}': pk}))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next = self.previous = None
+        if rows:
+            if has_more or reverse:
+                self.next = self.encode_cursor(rows[-1], reverse=False)
+            if cursor and (has_more or not reverse):
+                self.previous = self.encode_cursor(rows[0], reverse=True)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.next,
+            'previous': self.previous,
+            'results': data,
+        })
+
+
+class KeysetOrPageNumberPagination(StandardResultsSetPagination):
+    """
+    Page-number pagination by default; `?pagination=keyset` (or any
+    `?cursor=`) switches the request to KeysetPagination.
+    """
+    keyset_class = KeysetPagination
+    keyset_query_param = 'pagination'
+
+    def use_keyset(self, request):
+        return (
+            request.query_params.get(self.keyset_query_param) == 'keyset'
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.keyset_class() if self.use_keyset(request) else None
+        if self.keyset:
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,4 +1,5 @@
 from rest_framework import permissions
+from .tokens import user_claims
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
 
@@ -25,22 +26,33 @@ class IsAdminUser(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user and request.user.is_staff
 
-class IsDoctorUser(permissions.BasePermission):
-    """Allow access only to users with doctor role."""
-    
+def request_claims(request):
+    """
+    The role claims of the request's token (see hospital_management.tokens).
+    Without a JWT, e.g. in the browsable API, they are worked out from the user.
+    """
+    token = request.auth
+    if token is not None and hasattr(token, 'get') and token.get('role'):
+        return token
+    if request.user and request.user.is_authenticated:
+        return user_claims(request.user)
+    return {}
+
+class RolePermission(permissions.BasePermission):
+    """Allow access only to users whose token carries one of `roles`."""
+    roles = ()
+
     def has_permission(self, request, view):
-        return request.user and hasattr(request.user, 'profile') and request.user.profile.role == 'doctor'
+        return request_claims(request).get('role') in self.roles
+
+class IsDoctorUser(RolePermission):
+    """Allow access only to users with doctor role."""
+    roles = ('doctor',)
 
-class IsPatientUser(permissions.BasePermission):
+class IsPatientUser(RolePermission):
     """Allow access only to users with patient role."""
-    
-    def has_permission(self, request, view):
-        return request.user and hasattr(request.user, 'profile') and request.user.profile.role == 'patient'
+    roles = ('patient',)
 
-class IsStaffUser(permissions.BasePermission):
+class IsStaffUser(RolePermission):
     """Allow access only to users with staff role."""
-    
-    def has_permission(self, request, view):
-        return request.user and hasattr(request.user, 'profile') and request.user.profile.role == 'staff'
-        
-        
\ No newline at end of file
+    roles = ('staff', 'admin')
@@ -0,0 +1,428 @@
+"""
+Per-worker cache of rendered list and detail responses, invalidated by tags.
+
+A response is stored with the tags of what it was built from: the tag of
+every row it shows ("doctor:42"), the tag of the list it is
+("reviews:doctor:42" for /reviews/?doctor=42, "reviews:all" for the
+unfiltered list, "reviews" for any other filtering or ordering) and
+"doctor:*" for bulk changes. Only the signals of rows that are in a
+response, or could join a list, invalidate it: a new review for doctor 42
+leaves the cached reviews of doctor 41 alone.
+
+Tag versions are counters in a small file every worker on the node maps
+(see TagVersions), so a save in one worker invalidates the copies of
+every worker. `track_tags()` connects the signals that bump them.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from collections import Counter, OrderedDict, namedtuple
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Model
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.http import HttpResponse
+from rest_framework.response import Response
+from . import table_versions
+from .permissions import request_claims
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads are serialised, as workers there don't share the file.
+    fcntl = None
+
+TAG_SLOTS = 1 << 16
+VERSION = struct.Struct('<Q')
+# Slot 0 counts every bump, so a response built while anything changed isn't stored.
+WRITES_SLOT = 0
+MAX_BYTES = 32 * 2 ** 20
+# Query parameters that only pick the page or the rendering of the same list.
+PAGE_PARAMS = ('page', 'limits', 'cursor', 'pagination', 'format')
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+stats = Counter()
+
+
+def get_stats():
+    with _lock:
+        requests = stats['hits'] + stats['misses']
+        return {
+            'pid': os.getpid(), 'entries': len(_entries), **stats,
+            'hit_rate': round(stats['hits'] / requests, 3) if requests else None,
+        }
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        stats.clear()
+
+
+def _forget(key):
+    """Drop an entry; the caller holds _lock."""
+    entry = _entries.pop(key, None)
+    if entry:
+        stats['bytes'] -= len(entry[2])
+
+
+class TagVersions:
+    """
+    A version counter per tag, in a file under TABLE_VERSION_DIR mapped by
+    every worker. Tags whose hashes collide share a counter, which only
+    costs extra misses.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.path = self.inode = self.fd = self.map = None
+
+    def mapping(self):
+        path = os.path.join(table_versions.version_dir(), 'response_tags')
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if self.map is None or path != self.path or inode != self.inode:
+            self.open(path)
+        return self.map
+
+    def open(self, path):
+        with self.lock:
+            if self.map is not None:
+                self.map.close()
+                os.close(self.fd)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            size = TAG_SLOTS * VERSION.size
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self.path, self.inode, self.fd, self.map = path, os.fstat(fd).st_ino, fd, mmap.mmap(fd, size)
+        # A new file counts from 0 again, so versions kept from the old one mean nothing.
+        with _lock:
+            _entries.clear()
+            stats['bytes'] = 0
+
+    @staticmethod
+    def slot(tag):
+        digest = hashlib.blake2b(tag.encode(), digest_size=8).digest()
+        return 1 + int.from_bytes(digest, 'little') % (TAG_SLOTS - 1)
+
+    def read(self, slots):
+        versions = self.mapping()
+        return tuple(VERSION.unpack_from(versions, slot * VERSION.size)[0] for slot in slots)
+
+    def bump(self, tags):
+        versions = self.mapping()
+        slots = {WRITES_SLOT, *map(self.slot, tags)}
+        with self.lock:
+            if fcntl:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX)
+            try:
+                for slot in slots:
+                    offset = slot * VERSION.size
+                    VERSION.pack_into(versions, offset, VERSION.unpack_from(versions, offset)[0] + 1)
+            finally:
+                if fcntl:
+                    fcntl.lockf(self.fd, fcntl.LOCK_UN)
+
+
+tag_versions = TagVersions()
+
+
+def invalidate(*tags):
+    """
+    Bump the tags now, and again once the surrounding transaction commits,
+    so a worker that cached the old rows in between doesn't keep them.
+    """
+    tags = list(tags)
+    if not tags:
+        return
+    tag_versions.bump(tags)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: tag_versions.bump(tags))
+
+
+def invalidate_models(*models):
+    """For writes that skip the signals, e.g. bulk_create: drop every response showing these models."""
+    invalidate(*(f'{_specs[model].name}:*' for model in models if model in _specs))
+
+
+def invalidate_rows(model, pks):
+    """For changes that don't go through save(): drop the responses showing these rows."""
+    if model in _specs:
+        invalidate(*object_tags(_specs[model], pks))
+
+
+# Signals --------------------------------------------------------------------
+
+TagSpec = namedtuple('TagSpec', ['model', 'name', 'plural', 'partitions', 'follows'])
+_specs = {}
+
+
+def get_spec(model):
+    return _specs[model]
+
+
+def object_tags(spec, pks):
+    return [f'{spec.name}:{pk}' for pk in pks]
+
+
+def partition_tags(spec, field_name, values):
+    return [f'{spec.plural}:{field_name}:{value}' for value in values if value is not None]
+
+
+def all_partition_tags(spec, instance):
+    tags = []
+    for field_name in spec.partitions:
+        field = spec.model._meta.get_field(field_name)
+        if field.many_to_many:
+            values = getattr(instance, field_name).values_list('pk', flat=True)
+        else:
+            values = [getattr(instance, field.attname)]
+        tags += partition_tags(spec, field_name, values)
+    return tags
+
+
+def fk_partitions(spec):
+    return [name for name in spec.partitions if not spec.model._meta.get_field(name).many_to_many]
+
+
+def _remember_partitions(sender, instance, **kwargs):
+    spec = _specs[sender]
+    fields = fk_partitions(spec)
+    instance._response_cache_old = None
+    if fields and not instance._state.adding:
+        attnames = [spec.model._meta.get_field(name).attname for name in fields]
+        instance._response_cache_old = spec.model.objects.filter(pk=instance.pk).values(*attnames).first()
+
+
+def _saved(sender, instance, created, **kwargs):
+    spec = _specs[sender]
+    tags = object_tags(spec, [instance.pk]) + [spec.plural]
+    if created:
+        # A new row has no M2M rows yet; adding them is a relation change.
+        tags.append(f'{spec.plural}:all')
+        for name in fk_partitions(spec):
+            tags += partition_tags(spec, name, [getattr(instance, spec.model._meta.get_field(name).attname)])
+    else:
+        old = getattr(instance, '_response_cache_old', None) or {}
+        for name in fk_partitions(spec):
+            attname = spec.model._meta.get_field(name).attname
+            if old.get(attname) != getattr(instance, attname):
+                tags += partition_tags(spec, name, [old.get(attname), getattr(instance, attname)])
+    invalidate(*tags)
+
+
+def _remember_deleted(sender, instance, **kwargs):
+    spec = _specs[sender]
+    # The M2M rows are gone after the delete.
+    instance._response_cache_tags = (
+        object_tags(spec, [instance.pk]) + [spec.plural, f'{spec.plural}:all'] + all_partition_tags(spec, instance)
+    )
+
+
+def _deleted(sender, instance, **kwargs):
+    invalidate(*getattr(instance, '_response_cache_tags', ()))
+
+
+def _relation_changed(spec, field_name):
+    def changed(sender, instance, action, reverse, pk_set, **kwargs):
+        partition = field_name in spec.partitions
+        if action == 'pre_clear':
+            if reverse:
+                pks = spec.model.objects.filter(**{field_name: instance.pk}).values_list('pk', flat=True)
+            else:
+                pks = getattr(instance, field_name).values_list('pk', flat=True)
+            instance._response_cache_cleared = list(pks)
+            return
+        if action not in ('post_add', 'post_remove', 'post_clear'):
+            return
+        if action == 'post_clear':
+            pk_set = instance._response_cache_cleared
+        if reverse:
+            # `instance` is the related row; `pk_set` holds our rows.
+            tags = object_tags(spec, pk_set) + [spec.plural]
+            if partition:
+                tags += partition_tags(spec, field_name, [instance.pk])
+        else:
+            tags = object_tags(spec, [instance.pk]) + [spec.plural]
+            if partition:
+                tags += partition_tags(spec, field_name, pk_set)
+        invalidate(*tags)
+    return changed
+
+
+def _follow(spec, lookup):
+    """Handlers for a related model whose rows show up in `spec.model`'s responses through `lookup`."""
+    def showing(instance):
+        return set(spec.model.objects.filter(**{lookup: instance.pk}).values_list('pk', flat=True))
+
+    def before(sender, instance, **kwargs):
+        instance._response_cache_showing = set() if instance._state.adding else showing(instance)
+
+    def after_save(sender, instance, **kwargs):
+        pks = getattr(instance, '_response_cache_showing', set()) | showing(instance)
+        if pks:
+            invalidate(*object_tags(spec, pks), spec.plural)
+
+    def after_delete(sender, instance, **kwargs):
+        pks = getattr(instance, '_response_cache_showing', set())
+        tags = object_tags(spec, pks)
+        if lookup in spec.partitions:
+            tags += partition_tags(spec, lookup, [instance.pk])
+        if tags:
+            invalidate(*tags, spec.plural)
+
+    return before, after_save, after_delete
+
+
+def _related_model(model, lookup):
+    for name in lookup.split('__'):
+        model = model._meta.get_field(name).related_model
+    return model
+
+
+def track_tags(model, name, partitions=(), follows=()):
+    """
+    Invalidate the cached responses showing `model`'s rows, tagged `name`.
+
+    `partitions` are fields (and list query parameters) a list is often
+    filtered by; a row only invalidates the partitions it is in, joins or
+    leaves. `follows` are lookups to related rows the responses show, e.g.
+    'user' for a doctor's name; changing one invalidates the rows showing it.
+    """
+    spec = _specs[model] = TagSpec(model, name, f'{name}s', tuple(partitions), tuple(follows))
+    uid = f'response_cache:{name}'
+    pre_save.connect(_remember_partitions, sender=model, dispatch_uid=uid)
+    post_save.connect(_saved, sender=model, dispatch_uid=uid)
+    pre_delete.connect(_remember_deleted, sender=model, dispatch_uid=uid)
+    post_delete.connect(_deleted, sender=model, dispatch_uid=uid)
+    for field in model._meta.local_many_to_many:
+        m2m_changed.connect(
+            _relation_changed(spec, field.name), sender=field.remote_field.through,
+            weak=False, dispatch_uid=f'{uid}:{field.name}',
+        )
+    for lookup in follows:
+        related = _related_model(model, lookup)
+        before, after_save, after_delete = _follow(spec, lookup)
+        follow_uid = f'{uid}:follows:{lookup}'
+        pre_save.connect(before, sender=related, weak=False, dispatch_uid=follow_uid)
+        post_save.connect(after_save, sender=related, weak=False, dispatch_uid=follow_uid)
+        pre_delete.connect(before, sender=related, weak=False, dispatch_uid=follow_uid)
+        post_delete.connect(after_delete, sender=related, weak=False, dispatch_uid=follow_uid)
+
+
+# Views ----------------------------------------------------------------------
+
+class ResponseCacheMixin:
+    """
+    Cache the JSON output of `list` and `retrieve` until a row in it
+    changes. The queryset's model must be registered with `track_tags`.
+
+    Entries are keyed on the path, the sorted query parameters and the
+    caller's scope: with `cache_scope = 'role'` anonymous users share
+    entries, and so do users of the same role; use 'user' for responses
+    that differ per user.
+    """
+    cache_scope = 'role'
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        # Remember the rows being shown; they tag the response.
+        if args:
+            self._cached_rows = args[0]
+        return super().get_serializer(*args, **kwargs)
+
+    def get_cache_scope(self, request):
+        if not request.user or not request.user.is_authenticated:
+            return 'anon'
+        if self.cache_scope == 'user':
+            return f'user:{request.user.pk}'
+        return request_claims(request).get('role')
+
+    def get_cache_key(self, request):
+        params = tuple(sorted((name, tuple(sorted(values))) for name, values in request.query_params.lists()))
+        # Image fields render absolute URLs, so the host is part of the key.
+        return (type(self).__name__, request.get_host(), request.path, params, self.get_cache_scope(request))
+
+    def get_cache_tags(self, request):
+        spec = get_spec(self.queryset.model)
+        tags = [f'{spec.name}:*']
+        if self.action == 'list':
+            params = {name: values for name, values in request.query_params.lists() if name not in PAGE_PARAMS}
+            partition = [name for name, values in params.items() if name in spec.partitions and len(values) == 1]
+            if not params:
+                tags.append(f'{spec.plural}:all')
+            elif len(params) == 1 and partition:
+                tags += partition_tags(spec, partition[0], params[partition[0]])
+            else:
+                tags.append(spec.plural)
+        rows = [self._cached_rows] if isinstance(self._cached_rows, Model) else self._cached_rows
+        return tags + object_tags(spec, [row.pk for row in rows])
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        with _lock:
+            entry = _entries.get(key)
+        if entry:
+            slots, versions, content, content_type = entry
+            if tag_versions.read(slots) == versions:
+                with _lock:
+                    if key in _entries:
+                        _entries.move_to_end(key)
+                    stats['hits'] += 1
+                    stats['bytes_saved'] += len(content)
+                return HttpResponse(content, content_type=content_type, headers={'X-Cache': 'HIT'})
+            with _lock:
+                if _entries.get(key) is entry:
+                    _forget(key)
+                stats['stale'] += 1
+
+        with _lock:
+            stats['misses'] += 1
+        writes = tag_versions.read([WRITES_SLOT])
+        self._cached_rows = None
+        response = handler(request, *args, **kwargs)
+        response['X-Cache'] = 'MISS'
+        # Rows read inside a transaction may never be committed, so only
+        # responses built outside one are worth keeping.
+        if (
+            isinstance(response, Response) and response.status_code == 200
+            and self._cached_rows is not None and not connection.in_atomic_block
+        ):
+            response._response_cache_entry = (key, self.get_cache_tags(request), writes)
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        entry = getattr(response, '_response_cache_entry', None)
+        if entry:
+            key, tags, writes = entry
+            response.render()
+            slots = tuple(sorted(set(map(TagVersions.slot, tags))))
+            versions = tag_versions.read(slots)
+            with _lock:
+                # Something changed while the response was built: it may hold old rows.
+                if tag_versions.read([WRITES_SLOT]) != writes:
+                    stats['skipped'] += 1
+                    return response
+                _forget(key)
+                _entries[key] = (slots, versions, response.content, response['Content-Type'])
+                stats['bytes'] += len(response.content)
+                stats['stored'] += 1
+                max_bytes = getattr(settings, 'RESPONSE_CACHE_MAX_BYTES', MAX_BYTES)
+                while stats['bytes'] > max_bytes and _entries:
+                    _forget(next(iter(_entries)))
+                    stats['evicted'] += 1
+        return response
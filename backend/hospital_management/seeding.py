@@ -0,0 +1,279 @@
+"""
+Synthetic data for benchmarks and performance tests.
+
+Rows are written with bulk_create in chunks, so none of the per-row
+post_save signals run (profile and patient creation, rating summaries,
+the search index, the appointment counters, table versions, weekly
+schedules from available times and their slots). The
+Seeder creates the profile and patient rows itself and `finish()`
+rebuilds everything else in one pass at the end.
+
+Everything is drawn from one random.Random(seed), so the same seed and
+volumes give the same data. Popularity is skewed: a few doctors get most
+of the appointments and reviews and a few patients book most often.
+"""
+import random
+import time
+from array import array
+from datetime import date, timedelta
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from appointment.counters import rebuild_counts
+from appointment.models import Appointment
+from doctor.models import AvailableTime, Designation, Doctor, Review, Schedule, Specialisation
+from doctor.ratings import rebuild_ratings
+from doctor.scheduling import generate_slots, parse_available_time
+from doctor.search import rebuild_index
+from patient.models import Patient
+from patient.phones import normalize_phone
+from user_profile.models import UserProfile
+from .response_cache import invalidate_models
+from .constant import SLOT_HORIZON_DAYS
+from .table_versions import mark_changed
+
+FIRST_NAMES = [
+    'Abdul', 'Amina', 'Arif', 'Ayesha', 'Farhan', 'Fatema', 'Hasan', 'Jannat', 'Kamal', 'Karim',
+    'Lamia', 'Mahmud', 'Mehedi', 'Mim', 'Nadia', 'Nusrat', 'Rafi', 'Rahim', 'Rina', 'Sabbir',
+    'Sadia', 'Shakil', 'Sumaiya', 'Tania', 'Tanvir', 'Yasin', 'Zara', 'Imran', 'Priya', 'Rashed',
+]
+LAST_NAMES = [
+    'Ahmed', 'Akter', 'Alam', 'Ali', 'Begum', 'Chowdhury', 'Das', 'Hasan', 'Hossain', 'Islam',
+    'Khan', 'Mahmud', 'Miah', 'Rahman', 'Roy', 'Saha', 'Sarkar', 'Sheikh', 'Sultana', 'Uddin',
+]
+CITIES = ['Dhaka', 'Chattogram', 'Khulna', 'Rajshahi', 'Sylhet', 'Barishal', 'Rangpur', 'Mymensingh', 'Cumilla', 'Gazipur']
+SPECIALISATIONS = [
+    'Cardiology', 'Neurology', 'Dermatology', 'Pediatrics', 'Orthopedics', 'Oncology', 'Psychiatry',
+    'Urology', 'Gynecology', 'Ophthalmology', 'ENT', 'Gastroenterology', 'Nephrology', 'Endocrinology',
+]
+DESIGNATIONS = ['Professor', 'Associate Professor', 'Assistant Professor', 'Consultant', 'Medical Officer', 'Registrar']
+AVAILABLE_TIMES = [
+    'Sat-Thu 9:00 AM - 12:00 PM', 'Sat-Thu 2:00 PM - 5:00 PM', 'Sat-Wed 5:00 PM - 9:00 PM',
+    'Sun, Tue, Thu 10:00 AM - 1:00 PM', 'Mon, Wed 4:00 PM - 8:00 PM', 'Fri 9:00 AM - 12:00 PM',
+]
+# (fee, weight)
+FEES = [(300, 10), (500, 30), (800, 25), (1000, 18), (1500, 10), (2000, 5), (3000, 2)]
+# Weights of ratings 1-5.
+RATING_WEIGHTS = [3, 4, 10, 30, 53]
+SYMPTOMS = [
+    'Fever and headache for three days', 'Chest pain when climbing stairs', 'Persistent dry cough',
+    'Skin rash on both arms', 'Lower back pain', 'Blurred vision', 'Stomach ache after meals',
+    'Follow-up after surgery', 'Shortness of breath at night', 'Routine check-up',
+]
+REVIEWS = [
+    'Very patient and explained everything.', 'Long waiting time but good treatment.',
+    'Helpful and friendly.', 'Did not listen to my concerns.', 'Excellent doctor, highly recommended.',
+    'The prescription worked well.', 'Average experience.',
+]
+
+
+def skewed(rng, count, skew):
+    """A random index below `count`; the higher `skew`, the more often low indexes come up."""
+    return int(count * rng.random() ** skew)
+
+
+class Seeder:
+    """
+    Creates users (each with a profile and a patient), then doctors among
+    those users, then appointments and reviews between them. Call
+    `finish()` once everything is written.
+    """
+    # Appointments fall between `history_days` ago and `future_days` ahead.
+    history_days = 365
+    future_days = 30
+    # How strongly popularity is skewed, see skewed().
+    doctor_skew = 2
+    patient_skew = 1.5
+
+    def __init__(self, seed=42, prefix='seed', password='password123', chunk_size=5000, today=None, log=None,
+                 slot_days=SLOT_HORIZON_DAYS):
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.today = today or date.today()
+        self.log = log or (lambda message: None)
+        # One hash for every user: hashing a million passwords would take hours.
+        self.password = make_password(password)
+        self.user_ids = array('q')
+        self.patient_ids = array('q')
+        self.doctor_ids = array('q')
+        self.doctor_times = []
+        self.slot_days = slot_days
+        # Doctors before this index already have their schedules.
+        self.scheduled = 0
+
+    def chunks(self, count):
+        for start in range(0, count, self.chunk_size):
+            yield range(start, min(start + self.chunk_size, count))
+
+    def timed(self, label, count, write):
+        started = time.perf_counter()
+        for indexes in self.chunks(count):
+            with transaction.atomic():
+                write(indexes)
+        elapsed = time.perf_counter() - started
+        self.log(f'{label}: {count} in {elapsed:.1f}s ({count / elapsed if elapsed else 0:,.0f}/s)')
+
+    def users(self, count):
+        rng = self.rng
+        offset = len(self.user_ids)
+
+        def write(indexes):
+            users = []
+            for i in indexes:
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                username = f'{self.prefix}_user_{offset + i}'
+                users.append(User(
+                    username=username, first_name=first, last_name=last, email=f'{username}@example.com',
+                    password=self.password,
+                ))
+            users = User.objects.bulk_create(users)
+            UserProfile.objects.bulk_create([
+                UserProfile(
+                    user=user, address=rng.choice(CITIES),
+                    date_of_birth=self.today - timedelta(days=int(rng.triangular(18, 85, 32) * 365.25)),
+                )
+                for user in users
+            ])
+            phones = [f'01{rng.choice("3456789")}{user.pk % 10 ** 8:08d}' for user in users]
+            patients = Patient.objects.bulk_create([
+                # 11-digit mobile numbers, unique per user; bulk_create skips save(), so normalize here.
+                Patient(user=user, phone=phone, phone_normalized=normalize_phone(phone))
+                for user, phone in zip(users, phones)
+            ])
+            self.user_ids.extend(user.pk for user in users)
+            self.patient_ids.extend(patient.pk for patient in patients)
+
+        self.timed('Users', count, write)
+
+    def reference_data(self):
+        """Specialisations, designations and available times, created if missing."""
+        self.specialisations = [
+            Specialisation.objects.get_or_create(slug=name.lower(), defaults={'name': name})[0].pk
+            for name in SPECIALISATIONS
+        ]
+        self.designations = [
+            Designation.objects.get_or_create(slug=name.lower().replace(' ', '-'), defaults={'name': name})[0].pk
+            for name in DESIGNATIONS
+        ]
+        self.available_times = [
+            (AvailableTime.objects.filter(time=text).first() or AvailableTime.objects.create(time=text)).pk
+            for text in AVAILABLE_TIMES
+        ]
+
+    def doctors(self, count):
+        """Make doctors of the first `count` seeded users that aren't doctors yet."""
+        rng = self.rng
+        offset = len(self.doctor_ids)
+        if offset + count > len(self.user_ids):
+            raise ValueError(f'{offset + count} doctors need at least as many users.')
+        self.reference_data()
+        fees, fee_weights = zip(*FEES)
+
+        def write(indexes):
+            doctors = Doctor.objects.bulk_create([
+                Doctor(user_id=self.user_ids[offset + i], fee=rng.choices(fees, fee_weights)[0]) for i in indexes
+            ])
+            specialisations, designations, times = [], [], []
+            for doctor in doctors:
+                for pk in rng.sample(self.specialisations, rng.choice((1, 1, 1, 2))):
+                    specialisations.append(Doctor.specialisation.through(doctor_id=doctor.pk, specialisation_id=pk))
+                designations.append(Doctor.designation.through(doctor_id=doctor.pk, designation_id=rng.choice(self.designations)))
+                doctor_times = rng.sample(self.available_times, rng.choice((1, 2)))
+                times += [Doctor.available_time.through(doctor_id=doctor.pk, availabletime_id=pk) for pk in doctor_times]
+                self.doctor_ids.append(doctor.pk)
+                self.doctor_times.append(doctor_times)
+            Doctor.specialisation.through.objects.bulk_create(specialisations)
+            Doctor.designation.through.objects.bulk_create(designations)
+            Doctor.available_time.through.objects.bulk_create(times)
+
+        self.timed('Doctors', count, write)
+
+    def random_doctor(self):
+        index = skewed(self.rng, len(self.doctor_ids), self.doctor_skew)
+        return self.doctor_ids[index], self.doctor_times[index]
+
+    def random_patient(self):
+        return self.patient_ids[skewed(self.rng, len(self.patient_ids), self.patient_skew)]
+
+    def appointments(self, count):
+        rng = self.rng
+        if count:
+            self.require_people()
+
+        def write(indexes):
+            appointments = []
+            for _ in indexes:
+                doctor_id, times = self.random_doctor()
+                offset = rng.randint(-self.history_days, self.future_days)
+                day = self.today + timedelta(days=offset)
+                if offset < 0:
+                    status, cancel = 'Complated', rng.random() < 0.08
+                elif offset == 0:
+                    status, cancel = rng.choice(('Pendding', 'Runing', 'Complated')), rng.random() < 0.05
+                else:
+                    status, cancel = 'Pendding', rng.random() < 0.05
+                appointments.append(Appointment(
+                    patient_id=self.random_patient(), doctor_id=doctor_id, time_id=rng.choice(times), date=day,
+                    appointment_type='Online' if rng.random() < 0.4 else 'Offline',
+                    appointment_status=status, cancel=cancel, symptoms=rng.choice(SYMPTOMS),
+                ))
+            Appointment.objects.bulk_create(appointments)
+
+        self.timed('Appointments', count, write)
+
+    def reviews(self, count):
+        rng = self.rng
+        if count:
+            self.require_people()
+        ratings = range(1, 6)
+
+        def write(indexes):
+            Review.objects.bulk_create([
+                Review(
+                    reviwer_id=self.random_patient(), doctor_id=self.random_doctor()[0],
+                    rating=rng.choices(ratings, RATING_WEIGHTS)[0], body=rng.choice(REVIEWS),
+                )
+                for _ in indexes
+            ])
+
+        self.timed('Reviews', count, write)
+
+    def require_people(self):
+        if not self.doctor_ids:
+            raise ValueError('Seed users and doctors first.')
+
+    def schedules(self):
+        """Weekly schedules from the seeded doctors' available times, and `slot_days` days of their slots."""
+        offset = self.scheduled
+        if offset == len(self.doctor_ids):
+            return
+        windows = {
+            pk: parse_available_time(text)
+            for pk, text in AvailableTime.objects.filter(pk__in=self.available_times).values_list('id', 'time')
+        }
+
+        def write(indexes):
+            schedules = Schedule.objects.bulk_create([
+                Schedule(
+                    doctor_id=self.doctor_ids[offset + i], available_time_id=pk,
+                    weekday=weekday, start_time=start, end_time=end,
+                )
+                for i in indexes for pk in self.doctor_times[offset + i] for weekday, start, end in windows[pk]
+            ])
+            generate_slots(start_date=self.today, days=self.slot_days, schedules=schedules)
+
+        self.timed('Doctor schedules', len(self.doctor_ids) - offset, write)
+        self.scheduled = len(self.doctor_ids)
+
+    def finish(self):
+        """Rebuild what the skipped signals would have kept up to date."""
+        self.schedules()
+        started = time.perf_counter()
+        rebuild_ratings()
+        rebuild_index()
+        rebuild_counts()
+        for model in (User, UserProfile, Patient, Doctor, Review, Appointment):
+            mark_changed(model)
+        invalidate_models(Doctor, Review)
+        self.log(f'Rebuilt ratings, search index and appointment counters in {time.perf_counter() - started:.1f}s')
@@ -66,6 +66,7 @@ INSTALLED_APPS = [
     'patient',
     'doctor',
     'user_profile',
+    'task_queue',
 ]
 
 MIDDLEWARE = [
@@ -173,6 +174,15 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'  # ✅ Required for collectstatic in prod
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploaded images are named after their content (see hospital_management.storage).
+# Whatever serves MEDIA_URL in production should send
+# "Cache-Control: public, max-age=31536000, immutable" for /media/blobs/.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'blobs': {'BACKEND': 'hospital_management.storage.ContentAddressedStorage'},
+}
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -182,7 +192,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "hospital_management.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_THROTTLE_RATES": {
         "anon": "100/minute",
@@ -192,6 +202,17 @@ REST_FRAMEWORK = {
     },
 }
 
+# Throttle counters are shared by the workers on a node (see hospital_management.throttling).
+# To share them between nodes, use 'hospital_management.throttling.CacheBackend' and set
+# THROTTLE_CACHE to the alias of a Redis or Memcached cache.
+THROTTLE_BACKEND = 'hospital_management.throttling.SharedMemoryBackend'
+
+# Authenticated users are cached per worker (see hospital_management.authentication)
+# for at most this many seconds, so changes made through another node reach this one.
+AUTH_USER_CACHE_SECONDS = 30
+
+TEST_RUNNER = 'hospital_management.test_runner.TestRunner'
+
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=7),
@@ -199,6 +220,7 @@ SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": False,
     "BLACKLIST_AFTER_ROTATION": False,
     "UPDATE_LAST_LOGIN": False,
+    "TOKEN_REFRESH_SERIALIZER": "hospital_management.tokens.RoleTokenRefreshSerializer",
 }
 
 # Configuring Email in DRF
@@ -208,6 +230,14 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = env("EMAIL_USER")
 EMAIL_HOST_PASSWORD = env("EMAIL_PASSWORD")
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+
+# Background tasks (see task_queue.queue), run by `python manage.py run_tasks`.
+# Workers extend the lease of the tasks they run; a task whose lease has not been
+# extended for TASK_LEASE seconds is taken to have died with its worker and runs
+# again. Finished tasks are deleted after TASK_RETENTION.
+TASK_LEASE = 600
+TASK_RETENTION = timedelta(days=7)
 
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -0,0 +1,90 @@
+"""
+Content-addressed storage for uploaded images.
+
+Whatever name and upload_to an upload comes with, it is stored as
+
+    blobs/<first two hex digits>/<sha256 of the bytes><extension>
+
+so the same image uploaded twice is stored once, and a name always holds
+the same bytes: its URL can be cached forever. Blobs are never
+overwritten or deleted when a row lets go of them; `gc_media` deletes
+the ones no row refers to any more.
+"""
+import hashlib
+import os
+import tempfile
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, storages
+
+PREFIX = 'blobs'
+TEMP_DIR = f'{PREFIX}/tmp'
+# Blob names must fit the 100 characters of an ImageField.
+MAX_EXTENSION = 10
+
+
+def blob_name(digest, extension):
+    extension = extension.lower() if len(extension) <= MAX_EXTENSION else ''
+    return f'{PREFIX}/{digest[:2]}/{digest}{extension}'
+
+
+def is_blob(name):
+    return name.startswith(f'{PREFIX}/') and not name.startswith(f'{TEMP_DIR}/')
+
+
+def blob_storage():
+    """The storage of the uploaded image fields, for `ImageField(storage=blob_storage)`."""
+    return storages['blobs']
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # `_save` names the file after its content, so the name is never taken by other bytes.
+        return name
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1]
+        if hasattr(content, 'temporary_file_path'):
+            # Large uploads are on disk already: read them once to hash, then move them.
+            source = content.temporary_file_path()
+            digest = self._hash_file(source)
+        else:
+            # Hash while writing, so the bytes are only gone through once.
+            source, digest = self._write_temporary(content)
+        name = blob_name(digest, extension)
+        path = self.path(name)
+        if os.path.exists(path):
+            # Already stored: drop the copy, and tell `gc_media` the blob is in use again.
+            if not hasattr(content, 'temporary_file_path'):
+                os.remove(source)
+            os.utime(path)
+            return name
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if hasattr(content, 'temporary_file_path'):
+            file_move_safe(source, path, allow_overwrite=True)
+        else:
+            os.replace(source, path)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        return name
+
+    def _hash_file(self, path):
+        with open(path, 'rb') as file:
+            return hashlib.file_digest(file, 'sha256').hexdigest()
+
+    def _write_temporary(self, content):
+        directory = self.path(TEMP_DIR)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        descriptor, path = tempfile.mkstemp(dir=directory, prefix='upload-')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    file.write(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path, digest.hexdigest()
@@ -0,0 +1,108 @@
+"""
+Change markers for database tables, shared by every worker on a node.
+
+Each tracked table has a small file under TABLE_VERSION_DIR holding a
+counter. Saving or deleting a row bumps the counter, so any worker can
+tell that something it cached is stale by reading a file instead of
+querying the database.
+"""
+import os
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+try:
+    import fcntl
+except ImportError:  # Windows: bumps are not serialised, but every bump still changes the file.
+    fcntl = None
+
+
+def version_dir():
+    return getattr(settings, 'TABLE_VERSION_DIR', os.path.join(tempfile.gettempdir(), 'hospital_management_versions'))
+
+
+def _path(label):
+    return os.path.join(version_dir(), label)
+
+
+def get_version(label):
+    try:
+        with open(_path(label), 'rb') as version_file:
+            return int(version_file.read() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def get_versions(labels):
+    return tuple(get_version(label) for label in labels)
+
+
+def last_modified(labels):
+    """Return the newest modification time (a POSIX timestamp) of the given tables, or None."""
+    times = []
+    for label in labels:
+        try:
+            times.append(os.stat(_path(label)).st_mtime)
+        except FileNotFoundError:
+            pass
+    return max(times, default=None)
+
+
+def bump_version(label):
+    os.makedirs(version_dir(), exist_ok=True)
+    path = _path(label)
+    lock = os.open(f'{path}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        # A missing file (e.g. a wiped temp dir) restarts from the clock rather
+        # than from 1, so old versions are never handed out again.
+        version = (get_version(label) or time.time_ns()) + 1
+        # Write a new file and swap it in so readers never see a partial value.
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w') as version_file:
+            version_file.write(str(version))
+        os.replace(temp_path, path)
+    finally:
+        os.close(lock)
+    return version
+
+
+def table_label(model):
+    return model._meta.db_table
+
+
+def mark_changed(model):
+    """
+    Bump a model's version now, and again once the surrounding transaction
+    commits, so a worker that re-read the table before the commit doesn't
+    keep the old rows under the new version.
+    """
+    label = table_label(model)
+    bump_version(label)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump_version(label))
+
+
+def _model_changed(sender, **kwargs):
+    mark_changed(sender)
+
+
+def _relation_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        mark_changed(sender._tracked_model)
+
+
+def track_models(*models):
+    """Bump each model's version whenever one of its rows or M2M relations changes."""
+    for model in models:
+        uid = f'table_versions:{table_label(model)}'
+        post_save.connect(_model_changed, sender=model, dispatch_uid=uid)
+        post_delete.connect(_model_changed, sender=model, dispatch_uid=uid)
+        for field in model._meta.local_many_to_many:
+            through = field.remote_field.through
+            through._tracked_model = model
+            m2m_changed.connect(_relation_changed, sender=through, dispatch_uid=f'{uid}:{field.name}')
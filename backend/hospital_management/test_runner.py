@@ -0,0 +1,12 @@
+import os
+import tempfile
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Counts throttled requests in a fresh file, so a rerun doesn't start out rate limited."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.THROTTLE_FILE = os.path.join(tempfile.mkdtemp(), 'throttle')
@@ -0,0 +1,165 @@
+"""
+Query budgets for every router-registered API endpoint and every admin
+changelist.
+
+Each endpoint is requested against a small seeded dataset and again
+after the dataset has grown. It must stay within its declared number of
+queries, and the number of queries must not grow with the number of rows
+(beyond its declared per-row allowance). A failing endpoint reports the
+SQL that ran more than once, which is where an N+1 shows up.
+"""
+import re
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from datetime import date, timedelta
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from rest_framework.test import APIClient
+from appointment.models import Appointment
+from contact_us.models import ContactUs
+from doctor.models import AvailableTime, Designation, Doctor, Review, Specialisation
+from service.models import Service
+
+QueryBudget = namedtuple('QueryBudget', ['max_queries', 'per_row'])
+
+DEFAULT_BUDGET = QueryBudget(max_queries=12, per_row=0)
+DEFAULT_ADMIN_BUDGET = QueryBudget(max_queries=12, per_row=0)
+
+# Endpoints that legitimately need more, by URL name.
+BUDGETS = {}
+
+# Query parameters an endpoint needs, by URL name.
+PARAMS = {
+    'appointment-calendar': lambda: {'doctor_id': Doctor.objects.values_list('pk', flat=True).first()},
+}
+
+ROWS_PER_STEP = 3
+
+
+def router_endpoints(patterns=None):
+    """Yield (url name, view class, action, is detail route) for every GET route a router registered."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from router_endpoints(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            actions = getattr(pattern.callback, 'actions', None)
+            # Routers also add a "<route>.<format>" copy of every route.
+            groups = pattern.pattern.regex.groupindex
+            if actions and 'get' in actions and 'format' not in groups:
+                yield pattern.name, pattern.callback.cls, actions['get'], 'pk' in groups
+
+
+def normalize(sql):
+    """Strip literals so the same statement with different ids compares equal."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(\.\d+)?\b', '?', sql)
+    return re.sub(r'IN \((?:\?, )*\?\)', 'IN (...)', sql)
+
+
+def duplicated_sql(queries):
+    counts = Counter(normalize(query['sql']) for query in queries)
+    repeated = [(count, sql) for sql, count in counts.most_common() if count > 1]
+    return '\n'.join(f'  {count}x {sql}' for count, sql in repeated) or '  (no statement ran twice)'
+
+
+@contextmanager
+def rolled_back():
+    """Undo the rows one endpoint's check added before the next one is measured."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def seed(step):
+    """Add ROWS_PER_STEP rows to every table the endpoints read."""
+    designation = Designation.objects.create(name=f'Designation {step}', slug=f'designation-{step}')
+    specialisation = Specialisation.objects.create(name=f'Specialisation {step}', slug=f'specialisation-{step}')
+    available_time = AvailableTime.objects.create(time='Sun 9:00 AM - 10:00 AM')
+    for i in range(ROWS_PER_STEP):
+        name = f'{step}_{i}'
+        doctor = Doctor.objects.create(
+            user=User.objects.create(username=f'doctor_{name}', first_name='Doc', last_name=name), fee=500,
+        )
+        doctor.designation.add(designation)
+        doctor.specialisation.add(specialisation)
+        doctor.available_time.add(available_time)
+        patient = User.objects.create(username=f'patient_{name}', first_name='Pat', last_name=name).patient
+        Review.objects.create(reviwer=patient, doctor=doctor, body='-', rating=4)
+        Appointment.objects.create(
+            patient=patient, doctor=doctor, time=available_time, date=date.today() + timedelta(days=i),
+            appointment_type='Online', symptoms='-',
+        )
+        ContactUs.objects.create(name=name, phone='01700000000', massage='-')
+        Service.objects.create(name=name, description='-', image='service/image/x.png')
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    THROTTLE_BACKEND='hospital_management.throttling.CacheBackend',
+)
+class QueryBudgetTest(TestCase):
+    """Requests are made as a superuser so every endpoint is reachable. Throttling is off (dummy cache)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='budget_admin', password='-')
+        seed(0)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+        self.client.force_login(self.admin)
+
+    def measure(self, client, url, params):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, params)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f'GET {url} returned {response.status_code}')
+        return context.captured_queries
+
+    def check_budget(self, label, budget, request):
+        """`request()` returns the captured queries; it is called before and after the dataset grows."""
+        small = request()
+        seed(1)
+        large = request()
+        growth = len(large) - len(small)
+        self.assertLessEqual(
+            len(large), budget.max_queries,
+            f'{label} ran {len(large)} queries (budget {budget.max_queries}). Repeated SQL:\n{duplicated_sql(large)}',
+        )
+        self.assertLessEqual(
+            growth, budget.per_row * ROWS_PER_STEP,
+            f'{label} ran {growth} more queries for {ROWS_PER_STEP} more rows. Repeated SQL:\n{duplicated_sql(large)}',
+        )
+
+    def test_router_endpoints(self):
+        endpoints = list(router_endpoints())
+        self.assertTrue(endpoints)
+        for name, view_class, action, detail in endpoints:
+            with self.subTest(endpoint=name):
+                budget = BUDGETS.get(name, DEFAULT_BUDGET)
+                params = PARAMS.get(name, dict)
+
+                def request():
+                    kwargs = {}
+                    if detail:
+                        kwargs['pk'] = view_class.queryset.model.objects.order_by('pk').values_list('pk', flat=True).first()
+                    return self.measure(self.api, reverse(name, kwargs=kwargs), params())
+
+                with rolled_back():
+                    self.check_budget(f'GET {name} ({view_class.__name__}.{action})', budget, request)
+
+    def test_admin_changelists(self):
+        for model in admin.site._registry:
+            name = f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist'
+            with self.subTest(changelist=name):
+                budget = BUDGETS.get(name, DEFAULT_ADMIN_BUDGET)
+                with rolled_back():
+                    self.check_budget(name, budget, lambda: self.measure(self.client, reverse(name), {}))
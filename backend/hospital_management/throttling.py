@@ -0,0 +1,234 @@
+"""
+Rate limiting shared by every worker on a node.
+
+DRF's throttles keep a list of request times per client in the cache, and
+with the default per-process LocMem cache each worker counts on its own,
+so N workers let through N times the rate. The throttles here count in a
+store all workers share, with a sliding-window counter: per client, the
+requests in the current fixed window and in the one before it. The rate
+is estimated as
+
+    requests before * share of the previous window still in range + requests now
+
+which costs the same at any rate and doesn't allow the double burst a
+fixed window allows around its edges.
+
+THROTTLE_BACKEND picks the store:
+
+- SharedMemoryBackend (the default) keeps the counters in a memory-mapped
+  file, THROTTLE_FILE, that every worker maps. Each bucket of records is
+  guarded by a lock on its bytes of the file.
+- CacheBackend keeps them in the Django cache named by THROTTLE_CACHE,
+  e.g. Redis or Memcached, to share limits between nodes too.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework import throttling
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads are serialised, as workers there don't share the file.
+    fcntl = None
+
+DEFAULT_BACKEND = 'hospital_management.throttling.SharedMemoryBackend'
+# Key hash, window number, requests in that window, requests in the window before.
+RECORD = struct.Struct('<QQII')
+BUCKET_RECORDS = 8
+# 8192 buckets of 8 records: room for 65536 clients in 1.5 MiB.
+DEFAULT_BUCKETS = 8192
+THREAD_LOCKS = 64
+
+
+def count(current, previous, limit, duration, now):
+    """
+    Whether one more request fits, given the requests in the current and
+    previous window; returns (allowed, seconds to wait if not).
+    """
+    elapsed = now % duration
+    rate = previous * (duration - elapsed) / duration + current
+    if rate + 1 <= limit:
+        return True, 0
+    if previous and current + 1 <= limit:
+        # The estimate drops as the previous window slides out of range.
+        return False, (rate + 1 - limit) * duration / previous
+    # Only the next window helps, and there this one's requests still count for a while.
+    wait = duration - elapsed
+    if current:
+        wait += max(0, duration * (1 - (limit - 1) / current))
+    return False, wait
+
+
+class SharedMemoryBackend:
+    """
+    Counters in a file mapped into every worker's memory. A key hashes to
+    a bucket of BUCKET_RECORDS records; when all of them hold other keys,
+    the one idle longest is reused. Size THROTTLE_BUCKETS to the clients
+    active in one window.
+    """
+
+    def __init__(self, path=None, buckets=None):
+        self.path = path or getattr(settings, 'THROTTLE_FILE', None) or os.path.join(
+            tempfile.gettempdir(), 'hospital_management_throttle'
+        )
+        self.buckets = buckets or getattr(settings, 'THROTTLE_BUCKETS', DEFAULT_BUCKETS)
+        self.bucket_size = RECORD.size * BUCKET_RECORDS
+        # fcntl locks belong to the process, so threads also need their own.
+        self.thread_locks = [threading.Lock() for _ in range(THREAD_LOCKS)]
+        self.open_lock = threading.Lock()
+        self.fd = None
+        self.map = None
+
+    def open(self):
+        with self.open_lock:
+            if self.map is not None:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            size = self.buckets * self.bucket_size
+            # Only ever grown: another worker may already be counting in it.
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self.fd, self.map = fd, mmap.mmap(fd, size)
+
+    def close(self):
+        with self.open_lock:
+            if self.map is not None:
+                self.map.close()
+                os.close(self.fd)
+                self.fd = self.map = None
+
+    def hit(self, key, limit, duration, now):
+        """Count a request for `key` if it fits in `limit` per `duration` seconds; return (allowed, wait)."""
+        if self.map is None:
+            self.open()
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        bucket = digest % self.buckets
+        start = bucket * self.bucket_size
+        window = int(now // duration)
+        with self.thread_locks[bucket % THREAD_LOCKS]:
+            if fcntl:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX, self.bucket_size, start)
+            try:
+                offset, current, previous = self.find(start, digest, window)
+                allowed, wait = count(current, previous, limit, duration, now)
+                if allowed:
+                    RECORD.pack_into(self.map, offset, digest, window, current + 1, previous)
+                return allowed, wait
+            finally:
+                if fcntl:
+                    fcntl.lockf(self.fd, fcntl.LOCK_UN, self.bucket_size, start)
+
+    def find(self, start, digest, window):
+        """The record for `digest` in the bucket at `start` and its counts as of `window`."""
+        oldest = None
+        for offset in range(start, start + self.bucket_size, RECORD.size):
+            record_digest, record_window, current, previous = RECORD.unpack_from(self.map, offset)
+            if record_digest == digest:
+                if record_window == window:
+                    return offset, current, previous
+                if record_window == window - 1:
+                    return offset, 0, current
+                return offset, 0, 0
+            # Unused records have window 0, so they go first.
+            if oldest is None or record_window < oldest[1]:
+                oldest = (offset, record_window)
+        return oldest[0], 0, 0
+
+
+class CacheBackend:
+    """
+    Counters in a Django cache, one entry per key and window, changed with
+    the cache's atomic incr/decr.
+    """
+
+    def __init__(self, alias=None):
+        self.cache = caches[alias or getattr(settings, 'THROTTLE_CACHE', 'default')]
+
+    def hit(self, key, limit, duration, now):
+        window = int(now // duration)
+        current_key = f'{key}:{window}'
+        previous = self.cache.get(f'{key}:{window - 1}', 0)
+        # Count first and take it back if it didn't fit, so racing workers can't both slip in.
+        current = self.increment(current_key, duration)
+        allowed, wait = count(current - 1, previous, limit, duration, now)
+        if not allowed:
+            try:
+                self.cache.decr(current_key)
+            except ValueError:
+                pass
+        return allowed, wait
+
+    def increment(self, key, duration):
+        # Kept through the next window, which still reads it.
+        if self.cache.add(key, 1, timeout=2 * duration + 1):
+            return 1
+        try:
+            return self.cache.incr(key)
+        except ValueError:  # Expired since add().
+            self.cache.set(key, 1, timeout=2 * duration + 1)
+            return 1
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend():
+    path = getattr(settings, 'THROTTLE_BACKEND', DEFAULT_BACKEND)
+    backend = _backends.get(path)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(path)
+            if backend is None:
+                backend = _backends[path] = import_string(path)()
+    return backend
+
+
+@receiver(setting_changed)
+def _reset_backends(setting, **kwargs):
+    if setting.startswith('THROTTLE_') or setting == 'CACHES':
+        with _backends_lock:
+            for backend in _backends.values():
+                if hasattr(backend, 'close'):
+                    backend.close()
+            _backends.clear()
+
+
+class SlidingWindowThrottle(throttling.SimpleRateThrottle):
+    """SimpleRateThrottle counting in the shared backend instead of a cached history list."""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.now = self.timer()
+        allowed, self.wait_seconds = get_backend().hit(self.key, self.num_requests, self.duration, self.now)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AnonRateThrottle(throttling.AnonRateThrottle, SlidingWindowThrottle):
+    pass
+
+
+class UserRateThrottle(throttling.UserRateThrottle, SlidingWindowThrottle):
+    pass
+
+
+class ScopedRateThrottle(throttling.ScopedRateThrottle, SlidingWindowThrottle):
+    pass
@@ -0,0 +1,150 @@
+"""
+Housekeeping and fast lookups for simplejwt's token blacklist tables.
+
+Every issued refresh token leaves an OutstandingToken row behind and
+logging out adds a BlacklistedToken row. `purge_expired_tokens()` deletes
+the rows of expired tokens in small batches, which is safe to run while
+the site is up.
+
+Checking a refresh token against the blacklist normally costs a query.
+Each worker instead keeps a Bloom filter of every blacklisted jti: a
+token that isn't in the filter is certainly not blacklisted, and only
+the rare filter hit (a blacklisted token, or a ~1% false positive) goes
+to the database. The filter is topped up with the newly blacklisted rows
+whenever the BlacklistedToken table version changes (see table_versions)
+and rebuilt from scratch when it fills up or gets old. The versions only
+cover one machine, so it is also topped up every SYNC_SECONDS: a token
+blacklisted through another server is refused here within that long.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import Counter, deque
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from . import table_versions
+
+FALSE_POSITIVE_RATE = 0.01
+MIN_CAPACITY = 1024
+# Rebuild at least this often, to forget purged tokens.
+REBUILD_SECONDS = 3600
+# Top up at least this often, to see tokens blacklisted on other nodes.
+SYNC_SECONDS = 5
+# Longest a transaction that blacklists a token is expected to stay open.
+# Rows are re-read this far back, since ids are handed out before commit.
+COMMIT_MARGIN_SECONDS = 60
+LOAD_CHUNK_SIZE = 10000
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, step = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+    @property
+    def full(self):
+        return self.count > self.capacity
+
+
+class BlacklistFilter:
+    """One per worker; see the module docstring."""
+
+    def __init__(self):
+        self.bloom = None
+        self.version = None
+        self.built_at = 0
+        self.synced_at = 0
+        # (time, highest id loaded then), to know which ids are surely committed.
+        self.loaded = deque()
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+    def reset(self):
+        with self.lock:
+            self.bloom = None
+            self.loaded.clear()
+            self.stats.clear()
+
+    def safe_id(self, now):
+        """The highest id that was already loaded COMMIT_MARGIN_SECONDS ago."""
+        while len(self.loaded) > 1 and self.loaded[1][0] <= now - COMMIT_MARGIN_SECONDS:
+            self.loaded.popleft()
+        if self.loaded and self.loaded[0][0] <= now - COMMIT_MARGIN_SECONDS:
+            return self.loaded[0][1]
+        return 0
+
+    def refresh(self):
+        version = table_versions.get_version(table_versions.table_label(BlacklistedToken))
+        now = time.monotonic()
+        if (
+            self.bloom is not None and version == self.version
+            and now - self.synced_at < SYNC_SECONDS and now - self.built_at < REBUILD_SECONDS
+        ):
+            return
+        with self.lock:
+            if self.bloom is None or self.bloom.full or now - self.built_at >= REBUILD_SECONDS:
+                # Fill a new filter before swapping it in: readers don't take the lock.
+                bloom = BloomFilter(max(MIN_CAPACITY, BlacklistedToken.objects.count() * 2))
+                self.load(bloom, BlacklistedToken.objects.all(), now, reset=True)
+                self.bloom, self.built_at = bloom, now
+                self.stats['rebuilds'] += 1
+            else:
+                self.load(self.bloom, BlacklistedToken.objects.filter(id__gt=self.safe_id(now)), now)
+            self.version, self.synced_at = version, now
+
+    def load(self, bloom, rows, now, reset=False):
+        if reset:
+            self.loaded.clear()
+        highest = self.loaded[-1][1] if self.loaded else 0
+        for pk, jti in rows.order_by('id').values_list('id', 'token__jti').iterator(chunk_size=LOAD_CHUNK_SIZE):
+            bloom.add(jti)
+            highest = max(highest, pk)
+        self.loaded.append((now, highest))
+
+    def is_blacklisted(self, jti):
+        self.refresh()
+        if jti not in self.bloom:
+            self.stats['filtered'] += 1
+            return False
+        self.stats['queried'] += 1
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+blacklist_filter = BlacklistFilter()
+
+
+def purge_expired_tokens(batch_size=5000, now=None):
+    """
+    Delete the outstanding tokens (and their blacklist rows) that expired
+    before `now`, `batch_size` at a time in id order. Yields the number of
+    tokens deleted per batch.
+    """
+    now = now or timezone.now()
+    last_id = 0
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(id__gt=last_id, expires_at__lte=now)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        last_id = ids[-1]
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        yield len(ids)
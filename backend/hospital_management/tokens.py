@@ -0,0 +1,97 @@
+"""
+Role and ownership claims carried in the JWTs.
+
+Tokens say what their user is (role, patient_id, doctor_id), so the
+permission classes can decide from the token alone. They also carry the
+user's token_version (UserProfile.token_version); anything that changes
+those claims bumps it, and tokens issued before are then refused (see
+CachedJWTAuthentication and RoleTokenRefreshSerializer).
+"""
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .table_versions import mark_changed
+from .token_store import blacklist_filter
+
+ROLES = ('admin', 'staff', 'doctor', 'patient')
+TOKEN_VERSION_CLAIM = 'token_version'
+
+
+class RefreshToken(tokens.RefreshToken):
+    """Checks the blacklist through the per-worker filter (see token_store)."""
+
+    def check_blacklist(self):
+        if blacklist_filter.is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+
+def role_for(is_superuser, is_staff, doctor_id):
+    if is_superuser:
+        return 'admin'
+    if is_staff:
+        return 'staff'
+    return 'doctor' if doctor_id else 'patient'
+
+
+def role_claims(user):
+    """The claims for `user`, read fresh from the database."""
+    row = User.objects.filter(pk=user.pk).values(
+        'is_superuser', 'is_staff', 'doctor__id', 'patient__id', 'profile__token_version',
+    ).get()
+    return {
+        'role': role_for(row['is_superuser'], row['is_staff'], row['doctor__id']),
+        'patient_id': row['patient__id'],
+        'doctor_id': row['doctor__id'],
+        TOKEN_VERSION_CLAIM: row['profile__token_version'] or 0,
+    }
+
+
+def user_claims(user):
+    """The same claims, from a user loaded with its profile, patient and doctor."""
+    doctor = getattr(user, 'doctor', None)
+    patient = getattr(user, 'patient', None)
+    profile = getattr(user, 'profile', None)
+    return {
+        'role': role_for(user.is_superuser, user.is_staff, doctor and doctor.pk),
+        'patient_id': patient and patient.pk,
+        'doctor_id': doctor and doctor.pk,
+        TOKEN_VERSION_CLAIM: profile.token_version if profile else 0,
+    }
+
+
+def get_tokens_for_user(user):
+    refresh = RefreshToken.for_user(user)
+    # The access token copies these from the refresh token.
+    for claim, value in role_claims(user).items():
+        refresh[claim] = value
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
+
+
+def bump_token_version(user_id):
+    """Refuse every token issued to the user so far."""
+    from user_profile.models import UserProfile
+    UserProfile.objects.filter(user_id=user_id).update(token_version=F('token_version') + 1)
+    mark_changed(UserProfile)
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """A refresh token issued before the user's last role change can't be used."""
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh.get(api_settings.USER_ID_CLAIM)}
+        ).values('is_active', 'profile__token_version').first()
+        if user is None or not user['is_active']:
+            raise InvalidToken('No active account found for this token.')
+        if refresh.get(TOKEN_VERSION_CLAIM, 0) != (user['profile__token_version'] or 0):
+            raise InvalidToken('Your account changed since this token was issued; log in again.')
+        return super().validate(attrs)
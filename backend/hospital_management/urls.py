@@ -18,7 +18,9 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from user_profile.views import UserListView
+from user_profile.views import UserExportView, UserListView
+from task_queue.views import TaskStatsView
+from .views import CacheStatsView, media
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('contacts/', include('contact_us.urls')),
@@ -27,9 +29,12 @@ urlpatterns = [
     path('patients/', include('patient.urls')),
     path('appointments/', include('appointment.urls')),
     path('api/all-users/', UserListView.as_view(), name='all_users'),
+    path('api/all-users/export/', UserExportView.as_view(), name='all_users_export'),
     path('api/user/', include('user_profile.urls')),
+    path('api/cache-stats/', CacheStatsView.as_view(), name='cache_stats'),
+    path('api/task-stats/', TaskStatsView.as_view(), name='task_stats'),
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL,
+    urlpatterns += static(settings.MEDIA_URL, view=media,
                           document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -0,0 +1,25 @@
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .permissions import IsAdminUser
+from . import caching, response_cache, storage
+
+# A year, the most caches keep anything.
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class CacheStatsView(APIView):
+    """Hit/miss counters of the response caches in the worker that answers."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response({'reference_data': caching.get_stats(), 'responses': response_cache.get_stats()})
+
+
+def media(request, path, document_root=None, show_indexes=False):
+    """Serves media in development. A blob never changes, so clients may keep it for good."""
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if storage.is_blob(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    return response
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from .filters import number_search
 from .models import Patient
 
 
@@ -6,8 +7,16 @@ from .models import Patient
 @admin.register(Patient)
 class PateintAdmin(admin.ModelAdmin):
     list_display = ["id", "user", "first_name", "last_name", "phone"]
-    search_fields = ["id", "user", "phone"]
-    list_filter = ["id", "user", "phone"]
+    list_select_related = ["user"]
+    # Numbers are looked up in the phone index instead (see get_search_results).
+    search_fields = ["user__username", "user__first_name", "user__last_name"]
+    readonly_fields = ["phone_normalized"]
+
+    def get_search_results(self, request, queryset, search_term):
+        condition = number_search(search_term.strip())
+        if condition is not None:
+            return queryset.filter(condition), False
+        return super().get_search_results(request, queryset, search_term)
 
     def first_name(self, object):
         return object.user.first_name
@@ -0,0 +1,61 @@
+import django_filters
+from django.db.models import Q
+from rest_framework.filters import SearchFilter
+from .models import Patient
+from .phones import PHONE_TERM, normalize_phone, phone_search
+
+
+def number_search(term):
+    """The patients whose phone number starts with `term`, or whose id it is."""
+    condition = phone_search(term)
+    if condition is not None and term.isdigit() and len(term) <= 18:
+        condition |= Q(pk=int(term))
+    return condition
+
+
+class PatientFilter(django_filters.FilterSet):
+    # However the number is written: "01711-234567" finds "+8801711234567".
+    phone = django_filters.CharFilter(method='filter_phone')
+    phone_prefix = django_filters.CharFilter(method='filter_phone_prefix')
+
+    class Meta:
+        model = Patient
+        fields = ['phone', 'phone_prefix']
+
+    def filter_phone(self, queryset, name, value):
+        return queryset.filter(phone_normalized=normalize_phone(value))
+
+    def filter_phone_prefix(self, queryset, name, value):
+        condition = phone_search(value)
+        return queryset.filter(condition) if condition is not None else queryset.none()
+
+
+class PatientSearchFilter(SearchFilter):
+    """
+    `?search=` that looks numbers up in the normalized phone index: "01711"
+    finds every patient whose number starts with it, and the patient with
+    that id. Other words are matched against the view's search_fields.
+    """
+
+    def get_search_terms(self, request):
+        params = request.query_params.get(self.search_param, '').strip()
+        # "+880 1711 234567" is one number, not three words.
+        if PHONE_TERM.match(params):
+            return [params]
+        return super().get_search_terms(request)
+
+    def filter_queryset(self, request, queryset, view):
+        words = []
+        for term in self.get_search_terms(request):
+            condition = number_search(term)
+            if condition is None:
+                words.append(term)
+            else:
+                # In number order, which the index hands out for free.
+                queryset = queryset.filter(condition).order_by('phone_normalized', 'pk')
+        for word in words:
+            matches = Q()
+            for field in self.get_search_fields(view, request) or ():
+                matches |= Q(**{f'{field}__icontains': word})
+            queryset = queryset.filter(matches)
+        return queryset
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.11 on 2026-10-18 18:12
+
+import hospital_management.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient', '0003_alter_patient_phone'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='patient',
+            name='profile',
+            field=models.ImageField(blank=True, null=True, storage=hospital_management.storage.blob_storage, upload_to='patient/images'),
+        ),
+    ]
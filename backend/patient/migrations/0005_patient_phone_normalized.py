@@ -0,0 +1,24 @@
+# Generated by Django 5.1.11 on 2026-10-18 18:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient', '0004_alter_patient_profile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='phone_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['phone_normalized'], name='patient_phone_normalized_idx'),
+        ),
+    ]
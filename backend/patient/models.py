@@ -1,11 +1,28 @@
 from django.db import models
 from django.contrib.auth.models import User
+from hospital_management.storage import blob_storage
+from .phones import normalize_phone
 # Create your models here.
 
 class Patient(models.Model):
     user = models.OneToOneField(to=User, on_delete=models.CASCADE, related_name='patient')
-    profile = models.ImageField(upload_to='patient/images', null=True, blank=True)
+    profile = models.ImageField(upload_to='patient/images', storage=blob_storage, null=True, blank=True)
     phone = models.CharField(max_length=12, unique=True, null=True, blank=True)
+    # `phone` as an international number (see patient.phones); kept up to date by save().
+    phone_normalized = models.CharField(max_length=20, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # A plain B-tree: prefix searches are range scans on it (see patient.phones.phone_search).
+            models.Index(fields=['phone_normalized'], name='patient_phone_normalized_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.phone_normalized = normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_normalized'}
+        super().save(*args, **kwargs)
     
     def __str__(self) -> str:
         return f'{self.user.first_name} {self.user.last_name}'
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""
+Phone numbers in one canonical form, so they can be compared and searched.
+
+"01711-234567", "+880 1711 234567" and "8801711234567" are all stored in
+Patient.phone_normalized as the digits of the international number,
+8801711234567. A search for "01711" is normalized the same way and finds
+the numbers from 8801711 up to (not including) 8801712: a range scan on
+the index, where `LIKE '%01711%'` reads every row.
+"""
+import re
+from django.conf import settings
+from django.db.models import Q
+
+COUNTRY_CODE = '880'
+
+# Digits with the usual separators, and maybe a leading +.
+PHONE_TERM = re.compile(r'^\+?[\d\s().-]*\d[\d\s().-]*$')
+
+
+def country_code():
+    """The code numbers written without one (national numbers) belong to."""
+    return getattr(settings, 'PHONE_COUNTRY_CODE', COUNTRY_CODE)
+
+
+def normalize_phone(raw, partial=False):
+    """
+    The digits of `raw` as an international number, or None if it has no
+    digits. With `partial`, `raw` is the start of a number someone is
+    typing: "+8" or "88" stay the start of the country code.
+    """
+    if not raw:
+        return None
+    raw = raw.strip()
+    digits = re.sub(r'\D', '', raw)
+    if not digits:
+        return None
+    code = country_code()
+    if raw.startswith('+'):
+        return digits
+    if digits.startswith('00'):
+        return digits[2:] or None
+    if digits.startswith('0'):
+        # The trunk prefix of a national number.
+        return code + digits[1:]
+    if digits.startswith(code) or (partial and code.startswith(digits)):
+        return digits
+    return code + digits
+
+
+def phone_search(term, field='phone_normalized'):
+    """A Q for the numbers starting with `term`, or None if `term` isn't (part of) a phone number."""
+    if not PHONE_TERM.match(term):
+        return None
+    prefix = normalize_phone(term, partial=True)
+    if not prefix:
+        return None
+    # Digits sort before ':', the character after '9'.
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper})
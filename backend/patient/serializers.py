@@ -1,9 +1,11 @@
 from rest_framework import serializers
+from hospital_management.images import RenditionsField
 from .models import Patient
 from django.contrib.auth.models import User
 
 class PateintSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
+    profile_renditions = RenditionsField(source='profile')
     class Meta:
         model = Patient
         fields = "__all__"
@@ -0,0 +1,6 @@
+from hospital_management.images import track_images
+from hospital_management.table_versions import track_models
+from .models import Patient
+
+track_models(Patient)
+track_images(Patient, 'profile')
@@ -1,3 +1,81 @@
+from importlib import import_module
+from types import SimpleNamespace
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from rest_framework.test import APIClient
+from .models import Patient
+from .phones import normalize_phone, phone_search
 
-# Create your tests here.
+backfill = import_module('patient.migrations.0006_backfill_phone_normalized')
+
+
+class PhoneNormalizationTest(TestCase):
+    def test_spellings_of_one_number_agree(self):
+        for raw in ('01711-234567', '+880 1711 234567', '8801711234567', '008801711234567', '1711234567'):
+            self.assertEqual(normalize_phone(raw), '8801711234567', raw)
+        self.assertIsNone(normalize_phone(''))
+        self.assertIsNone(normalize_phone('n/a'))
+        self.assertEqual(normalize_phone('+4420 7946 0000'), '442079460000')
+
+    def test_partial_numbers(self):
+        self.assertEqual(normalize_phone('01711', partial=True), '8801711')
+        self.assertEqual(normalize_phone('88', partial=True), '88')
+        self.assertIsNone(phone_search('ann'))
+
+    def test_save_keeps_it_up_to_date(self):
+        patient = User.objects.create_user('ann').patient
+        patient.phone = '01711-234567'
+        patient.save(update_fields=['phone'])
+        patient.refresh_from_db()
+        self.assertEqual(patient.phone_normalized, '8801711234567')
+
+    def test_backfill(self):
+        patient = User.objects.create_user('ann').patient
+        Patient.objects.filter(pk=patient.pk).update(phone='01811111111', phone_normalized=None)
+        backfill.backfill_phone_normalized(apps, SimpleNamespace(connection=connection))
+        patient.refresh_from_db()
+        self.assertEqual(patient.phone_normalized, '8801811111111')
+
+
+class PatientPhoneSearchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.patients = {}
+        for username, phone in [('ann', '01711234567'), ('bob', '01711999999'), ('cid', '01811234567'), ('dan', None)]:
+            patient = User.objects.create_user(username, first_name=username.title()).patient
+            patient.phone = phone
+            patient.save()
+            self.patients[username] = patient
+
+    def search(self, **params):
+        response = self.client.get('/patients/', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(patient['user'] for patient in response.json()['results'])
+
+    def test_search_by_the_start_of_a_number(self):
+        self.assertEqual(self.search(search='01711'), ['ann', 'bob'])
+        self.assertEqual(self.search(search='+880 1711 2'), ['ann'])
+        self.assertEqual(self.search(search='+88'), ['ann', 'bob', 'cid'])
+        self.assertEqual(self.search(search='Bob'), ['bob'])
+
+    def test_search_by_id(self):
+        self.assertEqual(self.search(search=str(self.patients['dan'].pk)), ['dan'])
+
+    def test_filters(self):
+        self.assertEqual(self.search(phone='+880 1811-234567'), ['cid'])
+        self.assertEqual(self.search(phone_prefix='0171'), ['ann', 'bob'])
+        self.assertEqual(self.search(phone_prefix='x'), [])
+
+    def test_admin_search(self):
+        admin = User.objects.create_superuser('admin', password='pass')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/patient/patient/', {'q': '01811'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.patients['cid']])
+
+    def test_prefix_search_uses_the_index(self):
+        queryset = Patient.objects.filter(phone_search('01711'))
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            self.assertIn('patient_phone_normalized_idx', plan)
@@ -1,9 +1,2 @@
-from rest_framework_simplejwt.tokens import RefreshToken
-
-def get_tokens_for_user(user):
-    refresh = RefreshToken.for_user(user)
-
-    return {
-        'refresh': str(refresh),
-        'access': str(refresh.access_token),
-    }
\ No newline at end of file
+# Tokens carry role claims; see hospital_management.tokens.
+from hospital_management.tokens import get_tokens_for_user  # noqa: F401
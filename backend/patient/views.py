@@ -3,27 +3,31 @@ from django.contrib.auth.models import User
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.throttling import ScopedRateThrottle
+from hospital_management.throttling import ScopedRateThrottle
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters
 # Local modules
 from .models import Patient
+from .filters import PatientFilter, PatientSearchFilter
 from .serializers import PateintSerializer
 from hospital_management.permissions import IsOwnerOrReadOnly
-from hospital_management.paginations import StandardResultsSetPagination
+from hospital_management.conditional import ConditionalRequestMixin
+from hospital_management.streaming import StreamingExportMixin
+from hospital_management.paginations import KeysetOrPageNumberPagination
 # Create your views here.
 
-class PateintView(viewsets.ModelViewSet):
-    queryset = Patient.objects.all()
+class PateintView(ConditionalRequestMixin, StreamingExportMixin, viewsets.ModelViewSet):
+    queryset = Patient.objects.select_related('user')
     serializer_class = PateintSerializer
+    conditional_models = [Patient, User]
     permission_classes = [IsOwnerOrReadOnly]
     throttle_classes = [ScopedRateThrottle]
     throttle_scope = 'PateintView'
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter)
-    filterset_fields = ('phone',)
-    search_fields = ('id', 'user', 'phone')
-    pagination_class = StandardResultsSetPagination
-    
+    filter_backends = (DjangoFilterBackend, PatientSearchFilter)
+    filterset_class = PatientFilter
+    # Numbers are searched in the phone index (see PatientSearchFilter), words here.
+    search_fields = ('user__username', 'user__first_name', 'user__last_name')
+    pagination_class = KeysetOrPageNumberPagination
+
     def create(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data, context={'request':request})
         if serializer.is_valid(raise_exception=True):
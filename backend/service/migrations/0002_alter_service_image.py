@@ -0,0 +1,19 @@
+# Generated by Django 5.1.11 on 2026-10-18 18:12
+
+import hospital_management.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='service',
+            name='image',
+            field=models.ImageField(storage=hospital_management.storage.blob_storage, upload_to='service/image'),
+        ),
+    ]
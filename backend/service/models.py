@@ -1,8 +1,9 @@
 from django.db import models
+from hospital_management.storage import blob_storage
 
 # Create your models here.
 class Service(models.Model):
-    image = models.ImageField(upload_to='service/image')
+    image = models.ImageField(upload_to='service/image', storage=blob_storage)
     name = models.CharField(max_length=50)
     description = models.TextField()
     def __str__(self):
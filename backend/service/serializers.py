@@ -1,7 +1,10 @@
 from rest_framework import serializers
+from hospital_management.images import RenditionsField
 from .models import Service
 
 class ServiceSerializer(serializers.ModelSerializer):
+    image_renditions = RenditionsField(source='image')
+
     class Meta:
         model = Service
         fields = '__all__'
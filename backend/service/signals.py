@@ -0,0 +1,8 @@
+from hospital_management.images import track_images
+from hospital_management.response_cache import track_tags
+from hospital_management.table_versions import track_models
+from .models import Service
+
+track_models(Service)
+track_tags(Service, 'service')
+track_images(Service, 'image')
@@ -1,3 +1,125 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import tempfile
+from io import StringIO
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+from hospital_management import images
+from hospital_management.storage import blob_storage
+from hospital_management.views import media
+from .models import Service
 
-# Create your tests here.
+
+def image_file(size, mode='RGB', format='JPEG', name='photo.jpg'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30)).save(buffer, format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{format.lower()}')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), TABLE_VERSION_DIR=tempfile.mkdtemp())
+class ImageRenditionTest(TestCase):
+    def rendition(self, name, size, format):
+        with default_storage.open(images.rendition_name(name, size, format)) as file:
+            image = Image.open(file)
+            return image.format, image.size, image.mode
+
+    def test_uploads_are_rendered_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            service = Service.objects.create(name='X-ray', description='-', image=image_file((1600, 1200)))
+        images.wait_for_renders()
+
+        name = service.image.name
+        self.assertEqual(self.rendition(name, 1024, 'jpeg'), ('JPEG', (1024, 768), 'RGB'))
+        self.assertEqual(self.rendition(name, 64, 'webp'), ('WEBP', (64, 48), 'RGB'))
+        renditions = APIClient().get(f'/services/{service.pk}/').json()['image_renditions']
+        self.assertEqual(sorted(renditions, key=int), ['64', '256', '1024'])
+        self.assertTrue(renditions['256']['webp'].endswith(f'/media/renditions/{name[:-4]}/256.webp'))
+
+    def test_small_transparent_images_are_not_upscaled(self):
+        name = default_storage.save('service/image/logo.png', image_file((40, 30), 'RGBA', 'PNG'))
+        self.assertEqual(images.render(name), 6)
+        self.assertEqual(self.rendition(name, 1024, 'webp'), ('WEBP', (40, 30), 'RGBA'))
+        self.assertEqual(self.rendition(name, 1024, 'jpeg'), ('JPEG', (40, 30), 'RGB'))
+        self.assertEqual(images.render(name), 0)
+
+    def test_no_renditions_until_rendered(self):
+        service = Service.objects.create(name='X-ray', description='-', image=image_file((300, 300)))
+        self.assertIsNone(APIClient().get(f'/services/{service.pk}/').json()['image_renditions'])
+
+    def test_backfill_command(self):
+        Service.objects.create(name='X-ray', description='-', image=image_file((300, 200)))
+        Service.objects.create(name='MRI', description='-', image=image_file((10, 10), name='broken.jpg'))
+        broken = Service.objects.get(name='MRI').image.name
+        with default_storage.open(broken, 'wb') as file:
+            file.write(b'not an image')
+
+        out, err = StringIO(), StringIO()
+        call_command('render_images', workers=2, stdout=out, stderr=err)
+        self.assertIn('Rendered 1 of 2 images (6 files)', out.getvalue())
+        self.assertIn(broken, err.getvalue())
+        call_command('render_images', workers=2, stdout=out, stderr=err)
+        self.assertIn('Rendered 0 of 2 images', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), TABLE_VERSION_DIR=tempfile.mkdtemp())
+class BlobStorageTest(TestCase):
+    def test_uploads_are_named_by_content_and_stored_once(self):
+        upload = image_file((30, 20))
+        digest = hashlib.sha256(upload.read()).hexdigest()
+        first = Service.objects.create(name='X-ray', description='-', image=upload)
+        second = Service.objects.create(name='MRI', description='-', image=image_file((30, 20), name='Other.JPG'))
+
+        self.assertEqual(first.image.name, f'blobs/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(os.listdir(os.path.dirname(first.image.path)), [f'{digest}.jpg'])
+        self.assertEqual(os.listdir(blob_storage().path('blobs/tmp')), [])
+
+    def test_large_uploads_are_moved_into_place(self):
+        data = image_file((30, 20)).read()
+        upload = TemporaryUploadedFile('big.jpg', 'image/jpeg', len(data), None)
+        upload.write(data)
+        upload.seek(0)
+        name = blob_storage().save('service/image/big.jpg', upload)
+
+        self.assertEqual(name, f'blobs/{hashlib.sha256(data).hexdigest()[:2]}/{hashlib.sha256(data).hexdigest()}.jpg')
+        with blob_storage().open(name) as file:
+            self.assertEqual(file.read(), data)
+
+    def test_blobs_are_served_as_immutable(self):
+        service = Service.objects.create(name='X-ray', description='-', image=image_file((30, 20)))
+        default_storage.save('service/image/old.jpg', image_file((30, 20)))
+        request = RequestFactory().get('/media/')
+
+        response = media(request, service.image.name, document_root=blob_storage().location)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        response = media(request, 'service/image/old.jpg', document_root=blob_storage().location)
+        self.assertNotIn('Cache-Control', response)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_collect_unreferenced_images(self):
+        kept = Service.objects.create(name='X-ray', description='-', image=image_file((30, 20)))
+        gone = Service.objects.create(name='MRI', description='-', image=image_file((40, 20)))
+        legacy = default_storage.save('service/image/legacy.jpg', image_file((50, 20)))
+        images.render(gone.image.name)
+        orphan = gone.image.name
+        gone.delete()
+
+        out = StringIO()
+        call_command('gc_media', stdout=out)
+        self.assertIn('Found 0 unreferenced files', out.getvalue())
+        call_command('gc_media', min_age=0, stdout=out)
+        self.assertIn(legacy, out.getvalue())
+        self.assertIn('Found 2 unreferenced files', out.getvalue())
+        self.assertTrue(default_storage.exists(orphan))
+
+        call_command('gc_media', min_age=0, delete=True, stdout=out)
+        self.assertIn('Deleted 2 unreferenced files', out.getvalue())
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertFalse(default_storage.exists(legacy))
+        self.assertFalse(default_storage.exists(os.path.dirname(images.ready_name(orphan))))
+        self.assertTrue(default_storage.exists(kept.image.name))
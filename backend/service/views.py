@@ -1,11 +1,13 @@
 from django.shortcuts import render
 from rest_framework import viewsets
+from hospital_management.response_cache import ResponseCacheMixin
+from hospital_management.conditional import ConditionalRequestMixin
 from .models import Service
 from .serializers import ServiceSerializer
 # Create your views here.
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(ConditionalRequestMixin, ResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
-    
\ No newline at end of file
+    
@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'run_at', 'attempts', 'started_at', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'key']
+    readonly_fields = ['locked_by', 'locked_until', 'started_at', 'finished_at', 'last_error']
@@ -0,0 +1,72 @@
+import multiprocessing
+import signal
+import threading
+import time
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from task_queue.queue import work
+
+
+def stop_on_signals(stop):
+    """Finish the running tasks and exit on Ctrl-C or SIGTERM; returns the handlers it replaced."""
+    previous = {}
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        previous[signum] = signal.signal(signum, lambda *args: stop.set())
+    return previous
+
+
+def work_in_process(stop, results, threads, poll_interval, burst):
+    # Spawned workers (macOS, Windows) start without Django configured.
+    django.setup()
+    stop_on_signals(stop)
+    results.put(work(stop, threads=threads, poll_interval=poll_interval, burst=burst))
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs queued tasks on a pool of threads in each of --processes processes, '
+        'until stopped (Ctrl-C or SIGTERM finish the running tasks first) or, with --burst, '
+        'until no task is due.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=4, help='Tasks run at once in each process')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between looks for due tasks when idle')
+        parser.add_argument('--burst', action='store_true', help='Exit once no task is due')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        arguments = (options['threads'], options['poll_interval'], options['burst'])
+
+        if options['processes'] == 1:
+            stop = threading.Event()
+            previous = stop_on_signals(stop)
+            try:
+                ran = work(stop, *arguments)
+            finally:
+                for signum, handler in previous.items():
+                    signal.signal(signum, handler)
+        else:
+            stop, results = multiprocessing.Event(), multiprocessing.Queue()
+            # Each process opens its own connections.
+            connections.close_all()
+            processes = [
+                multiprocessing.Process(target=work_in_process, args=(stop, results, *arguments))
+                for _ in range(options['processes'])
+            ]
+            for process in processes:
+                process.start()
+            previous = stop_on_signals(stop)
+            try:
+                for process in processes:
+                    process.join()
+            finally:
+                for signum, handler in previous.items():
+                    signal.signal(signum, handler)
+            # A process that crashed has nothing to report.
+            ran = sum(results.get() for process in processes if process.exitcode == 0)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'Ran {ran} tasks in {elapsed:.1f}s ({ran / elapsed if elapsed else 0:,.1f} tasks/s)')
@@ -0,0 +1,313 @@
+"""
+A task queue kept in the database, so no broker has to run next to it.
+
+Functions decorated with `@task` in an app's tasks.py are queued as Task
+rows with `send_verification_email.delay(user_id=1, ...)`, or for later
+with `.schedule(when, **kwargs)`. Queuing is an INSERT in the caller's
+transaction: a task queued inside `transaction.atomic()` is only queued
+if the rest of it commits. Arguments must be JSON.
+
+`run_tasks` workers claim due rows in batches. On PostgreSQL (and any
+database with SKIP LOCKED) the claim is `SELECT ... FOR UPDATE SKIP
+LOCKED`, so workers never wait on each other's rows. SQLite has no row
+locks but runs one write at a time, so there an UPDATE that re-checks the
+row is still queued claims it exactly once.
+
+A task that raises is queued again after `backoff * 2 ** (attempts - 1)`
+seconds, until it has run `max_attempts` times. Tasks with `every` are
+queued again that long after each run. While a task runs its worker
+extends the lease every third of TASK_LEASE, so a long task is never
+taken by a second worker; a task whose worker died is claimed again
+once its lease runs out.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+LEASE = 600
+MAX_BACKOFF = 3600
+
+# name: TaskFunction, filled in as the tasks.py modules are imported.
+registry = {}
+
+
+class TaskFunction:
+    """A function registered with `@task`; calling it still runs it right away."""
+
+    def __init__(self, func, name, max_attempts, backoff, every):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.every = every
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, **kwargs):
+        """Queue a run as soon as a worker is free."""
+        return enqueue(self.name, kwargs)
+
+    def schedule(self, when, **kwargs):
+        """Queue a run at `when`, a datetime or a timedelta from now."""
+        if isinstance(when, timedelta):
+            when = timezone.now() + when
+        return enqueue(self.name, kwargs, run_at=when)
+
+    def retry_delay(self, attempts):
+        delay = min(self.backoff * 2 ** (attempts - 1), MAX_BACKOFF)
+        # Spread out the retries of tasks that failed together.
+        return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def task(func=None, *, name=None, max_attempts=5, backoff=30, every=None):
+    """
+    Register `func` as a task. `backoff` is the seconds before the first
+    retry; `every`, a timedelta, makes it run periodically.
+    """
+    def register(func):
+        task_name = name or f'{func.__module__}.{func.__qualname__}'
+        registry[task_name] = TaskFunction(func, task_name, max_attempts, backoff, every)
+        return registry[task_name]
+    return register(func) if func else register
+
+
+def enqueue(name, kwargs=None, run_at=None, key=None):
+    """
+    Queue the task registered as `name`. With a `key`, nothing is queued if
+    a task with that key is still queued or running; that one is returned.
+    """
+    function = registry[name]
+    row = Task(
+        name=name, kwargs=kwargs or {}, key=key,
+        run_at=run_at or timezone.now(), max_attempts=function.max_attempts,
+    )
+    if key is None:
+        row.save()
+        return row
+    Task.objects.bulk_create([row], ignore_conflicts=True)
+    return Task.objects.get(key=key)
+
+
+def lease_seconds():
+    return getattr(settings, 'TASK_LEASE', LEASE)
+
+
+def worker_name():
+    return f'{socket.gethostname()[:40]}:{os.getpid()}:{threading.get_ident()}'
+
+
+def due_tasks(now):
+    return Task.objects.filter(status__in=[Task.QUEUED, Task.RUNNING], run_at__lte=now).filter(
+        Q(status=Task.QUEUED) | Q(locked_until__lt=now)
+    )
+
+
+def claim(limit, worker=None):
+    """Take up to `limit` due tasks for this worker; returns them, oldest first."""
+    now = timezone.now()
+    # Unique per claim, so the rows taken can be told apart from any other claim's.
+    locked_by = f'{worker or worker_name()}/{uuid.uuid4().hex[:8]}'
+    changes = dict(
+        status=Task.RUNNING, locked_by=locked_by, locked_until=now + timedelta(seconds=lease_seconds()),
+        started_at=now, attempts=F('attempts') + 1,
+    )
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            pks = list(
+                due_tasks(now).select_for_update(skip_locked=True).order_by('run_at')
+                .values_list('pk', flat=True)[:limit]
+            )
+            Task.objects.filter(pk__in=pks).update(**changes)
+    else:
+        pks = list(due_tasks(now).order_by('run_at').values_list('pk', flat=True)[:limit])
+        # Re-checked in the UPDATE: another worker may have claimed some since.
+        due_tasks(now).filter(pk__in=pks).update(**changes)
+    return list(Task.objects.filter(locked_by=locked_by).order_by('run_at'))
+
+
+def finish(row, **changes):
+    """Save the outcome, unless the lease ran out and another worker has the task now."""
+    changes.setdefault('locked_by', '')
+    changes.setdefault('locked_until', None)
+    return Task.objects.filter(pk=row.pk, locked_by=row.locked_by).update(**changes)
+
+
+def extend_lease(row, stop):
+    """Keep the lease of a running task from running out until `stop` is set."""
+    try:
+        while not stop.wait(lease_seconds() / 3):
+            Task.objects.filter(pk=row.pk, locked_by=row.locked_by).update(
+                locked_until=timezone.now() + timedelta(seconds=lease_seconds())
+            )
+    finally:
+        connection.close()
+
+
+def run(row):
+    """Run a claimed task and record how it went; returns its new status."""
+    function = registry.get(row.name)
+    close_old_connections()
+    try:
+        if function is None:
+            raise LookupError(f'No task is registered as {row.name}.')
+        if row.attempts > row.max_attempts:
+            raise RuntimeError(f'Gave up after {row.max_attempts} attempts; the last one never finished.')
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=extend_lease, args=(row, stop), name=f'lease-{row.pk}', daemon=True)
+        heartbeat.start()
+        try:
+            function.func(**row.kwargs)
+        finally:
+            stop.set()
+            heartbeat.join()
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if function is not None and row.attempts < row.max_attempts:
+            logger.warning('Task %s #%s failed, attempt %s of %s', row.name, row.pk, row.attempts, row.max_attempts)
+            finish(row, status=Task.QUEUED, run_at=now + function.retry_delay(row.attempts), last_error=error)
+            return Task.QUEUED
+        logger.error('Task %s #%s failed for good', row.name, row.pk)
+        status = Task.FAILED
+        finished = finish(row, status=status, finished_at=now, key=None, last_error=error)
+    else:
+        now = timezone.now()
+        status = Task.DONE
+        finished = finish(row, status=status, finished_at=now, key=None)
+        logger.info(
+            'Task %s #%s done in %.3fs, %.3fs after it was due',
+            row.name, row.pk, (now - row.started_at).total_seconds(), row.wait,
+        )
+    finally:
+        close_old_connections()
+    if finished and function is not None and function.every:
+        # Counted from when it was due, so a periodic task doesn't drift later run by run.
+        enqueue(row.name, row.kwargs, run_at=max(row.run_at + function.every, now), key=periodic_key(row.name))
+    return status
+
+
+def periodic_key(name):
+    return f'periodic:{name}'
+
+
+def schedule_periodic():
+    """Make sure every periodic task has a run queued; workers call this when they start."""
+    for name, function in registry.items():
+        if function.every:
+            enqueue(name, key=periodic_key(name))
+
+
+def run_pending(limit=None, batch_size=10):
+    """Run due tasks in this thread until there are none (or `limit` ran); returns how many ran."""
+    ran = 0
+    while limit is None or ran < limit:
+        rows = claim(batch_size if limit is None else min(batch_size, limit - ran))
+        if not rows:
+            break
+        for row in rows:
+            run(row)
+            ran += 1
+    return ran
+
+
+def work(stop, threads=4, poll_interval=1.0, burst=False):
+    """
+    Run due tasks on `threads` threads until `stop` (a threading or
+    multiprocessing Event) is set, or with `burst` until none are due.
+    Returns how many ran.
+    """
+    schedule_periodic()
+    ran = 0
+    running = set()
+    lock = threading.Lock()
+    # Set when a thread comes free, so its next task is claimed straight away.
+    freed = threading.Event()
+
+    def done(future):
+        with lock:
+            running.discard(future)
+        freed.set()
+
+    with ThreadPoolExecutor(threads, thread_name_prefix='task') as pool:
+        while not stop.is_set():
+            freed.clear()
+            with lock:
+                free = threads - len(running)
+            if not free:
+                freed.wait(poll_interval)
+                continue
+            rows = claim(free)
+            ran += len(rows)
+            for row in rows:
+                future = pool.submit(run, row)
+                with lock:
+                    running.add(future)
+                future.add_done_callback(done)
+            if rows:
+                continue
+            with lock:
+                idle = not running
+            if burst and idle:
+                break
+            stop.wait(poll_interval)
+    close_old_connections()
+    return ran
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def get_stats(since=None):
+    """
+    Per task name: how many are due and queued, and of those that finished
+    since `since` (the last hour by default) how many failed, with the
+    seconds they waited after being due and the seconds they ran.
+    """
+    now = timezone.now()
+    since = since or now - timedelta(hours=1)
+    stats = {}
+
+    def entry(name):
+        return stats.setdefault(name, {'queued': 0, 'done': 0, 'failed': 0, 'wait': [], 'run': []})
+
+    for name, run_at in due_tasks(now).filter(status=Task.QUEUED).values_list('name', 'run_at').iterator():
+        values = entry(name)
+        values['queued'] += 1
+        values['oldest_due'] = min(values.get('oldest_due', run_at), run_at)
+    finished = Task.objects.filter(finished_at__gte=since).values_list(
+        'name', 'status', 'run_at', 'started_at', 'finished_at'
+    )
+    for name, status, run_at, started_at, finished_at in finished.iterator():
+        values = entry(name)
+        values[status] += 1
+        values['wait'].append(max((started_at - run_at).total_seconds(), 0))
+        values['run'].append((finished_at - started_at).total_seconds())
+
+    for values in stats.values():
+        oldest = values.pop('oldest_due', None)
+        values['oldest_wait'] = round((now - oldest).total_seconds(), 3) if oldest else None
+        for measure in ('wait', 'run'):
+            samples = values.pop(measure)
+            for label, fraction in (('p50', 0.5), ('p95', 0.95), ('max', 1)):
+                value = percentile(samples, fraction)
+                values[f'{measure}_{label}'] = round(value, 3) if value is not None else None
+    return stats
@@ -0,0 +1,19 @@
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from .models import Task
+from .queue import task
+
+RETENTION = timedelta(days=7)
+BATCH_SIZE = 5000
+
+
+@task(every=timedelta(hours=1))
+def purge_finished_tasks():
+    """Delete the tasks that finished longer than TASK_RETENTION ago, a batch at a time."""
+    cutoff = timezone.now() - getattr(settings, 'TASK_RETENTION', RETENTION)
+    while True:
+        ids = list(Task.objects.filter(finished_at__lt=cutoff).values_list('pk', flat=True)[:BATCH_SIZE])
+        if not ids:
+            return
+        Task.objects.filter(pk__in=ids).delete()
@@ -0,0 +1,177 @@
+import re
+import time
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .models import Task
+from .queue import claim, enqueue, get_stats, registry, run, run_pending, schedule_periodic, task
+
+calls = []
+
+
+@task(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task(name='tests.flaky', max_attempts=3, backoff=10)
+def flaky():
+    calls.append('flaky')
+    raise ValueError('not yet')
+
+
+@task(name='tests.periodic', every=timedelta(minutes=5))
+def periodic():
+    calls.append('periodic')
+
+
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+        # Only the tasks these tests queue themselves.
+        self.registry = dict(registry)
+        for name in list(registry):
+            if not name.startswith('tests.'):
+                del registry[name]
+
+    def tearDown(self):
+        registry.clear()
+        registry.update(self.registry)
+
+    def test_delayed_tasks_run_once(self):
+        row = record.delay(value=1)
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(run_pending(), 0)
+
+        self.assertEqual(calls, [1])
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts, row.locked_by), (Task.DONE, 1, ''))
+        self.assertGreaterEqual(row.duration, 0)
+        self.assertGreaterEqual(row.wait, 0)
+
+    def test_queued_with_the_callers_transaction(self):
+        try:
+            with transaction.atomic():
+                record.delay(value=1)
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertFalse(Task.objects.exists())
+
+    def test_scheduled_tasks_wait_until_due(self):
+        row = record.schedule(timedelta(hours=1), value=1)
+        self.assertEqual(run_pending(), 0)
+        Task.objects.filter(pk=row.pk).update(run_at=timezone.now())
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [1])
+
+    def test_failures_are_retried_with_backoff(self):
+        row = flaky.delay()
+        delays = []
+        with self.assertLogs('task_queue.queue', 'WARNING') as logs:
+            for attempt in range(1, 4):
+                self.assertEqual(run_pending(), 1)
+                row.refresh_from_db()
+                self.assertEqual(row.attempts, attempt)
+                self.assertIn('ValueError: not yet', row.last_error)
+                if row.status == Task.QUEUED:
+                    delays.append((row.run_at - timezone.now()).total_seconds())
+                    Task.objects.filter(pk=row.pk).update(run_at=timezone.now())
+
+        self.assertEqual(row.status, Task.FAILED)
+        self.assertEqual(calls, ['flaky'] * 3)
+        self.assertTrue(7 < delays[0] <= 12 and 15 < delays[1] <= 24, delays)
+        self.assertIn('failed for good', logs.output[-1])
+
+    def test_keys_keep_one_task_queued(self):
+        first = enqueue('tests.record', {'value': 1}, key='record')
+        self.assertEqual(enqueue('tests.record', {'value': 2}, key='record').pk, first.pk)
+        run_pending()
+        self.assertNotEqual(enqueue('tests.record', {'value': 3}, key='record').pk, first.pk)
+
+    def test_periodic_tasks_are_queued_again(self):
+        schedule_periodic()
+        schedule_periodic()
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, ['periodic'])
+        following = Task.objects.get(status=Task.QUEUED)
+        self.assertEqual(following.name, 'tests.periodic')
+        self.assertGreater(following.run_at, timezone.now() + timedelta(minutes=4))
+
+    def test_claims_do_not_overlap_and_expired_leases_are_taken_again(self):
+        for value in range(5):
+            record.delay(value=value)
+        first, second = claim(3, worker='a'), claim(3, worker='b')
+        self.assertEqual((len(first), len(second)), (3, 2))
+        self.assertEqual(claim(3), [])
+
+        Task.objects.filter(pk=first[0].pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        again = claim(3, worker='c')
+        self.assertEqual([row.pk for row in again], [first[0].pk])
+        self.assertEqual(again[0].attempts, 2)
+        # The worker whose lease ran out can't overwrite the new one's result.
+        run(first[0])
+        self.assertEqual(Task.objects.get(pk=first[0].pk).status, Task.RUNNING)
+
+    def test_stats(self):
+        record.delay(value=1)
+        run_pending()
+        flaky.delay()
+        stats = get_stats()
+        self.assertEqual((stats['tests.record']['done'], stats['tests.flaky']['queued']), (1, 1))
+        self.assertIsNotNone(stats['tests.record']['run_p95'])
+
+        admin = User.objects.create_user('admin', password='pass', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        self.assertEqual(client.get('/api/task-stats/?minutes=5').json()['tests.record']['done'], 1)
+
+
+@task(name='tests.slow')
+def slow():
+    # Outlives several leases, then checks nobody else could take it meanwhile.
+    time.sleep(0.5)
+    calls.append(claim(1, worker='other'))
+
+
+class RunTasksCommandTest(TransactionTestCase):
+    @override_settings(TASK_LEASE=0.2)
+    def test_running_tasks_keep_their_lease(self):
+        calls.clear()
+        row = slow.delay()
+        self.assertEqual(run(claim(1)[0]), Task.DONE)
+        self.assertEqual(calls, [[]])
+        self.assertEqual(Task.objects.get(pk=row.pk).attempts, 1)
+
+    def test_threads_run_every_due_task(self):
+        calls.clear()
+        for value in range(20):
+            record.delay(value=value)
+        out = StringIO()
+        call_command('run_tasks', threads=4, burst=True, poll_interval=0.01, stdout=out)
+        self.assertIn('Ran', out.getvalue())
+        self.assertEqual(sorted(value for value in calls if value != 'periodic'), list(range(20)))
+        self.assertFalse(Task.objects.filter(name='tests.record').exclude(status=Task.DONE).exists())
+
+
+class VerificationEmailTest(TestCase):
+    def test_registration_mails_a_working_link(self):
+        client = APIClient()
+        response = client.post('/api/user/register/', {
+            'username': 'ann', 'email': 'ann@example.com', 'password': 'S3cure-pass!', 'confirm_password': 'S3cure-pass!',
+            'first_name': 'Ann', 'last_name': 'Lee',
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(mail.outbox[0].to, ['ann@example.com'])
+        link = re.search(r'http://testserver/api/user/verify/\S+/', mail.outbox[0].body).group()
+        self.assertEqual(client.get(link).status_code, 200)
+        self.assertEqual(client.get('/api/user/verify/xx/yy/').status_code, 400)
@@ -0,0 +1,19 @@
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from hospital_management.permissions import IsAdminUser
+from .queue import get_stats
+
+
+class TaskStatsView(APIView):
+    """Per task: the backlog, and the waits and run times of the ones that finished in the last ?minutes= (60)."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        try:
+            minutes = int(request.query_params.get('minutes', 60))
+        except ValueError:
+            raise ValidationError({'minutes': 'A whole number of minutes.'})
+        return Response(get_stats(since=timezone.now() - timedelta(minutes=minutes)))
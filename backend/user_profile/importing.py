@@ -0,0 +1,231 @@
+"""
+Bulk import of users, patients and doctors from CSV or NDJSON.
+
+The file is read one line at a time and handled in batches. Each batch is
+validated row by row, its usernames and phone numbers are checked against
+the database with one query each, passwords are hashed across a process
+pool, and the User, UserProfile, Patient, Doctor and M2M rows are written
+with one bulk_create per table. What the per-row signals would do (the
+profile and patient, rating summaries, weekly schedules and slots, the
+search index, table versions) is done once per batch.
+
+A bad row doesn't stop the import; it is reported with its line number.
+"""
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from doctor.models import AvailableTime, Designation, Doctor, DoctorRating, Schedule, Specialisation
+from doctor.scheduling import generate_slots, parse_available_time
+from doctor.search import index_doctors
+from hospital_management.response_cache import invalidate_models
+from hospital_management.table_versions import mark_changed
+from patient.models import Patient
+from patient.phones import normalize_phone
+from .models import UserProfile
+from .serializers import UserImportSerializer
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+BATCH_SIZE = 1000
+PROFILE_FIELDS = ('bio', 'address', 'date_of_birth')
+
+
+def guess_format(name):
+    extension = os.path.splitext(name or '')[1].lower().lstrip('.')
+    return {'jsonl': 'ndjson', 'json': 'ndjson'}.get(extension, extension)
+
+
+def read_rows(file, format):
+    """
+    Yield (line number, row) from a binary or text file. A line that
+    can't be parsed is yielded as (line number, None).
+    """
+    if isinstance(file.read(0), bytes):
+        file = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    if format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            # Empty cells count as not given.
+            yield reader.line_num, {name: value for name, value in row.items() if name and value not in ('', None)}
+    else:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+
+
+def _setup_worker():
+    # Spawned workers (macOS, Windows) start without Django configured.
+    django.setup()
+
+
+def hash_worker_count():
+    """settings.IMPORT_HASH_WORKERS, defaulting to one per CPU."""
+    return getattr(settings, 'IMPORT_HASH_WORKERS', None) or os.cpu_count() or 1
+
+
+class UserImport:
+    """Call `run(rows)` with what read_rows() yields; returns the report."""
+
+    def __init__(self, batch_size=BATCH_SIZE, workers=None):
+        self.batch_size = batch_size
+        self.workers = workers or hash_worker_count()
+        self.report = {'rows': 0, 'created': 0, 'doctors': 0, 'failed': 0, 'errors': []}
+        self.seen_usernames = set()
+        self.seen_phones = set()
+        self.lookups = {
+            'specialisation': dict(Specialisation.objects.values_list('slug', 'id')),
+            'designation': dict(Designation.objects.values_list('slug', 'id')),
+            'available_time': {text: pk for pk, text in AvailableTime.objects.order_by('-id').values_list('id', 'time')},
+        }
+
+    def run(self, rows):
+        pool = None
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(self.workers, initializer=_setup_worker)
+        try:
+            batch = []
+            for line, row in rows:
+                batch.append((line, row))
+                if len(batch) == self.batch_size:
+                    self.import_batch(batch, pool)
+                    batch = []
+            if batch:
+                self.import_batch(batch, pool)
+        finally:
+            if pool:
+                pool.shutdown()
+        self.report['errors'].sort(key=lambda error: error['line'])
+        return self.report
+
+    def fail(self, line, errors, username=None):
+        self.report['failed'] += 1
+        self.report['errors'].append({'line': line, 'username': username, 'errors': errors})
+
+    def validate(self, batch):
+        valid = []
+        context = {'lookups': self.lookups}
+        for line, row in batch:
+            self.report['rows'] += 1
+            if row is None:
+                self.fail(line, {'non_field_errors': ['Could not parse this line.']})
+                continue
+            serializer = UserImportSerializer(data=row, context=context)
+            if serializer.is_valid():
+                valid.append((line, serializer.validated_data))
+            else:
+                self.fail(line, serializer.errors, row.get('username'))
+
+        usernames = [data['username'] for _, data in valid]
+        phones = [data['phone'] for _, data in valid if data.get('phone')]
+        taken_usernames = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        taken_phones = set(Patient.objects.filter(phone__in=phones).values_list('phone', flat=True))
+        unique = []
+        for line, data in valid:
+            username, phone = data['username'], data.get('phone')
+            if username in taken_usernames or username in self.seen_usernames:
+                self.fail(line, {'username': ['A user with that username already exists.']}, username)
+            elif phone and (phone in taken_phones or phone in self.seen_phones):
+                self.fail(line, {'phone': ['This phone number is already used.']}, username)
+            else:
+                self.seen_usernames.add(username)
+                if phone:
+                    self.seen_phones.add(phone)
+                unique.append((line, data))
+        return unique
+
+    def hash_passwords(self, rows, pool):
+        passwords = [data['password'] for _, data in rows if data.get('password')]
+        if pool:
+            hashed = pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (self.workers * 4)))
+        else:
+            hashed = map(make_password, passwords)
+        hashed = iter(list(hashed))
+        for _, data in rows:
+            if data.get('password'):
+                data['password_hash'] = next(hashed)
+            elif not data.get('password_hash'):
+                data['password_hash'] = make_password(None)
+
+    def import_batch(self, batch, pool):
+        rows = self.validate(batch)
+        if not rows:
+            return
+        self.hash_passwords(rows, pool)
+        try:
+            with transaction.atomic():
+                doctor_count = self.write(rows)
+        except IntegrityError as e:
+            # Someone took a username or phone number since the check above.
+            for line, data in rows:
+                self.fail(line, {'non_field_errors': [f'Batch not imported: {e}']}, data['username'])
+            return
+        self.report['created'] += len(rows)
+        self.report['doctors'] += doctor_count
+
+    def write(self, rows):
+        users = User.objects.bulk_create([
+            User(
+                username=data['username'], email=data.get('email', ''), password=data['password_hash'],
+                first_name=data.get('first_name', ''), last_name=data.get('last_name', ''),
+            )
+            for _, data in rows
+        ])
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, **{field: data[field] for field in PROFILE_FIELDS if field in data})
+            for user, (_, data) in zip(users, rows)
+        ])
+        Patient.objects.bulk_create([
+            # bulk_create skips Patient.save(), which normalizes the phone number.
+            Patient(user=user, phone=data.get('phone'), phone_normalized=normalize_phone(data.get('phone')))
+            for user, (_, data) in zip(users, rows)
+        ])
+
+        doctor_rows = [(user, data) for user, (_, data) in zip(users, rows) if data['role'] == 'doctor']
+        if doctor_rows:
+            doctors = Doctor.objects.bulk_create([
+                Doctor(user=user, fee=data['fee'], meet_link=data.get('meet_link')) for user, data in doctor_rows
+            ])
+            self.write_doctor_relations(doctors, [data for _, data in doctor_rows])
+            mark_changed(Doctor)
+            invalidate_models(Doctor)
+        for model in (User, UserProfile, Patient):
+            mark_changed(model)
+        return len(doctor_rows)
+
+    def write_doctor_relations(self, doctors, rows):
+        relations = [
+            ('specialisation', Doctor.specialisation.through, 'specialisation_id'),
+            ('designation', Doctor.designation.through, 'designation_id'),
+            ('available_time', Doctor.available_time.through, 'availabletime_id'),
+        ]
+        for field, through, column in relations:
+            through.objects.bulk_create([
+                through(doctor_id=doctor.pk, **{column: pk})
+                for doctor, data in zip(doctors, rows) for pk in dict.fromkeys(data.get(field, []))
+            ])
+        DoctorRating.objects.bulk_create([DoctorRating(doctor=doctor) for doctor in doctors])
+
+        # Weekly schedules parsed from the free-text available times, and their slots.
+        texts = dict(AvailableTime.objects.filter(
+            pk__in={pk for data in rows for pk in data.get('available_time', [])}
+        ).values_list('id', 'time'))
+        schedules = Schedule.objects.bulk_create([
+            Schedule(doctor=doctor, available_time_id=pk, weekday=weekday, start_time=start, end_time=end)
+            for doctor, data in zip(doctors, rows)
+            for pk in dict.fromkeys(data.get('available_time', []))
+            for weekday, start, end in dict.fromkeys(parse_available_time(texts[pk]))
+        ])
+        if schedules:
+            generate_slots(schedules=schedules)
+        index_doctors([doctor.pk for doctor in doctors])
@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from rest_framework import throttling as drf_throttling
+from hospital_management import throttling
+
+BACKENDS = {
+    'shared': 'hospital_management.throttling.SharedMemoryBackend',
+    'cache': 'hospital_management.throttling.CacheBackend',
+}
+
+
+def throttle_class(base, rate):
+    return type(base.__name__, (base,), {'rate': rate})
+
+
+def make_request(user_id):
+    request = RequestFactory().get('/')
+    request.user = SimpleNamespace(is_authenticated=True, pk=user_id)
+    return request
+
+
+def run_requests(throttle, requests, results):
+    request = make_request(1)
+    results.put(sum(throttle().allow_request(request, None) for _ in range(requests)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the cost per request of DRF's cache throttle and of the sliding-window backends, "
+        'and counts how many requests get through when several worker processes share one limit.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='Requests per measurement and per worker')
+        parser.add_argument('--clients', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=1000, help='Requests allowed per client per hour')
+        parser.add_argument('--workers', type=int, default=8)
+
+    def handle(self, *args, **options):
+        self.overhead(options)
+        self.workers(options)
+
+    def using(self, backend):
+        """Settings for a run: a fresh counter file each time, never the running site's."""
+        cache.clear()
+        return override_settings(
+            THROTTLE_BACKEND=backend or throttling.DEFAULT_BACKEND,
+            THROTTLE_FILE=os.path.join(tempfile.mkdtemp(), 'throttle'),
+        )
+
+    def throttles(self, rate):
+        yield 'DRF cache history', throttle_class(drf_throttling.UserRateThrottle, rate), None
+        for name, path in BACKENDS.items():
+            yield f'sliding window, {name}', throttle_class(throttling.UserRateThrottle, rate), path
+
+    def overhead(self, options):
+        rate, requests = f"{options['limit']}/hour", options['requests']
+        requests_by_client = [make_request(i % options['clients']) for i in range(requests)]
+        self.stdout.write(f"Cost per request, {options['clients']} clients, {rate}:")
+        for label, throttle, backend in self.throttles(rate):
+            with self.using(backend):
+                for hot in (False, True):
+                    # A hot client keeps sending after it is rate limited; its history is as long as it gets.
+                    sample = [make_request('hot')] * requests if hot else requests_by_client
+                    started = time.perf_counter()
+                    allowed = sum(throttle().allow_request(request, None) for request in sample)
+                    elapsed = (time.perf_counter() - started) / requests * 1e6
+                    self.stdout.write(
+                        f"  {label:28} {'one client' if hot else 'spread':10} {elapsed:7.1f} us ({allowed} allowed)"
+                    )
+
+    def workers(self, options):
+        count, limit = options['workers'], options['limit']
+        rate = f'{limit}/hour'
+        context = multiprocessing.get_context('fork')
+        self.stdout.write(
+            f"{count} workers sending {options['requests']} requests each as one client, limit {limit}/hour:"
+        )
+        for label, throttle, backend in self.throttles(rate):
+            with self.using(backend):
+                results = context.Queue()
+                processes = [
+                    context.Process(target=run_requests, args=(throttle, options['requests'], results))
+                    for _ in range(count)
+                ]
+                started = time.perf_counter()
+                for process in processes:
+                    process.start()
+                allowed = sum(results.get() for _ in processes)
+                for process in processes:
+                    process.join()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'  {label:28} {allowed:7} allowed (limit {limit}) in {elapsed:.1f}s')
+        # Only a cache every worker talks to (Redis, Memcached) makes the cache backend share limits.
+        self.stdout.write(f'The cache backend used {type(throttling.CacheBackend().cache).__name__}.')
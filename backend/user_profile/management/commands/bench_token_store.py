@@ -0,0 +1,88 @@
+import random
+import time
+import uuid
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from hospital_management.token_store import BlacklistFilter, purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares blacklist checks against the database and through the per-worker filter, '
+        'and measures purging expired tokens. Runs in a transaction that is rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=10_000_000, help='Outstanding tokens to seed')
+        parser.add_argument('--blacklisted', type=float, default=0.05, help='Share of tokens that are blacklisted')
+        parser.add_argument('--expired', type=float, default=0.5, help='Share of tokens that have expired')
+        parser.add_argument('--checks', type=int, default=20000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            blacklisted, clean = self.seed(rng, options)
+            checks = options['checks']
+            unknown = [uuid.UUID(int=rng.getrandbits(128)).hex for _ in range(checks)]
+
+            db_check = lambda jti: BlacklistedToken.objects.filter(token__jti=jti).exists()
+            self.report('database, not blacklisted', db_check, rng.sample(clean, min(checks, len(clean))))
+            self.report('database, blacklisted', db_check, rng.sample(blacklisted, min(checks, len(blacklisted))))
+
+            blacklist_filter = BlacklistFilter()
+            started = time.perf_counter()
+            blacklist_filter.refresh()
+            self.stdout.write(
+                f'Built the filter of {len(blacklisted)} jtis in {time.perf_counter() - started:.1f}s '
+                f'({len(blacklist_filter.bloom.bits) / 2 ** 20:.1f} MiB)'
+            )
+            self.report('filter, not blacklisted', blacklist_filter.is_blacklisted, rng.sample(clean, min(checks, len(clean))))
+            self.report('filter, never issued', blacklist_filter.is_blacklisted, unknown)
+            self.report('filter, blacklisted', blacklist_filter.is_blacklisted, rng.sample(blacklisted, min(checks, len(blacklisted))))
+            stats = blacklist_filter.stats
+            self.stdout.write(f"Filter answered {stats['filtered']} checks alone and queried {stats['queried']}")
+
+            started = time.perf_counter()
+            deleted = sum(purge_expired_tokens(batch_size=options['batch_size']))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'Purged {deleted} expired tokens in {elapsed:.1f}s ({deleted / elapsed if elapsed else 0:,.0f} rows/s)')
+            transaction.set_rollback(True)
+
+    def seed(self, rng, options):
+        now = timezone.now()
+        started = time.perf_counter()
+        blacklisted, clean = [], []
+        chunk = 10000
+        for start in range(0, options['tokens'], chunk):
+            tokens = []
+            for _ in range(start, min(start + chunk, options['tokens'])):
+                expired = rng.random() < options['expired']
+                tokens.append(OutstandingToken(
+                    jti=uuid.UUID(int=rng.getrandbits(128)).hex, token='-', created_at=now,
+                    expires_at=now + timedelta(days=-1 if expired else 30),
+                ))
+            tokens = OutstandingToken.objects.bulk_create(tokens)
+            revoked, kept = [], []
+            for token in tokens:
+                (revoked if rng.random() < options['blacklisted'] else kept).append(token)
+            BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in revoked])
+            blacklisted += [token.jti for token in revoked]
+            # Keep a sample of the rest to check against.
+            clean += [token.jti for token in kept[:100]]
+        self.stdout.write(
+            f"Seeded {options['tokens']} tokens, {len(blacklisted)} blacklisted, "
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+        return blacklisted, clean
+
+    def report(self, label, check, jtis):
+        started = time.perf_counter()
+        for jti in jtis:
+            check(jti)
+        elapsed = (time.perf_counter() - started) / max(len(jtis), 1) * 1e6
+        self.stdout.write(f'{label:28} {elapsed:8.1f} us per check')
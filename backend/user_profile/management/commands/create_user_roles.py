@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from user_profile.models import UserProfile
+from doctor.models import Doctor
 from django.db import transaction
 
 class Command(BaseCommand):
@@ -86,14 +86,13 @@ class Command(BaseCommand):
                     skipped_count += 1
                     continue
 
-                # Create user
+                # Create user; the profile and patient are created by user_profile.signals
                 user = User.objects.create_user(**user_data)
-                
-                # Create or update profile
-                UserProfile.objects.update_or_create(
-                    user=user,
-                    defaults={'role': role}
-                )
+
+                # There is no role field: staff roles are the is_staff / is_superuser
+                # flags above and a doctor is a user with a Doctor record
+                if role == 'doctor':
+                    Doctor.objects.create(user=user, fee=500)
                 
                 created_count += 1
                 self.stdout.write(self.style.SUCCESS(f'Created user: {username} with role: {role}'))
@@ -0,0 +1,81 @@
+import os
+import time
+from django.core.management.base import BaseCommand
+from hospital_management import images, storage
+
+
+class Command(BaseCommand):
+    help = (
+        'Finds the uploaded images no doctor, patient, service or user profile refers to any more, '
+        'with their renditions. Lists them, or deletes them with --delete.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='Delete them instead of listing them')
+        parser.add_argument(
+            '--min-age', type=float, default=24,
+            help='Hours a file is kept anyway; the row of an upload may not be saved yet (default 24)',
+        )
+
+    def handle(self, *args, **options):
+        media = storage.blob_storage()
+        cutoff = time.time() - options['min_age'] * 3600
+        # Files first: a blob uploaded after the references are read is then too young to go.
+        candidates = [name for name in self.files(media) if self.older(media, name, cutoff)]
+        referenced = self.referenced()
+        unreferenced = [name for name in candidates if name not in referenced]
+
+        deleted = size = 0
+        for name in unreferenced:
+            if options['verbosity'] >= 2 or not options['delete']:
+                self.stdout.write(name)
+            size += media.size(name)
+            # Uploading the same bytes again touches the blob; don't take it from under that upload.
+            if options['delete'] and self.older(media, name, cutoff):
+                media.delete(name)
+                self.delete_renditions(media, name)
+                deleted += 1
+
+        verb = 'Deleted' if options['delete'] else 'Found'
+        self.stdout.write(
+            f'{verb} {deleted if options["delete"] else len(unreferenced)} unreferenced files '
+            f'({size / 1024 / 1024:,.1f} MB) of {len(candidates)} old enough to collect.'
+        )
+
+    def files(self, media):
+        """Every blob and every file left in the upload directories used before blobs."""
+        directories = [storage.PREFIX]
+        directories += [
+            model._meta.get_field(field_name).upload_to for model, field_name in images.image_fields
+        ]
+        for directory in dict.fromkeys(d.strip('/') for d in directories if isinstance(d, str)):
+            root = media.path(directory)
+            for path, _, names in os.walk(root):
+                for name in names:
+                    yield os.path.relpath(os.path.join(path, name), media.location).replace(os.sep, '/')
+
+    def older(self, media, name, cutoff):
+        try:
+            return os.path.getmtime(media.path(name)) < cutoff
+        except FileNotFoundError:
+            return False
+
+    def referenced(self):
+        names = set()
+        for model, field_name in images.image_fields:
+            names.update(
+                model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True).iterator()
+            )
+        return names
+
+    def delete_renditions(self, media, name):
+        directory = os.path.dirname(images.rendition_name(name, 0, ''))
+        if not media.exists(directory):
+            return
+        for file in media.listdir(directory)[1]:
+            media.delete(f'{directory}/{file}')
+        try:
+            os.rmdir(media.path(directory))
+        except OSError:
+            pass
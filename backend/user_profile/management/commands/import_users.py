@@ -0,0 +1,42 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from user_profile.importing import BATCH_SIZE, IMPORT_FORMATS, UserImport, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates users, patients and doctors from a CSV or NDJSON file. '
+        'Rows that fail are reported with their line number and skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Default: from the file extension')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--workers', type=int, help='Password hashing processes (default: one per CPU)')
+        parser.add_argument('--report', help='Write the failed rows to this file, one JSON object per line')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or guess_format(options['path'])
+        if file_format not in IMPORT_FORMATS:
+            raise CommandError(f"Can't tell the format of {options['path']}; pass --format.")
+
+        started = time.perf_counter()
+        with open(options['path'], 'rb') as file:
+            report = UserImport(batch_size=options['batch_size'], workers=options['workers']).run(read_rows(file, file_format))
+        elapsed = time.perf_counter() - started
+
+        if options['report']:
+            with open(options['report'], 'w') as report_file:
+                for error in report['errors']:
+                    report_file.write(json.dumps(error) + '\n')
+        else:
+            for error in report['errors'][:20]:
+                self.stdout.write(self.style.WARNING(f"Line {error['line']}: {json.dumps(error['errors'])}"))
+            if len(report['errors']) > 20:
+                self.stdout.write(self.style.WARNING(f"... and {len(report['errors']) - 20} more; use --report to see them all."))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']} of {report['rows']} rows ({report['doctors']} doctors) "
+            f"in {elapsed:.1f}s; {report['failed']} failed."
+        ))
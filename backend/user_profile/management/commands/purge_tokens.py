@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from hospital_management.token_store import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes expired refresh tokens from the outstanding and blacklisted token tables '
+        'in small batches. Safe to run from cron while the site is up.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Tokens deleted per batch')
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to wait between batches')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = batches = 0
+        for deleted in purge_expired_tokens(batch_size=options['batch_size']):
+            total += deleted
+            batches += 1
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {total} expired tokens in {batches} batches, '
+            f'{elapsed:.2f}s ({total / elapsed if elapsed else 0:,.0f} rows/s)'
+        ))
@@ -0,0 +1,60 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.core.management.base import BaseCommand
+from PIL import Image, UnidentifiedImageError
+from hospital_management import images, response_cache
+from hospital_management.table_versions import mark_changed
+
+
+def _setup_worker():
+    # Spawned workers (macOS, Windows) start without Django configured.
+    django.setup()
+
+
+def render_one(name, force):
+    """(written, error) for one image; runs in a worker process."""
+    try:
+        return images.render(name, force=force), None
+    except (OSError, UnidentifiedImageError, ValueError, Image.DecompressionBombError) as e:
+        return 0, f'{name}: {e}'
+
+
+class Command(BaseCommand):
+    help = 'Renders the missing renditions of every uploaded image, in parallel across processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--force', action='store_true', help='Render images that already have renditions again')
+
+    def handle(self, *args, **options):
+        names = []
+        for model, field_name in images.image_fields:
+            names += [
+                name for name in model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True).iterator()
+            ]
+        names = list(dict.fromkeys(names))
+        started = time.perf_counter()
+        rendered = written = 0
+        force = [options['force']] * len(names)
+        chunksize = max(1, len(names) // (options['workers'] * 4))
+        with ProcessPoolExecutor(options['workers'], initializer=_setup_worker) as pool:
+            for count, error in pool.map(render_one, names, force, chunksize=chunksize):
+                if error:
+                    self.stderr.write(error)
+                elif count:
+                    rendered += 1
+                    written += count
+
+        if rendered:
+            # Responses cached before still show no renditions.
+            for model, _ in images.image_fields:
+                mark_changed(model)
+                response_cache.invalidate_models(model)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Rendered {rendered} of {len(names)} images ({written} files) in {elapsed:.1f}s '
+            f'({rendered / elapsed if elapsed else 0:,.1f} images/s)'
+        )
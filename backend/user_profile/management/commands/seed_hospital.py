@@ -0,0 +1,47 @@
+from datetime import date
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from hospital_management.constant import SLOT_HORIZON_DAYS
+from hospital_management.seeding import Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills the database with synthetic users, doctors, appointments and reviews for benchmarks, '
+        'e.g. --users 1000000 --doctors 50000 --appointments 5000000 --reviews 2000000'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--doctors', type=int, default=50, help='Taken from the seeded users')
+        parser.add_argument('--appointments', type=int, default=5000)
+        parser.add_argument('--reviews', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42, help='Same seed and volumes, same data')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows written per bulk INSERT')
+        parser.add_argument('--prefix', default='seed', help='Usernames are <prefix>_user_<n>')
+        parser.add_argument('--password', default='password123', help='Password of every seeded user')
+        parser.add_argument('--today', type=date.fromisoformat, help='Date appointments are spread around (default: today)')
+        parser.add_argument(
+            '--slot-days', type=int, default=SLOT_HORIZON_DAYS,
+            help='Days of slots generated from each doctor\'s schedules, starting at --today',
+        )
+
+    def handle(self, *args, **options):
+        if options['doctors'] > options['users']:
+            raise CommandError('--doctors can not be more than --users.')
+        if not options['doctors'] and (options['appointments'] or options['reviews']):
+            raise CommandError('Appointments and reviews need at least one doctor.')
+        if User.objects.filter(username__startswith=f"{options['prefix']}_user_").exists():
+            raise CommandError(f"Users with the prefix {options['prefix']!r} already exist; pick another --prefix.")
+
+        seeder = Seeder(
+            seed=options['seed'], prefix=options['prefix'], password=options['password'],
+            chunk_size=options['chunk_size'], today=options['today'], log=self.stdout.write,
+            slot_days=options['slot_days'],
+        )
+        seeder.users(options['users'])
+        seeder.doctors(options['doctors'])
+        seeder.appointments(options['appointments'])
+        seeder.reviews(options['reviews'])
+        seeder.finish()
+        self.stdout.write(self.style.SUCCESS('Done.'))
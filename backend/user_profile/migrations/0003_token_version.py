@@ -0,0 +1,18 @@
+# Generated by Django 5.1.11 on 2026-10-18 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_profile', '0002_remove_userprofile_role'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='token_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from hospital_management.storage import blob_storage
 
 class UserProfile(models.Model):
     
@@ -7,7 +8,10 @@ class UserProfile(models.Model):
     bio = models.TextField(blank=True, null=True)
     address = models.CharField(max_length=255, blank=True, null=True)
     date_of_birth = models.DateField(blank=True, null=True)
-    profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
+    profile_picture = models.ImageField(upload_to='profile_pictures/', storage=blob_storage, blank=True, null=True)
+    # Bumped when the user's role or patient/doctor record changes; tokens
+    # carrying an older version are refused (see hospital_management.tokens).
+    token_version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -1,7 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.contrib.auth.hashers import identify_hasher
 from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework.exceptions import ValidationError
+from hospital_management.images import RenditionsField
 from .models import UserProfile
 
 class UserSerializer(serializers.ModelSerializer):
@@ -16,11 +20,12 @@ class UserProfileSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(write_only=True, required=False)
     first_name = serializers.CharField(write_only=True, required=False)
     last_name = serializers.CharField(write_only=True, required=False)
+    profile_picture_renditions = RenditionsField(source='profile_picture')
     
     class Meta:
         model = UserProfile
         fields = ['id', 'user', 'username', 'email', 'first_name', 'last_name', 'bio', 'address', 
-                 'date_of_birth', 'profile_picture', 'created_at', 'updated_at']
+                 'date_of_birth', 'profile_picture', 'profile_picture_renditions', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def update(self, instance, validated_data):
@@ -90,4 +95,68 @@ class LoginSerializer(serializers.Serializer):
     password = serializers.CharField(style={'input_type': 'password'})
 
 class LogoutSerializer(serializers.Serializer):
-    refresh_token = serializers.CharField(max_length=250)
\ No newline at end of file
+    refresh_token = serializers.CharField(max_length=250)
+
+
+class SeparatedListField(serializers.ListField):
+    """A list, or in a CSV cell a string of values separated by ";"."""
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [value.strip() for value in data.split(';') if value.strip()]
+        return super().to_internal_value(data)
+
+
+class UserImportSerializer(serializers.Serializer):
+    """
+    One row of a user import (see user_profile.importing). Specialisations
+    and designations are given by slug and available times by their text;
+    they are looked up in context['lookups'] instead of one query per row.
+    """
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    email = serializers.EmailField(required=False, allow_blank=True)
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    # A plain password is hashed by the importer; an already hashed one (from
+    # another Django install) is stored as is. Without either the user can't
+    # log in until they reset their password.
+    password = serializers.CharField(required=False, write_only=True)
+    password_hash = serializers.CharField(max_length=128, required=False, write_only=True)
+    role = serializers.ChoiceField(choices=['patient', 'doctor'], default='patient')
+    phone = serializers.CharField(max_length=12, required=False)
+    bio = serializers.CharField(required=False, allow_blank=True)
+    address = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    date_of_birth = serializers.DateField(required=False)
+    fee = serializers.IntegerField(min_value=0, required=False)
+    meet_link = serializers.CharField(max_length=250, required=False, allow_blank=True)
+    specialisation = SeparatedListField(child=serializers.CharField(), required=False)
+    designation = SeparatedListField(child=serializers.CharField(), required=False)
+    available_time = SeparatedListField(child=serializers.CharField(), required=False)
+
+    def lookup(self, attrs, field):
+        known = self.context['lookups'][field]
+        unknown = [value for value in attrs.get(field, []) if value not in known]
+        if unknown:
+            raise serializers.ValidationError({field: [f'Unknown: {", ".join(unknown)}.']})
+        attrs[field] = [known[value] for value in attrs.get(field, [])]
+
+    def validate(self, attrs):
+        if attrs.get('password') and attrs.get('password_hash'):
+            raise serializers.ValidationError('Give either password or password_hash, not both.')
+        if attrs.get('password'):
+            user = User(**{field: attrs.get(field, '') for field in ('username', 'email', 'first_name', 'last_name')})
+            try:
+                validate_password(attrs['password'], user)
+            except DjangoValidationError as e:
+                raise serializers.ValidationError({'password': list(e.messages)})
+        if attrs.get('password_hash'):
+            try:
+                identify_hasher(attrs['password_hash'])
+            except ValueError:
+                raise serializers.ValidationError({'password_hash': ['Not a hash this site can check.']})
+
+        if attrs['role'] == 'doctor':
+            if attrs.get('fee') is None:
+                raise serializers.ValidationError({'fee': ['Doctors need a fee.']})
+            for field in ('specialisation', 'designation', 'available_time'):
+                self.lookup(attrs, field)
+        return attrs
@@ -1,8 +1,16 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from .models import UserProfile
 from patient.models import Patient
+from doctor.models import Doctor
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from hospital_management.images import track_images
+from hospital_management.table_versions import mark_changed, track_models
+from hospital_management.tokens import bump_token_version
+
+track_models(User, UserProfile)
+track_images(UserProfile, 'profile_picture')
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -13,4 +21,48 @@ def create_user_profile(sender, instance, created, **kwargs):
         
         # Create a patient instance for the user if they don't already have one
         if not hasattr(instance, 'patient'):
-            Patient.objects.create(user=instance)
\ No newline at end of file
+            Patient.objects.create(user=instance)
+
+
+# Token versions -------------------------------------------------------------
+
+ROLE_FIELDS = ('is_staff', 'is_superuser')
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_role(sender, instance, **kwargs):
+    """Keep the stored staff flags so a role change can be spotted after saving"""
+    instance._previous_role = None
+    if instance.pk:
+        instance._previous_role = User.objects.filter(pk=instance.pk).values_list(*ROLE_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_role_change(sender, instance, created, **kwargs):
+    previous = instance._previous_role
+    if not created and previous and previous != tuple(getattr(instance, field) for field in ROLE_FIELDS):
+        bump_token_version(instance.pk)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_save, sender=Patient)
+def revoke_tokens_on_new_record(sender, instance, created, **kwargs):
+    """A new doctor or patient record changes the user's role or ids"""
+    if created:
+        bump_token_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Doctor)
+@receiver(post_delete, sender=Patient)
+def revoke_tokens_on_deleted_record(sender, instance, **kwargs):
+    bump_token_version(instance.user_id)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def blacklist_changed(sender, **kwargs):
+    """
+    Tell every worker's blacklist filter to load the new row. Deletes
+    (expired tokens being purged) aren't tracked: a stale filter entry only
+    costs a query, and listening to deletes would stop them being done in bulk.
+    """
+    mark_changed(BlacklistedToken)
@@ -0,0 +1,34 @@
+from datetime import timedelta
+from urllib.parse import urljoin
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.html import strip_tags
+from django.utils.http import urlsafe_base64_encode
+from hospital_management.token_store import purge_expired_tokens
+from task_queue.queue import task
+
+
+@task(max_attempts=8, backoff=60)
+def send_verification_email(user_id, site):
+    """Mail the user a link to VerityEmailAPIView; `site` is the root URL the user registered on."""
+    user = User.objects.filter(pk=user_id).first()
+    if user is None or not user.email:
+        return
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    # Made when the mail goes out, so the token is never stored in the queue.
+    token = default_token_generator.make_token(user)
+    link = urljoin(site, reverse('verify-email', args=[uid, token]))
+    message = render_to_string('patient/verification_mail.html', {'user': user, 'verification_link': link})
+    send_mail('Verify your email', strip_tags(message), settings.DEFAULT_FROM_EMAIL, [user.email], html_message=message)
+
+
+@task(every=timedelta(days=1))
+def purge_tokens():
+    """What `purge_tokens` does with its defaults, once a day."""
+    for _ in purge_expired_tokens():
+        pass
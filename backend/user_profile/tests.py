@@ -1,6 +1,37 @@
-from django.test import TestCase
+import io
+import multiprocessing
+import os
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+from hospital_management import authentication, token_store
+from hospital_management.authentication import CachedJWTAuthentication
+from hospital_management.permissions import IsDoctorUser, IsPatientUser, IsStaffUser
+from hospital_management.throttling import BUCKET_RECORDS, CacheBackend, SharedMemoryBackend, UserRateThrottle
+from hospital_management.token_store import BloomFilter, blacklist_filter
+from hospital_management.tokens import RefreshToken
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Sum
+from appointment.models import Appointment, AppointmentDayCount
+from doctor.models import AvailableTime, Designation, Doctor, DoctorRating, Specialisation
+from patient.models import Patient
+from user_profile.importing import UserImport, read_rows
 from user_profile.models import UserProfile
+from user_profile.views import get_tokens_for_user
 
 class UserProfileModelTest(TestCase):
     def setUp(self):
@@ -52,3 +83,320 @@ class UserProfileSignalTest(TestCase):
         # Check that a profile was automatically created
         self.assertTrue(hasattr(user, 'profile'))
         self.assertEqual(user.profile.role, 'patient')  # Default role
+
+
+class SeedHospitalTest(TestCase):
+    def seed(self, prefix):
+        call_command(
+            'seed_hospital', users=40, doctors=5, appointments=60, reviews=30, chunk_size=16,
+            prefix=prefix, today=date(2025, 1, 15), stdout=StringIO(),
+        )
+
+    def test_seeded_rows_match_what_the_signals_would_have_made(self):
+        """Every user gets a profile and a patient; ratings and counters are rebuilt"""
+        self.seed('seed')
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(UserProfile.objects.count(), 40)
+        self.assertEqual(Patient.objects.count(), 40)
+        self.assertEqual(Doctor.objects.count(), 5)
+        self.assertEqual(Appointment.objects.count(), 60)
+        self.assertEqual(AppointmentDayCount.objects.aggregate(total=Sum('count'))['total'], 60)
+        self.assertEqual(DoctorRating.objects.aggregate(total=Sum('review_count'))['total'], 30)
+        self.assertTrue(User.objects.get(username='seed_user_0').check_password('password123'))
+        for doctor in Doctor.objects.all():
+            self.assertTrue(doctor.schedules.exists())
+            self.assertTrue(doctor.slots.filter(start__date__gte=date(2025, 1, 15)).exists())
+
+    def test_same_seed_same_data(self):
+        self.seed('first')
+        self.seed('second')
+        fields = ('doctor__user__last_name', 'patient__user__last_name', 'date', 'appointment_status', 'cancel', 'time', 'symptoms')
+        first, second = (
+            list(Appointment.objects.filter(patient__user__username__startswith=prefix).order_by('id').values_list(*fields))
+            for prefix in ('first_', 'second_')
+        )
+        self.assertEqual(first, second)
+
+    def test_existing_prefix_is_refused(self):
+        self.seed('seed')
+        with self.assertRaises(CommandError):
+            self.seed('seed')
+
+
+IMPORT_CSV = """username,email,first_name,last_name,password,role,phone,fee,specialisation,designation,available_time
+alice,alice@example.com,Alice,Khan,Plenty-of-entropy-1,,01711111111,,,,
+bob,not-an-email,Bob,Das,,,,,,,
+carol,carol@example.com,Carol,Roy,,doctor,01722222222,800,cardiology;neurology,consultant,Sat-Thu 9:00 AM - 12:00 PM
+alice,alice2@example.com,Alice,Again,,,,,,,
+dave,dave@example.com,Dave,Ali,,doctor,,,cardiology,,
+erin,erin@example.com,Erin,Saha,,doctor,,500,surgery,,
+frank,frank@example.com,Frank,Miah,12345,,,,,,
+grace,grace@example.com,Grace,Ahmed,,,01711111111,,,,
+"""
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportUsersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Specialisation.objects.create(name='Cardiology', slug='cardiology')
+        Specialisation.objects.create(name='Neurology', slug='neurology')
+        Designation.objects.create(name='Consultant', slug='consultant')
+        AvailableTime.objects.create(time='Sat-Thu 9:00 AM - 12:00 PM')
+
+    def run_import(self, text, **kwargs):
+        return UserImport(workers=1, **kwargs).run(read_rows(io.BytesIO(text.encode()), 'csv'))
+
+    def test_valid_rows_are_imported_and_bad_rows_reported(self):
+        report = self.run_import(IMPORT_CSV, batch_size=3)
+        self.assertEqual((report['rows'], report['created'], report['doctors'], report['failed']), (8, 2, 1, 6))
+        self.assertEqual(
+            [(error['line'], error['username'], sorted(error['errors'])) for error in report['errors']],
+            [(3, 'bob', ['email']), (5, 'alice', ['username']), (6, 'dave', ['fee']),
+             (7, 'erin', ['specialisation']), (8, 'frank', ['password']), (9, 'grace', ['phone'])],
+        )
+
+        alice = User.objects.get(username='alice')
+        self.assertTrue(alice.check_password('Plenty-of-entropy-1'))
+        self.assertEqual(alice.patient.phone, '01711111111')
+        self.assertTrue(UserProfile.objects.filter(user=alice).exists())
+
+        carol = User.objects.get(username='carol')
+        self.assertFalse(carol.has_usable_password())
+        self.assertEqual(sorted(carol.doctor.specialisation.values_list('slug', flat=True)), ['cardiology', 'neurology'])
+        self.assertEqual(carol.doctor.designation.get().slug, 'consultant')
+        self.assertTrue(DoctorRating.objects.filter(doctor=carol.doctor).exists())
+        self.assertTrue(carol.doctor.schedules.exists())
+        self.assertEqual(carol.doctor.search_document.body.count('Cardiology'), 1)
+
+    def test_passwords_are_hashed_in_worker_processes(self):
+        rows = ''.join(f'user{i},,,,Plenty-of-entropy-{i},,,,,,\n' for i in range(6))
+        report = UserImport(workers=2, batch_size=4).run(read_rows(io.BytesIO((IMPORT_CSV.splitlines()[0] + '\n' + rows).encode()), 'csv'))
+        self.assertEqual(report['created'], 6)
+        self.assertTrue(User.objects.get(username='user5').check_password('Plenty-of-entropy-5'))
+
+    def test_import_endpoint(self):
+        admin = User.objects.create_superuser(username='import_admin', password='-')
+        client = APIClient()
+        client.force_authenticate(admin)
+        upload = SimpleUploadedFile('users.jsonl', b'{"username": "henry", "first_name": "Henry"}\nnot json\n')
+        with self.settings(IMPORT_HASH_WORKERS=1):
+            response = client.post(reverse('user-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+        self.assertEqual(response.data['errors'][0]['line'], 2)
+        self.assertTrue(User.objects.filter(username='henry', first_name='Henry').exists())
+
+        client.force_authenticate(User.objects.get(username='henry'))
+        response = client.post(reverse('user-import'), {'file': SimpleUploadedFile('users.csv', b'username\nivy\n')}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(TABLE_VERSION_DIR=tempfile.mkdtemp())
+class CachedJWTAuthenticationTest(TransactionTestCase):
+    def setUp(self):
+        authentication.clear()
+        self.user = User.objects.create_user(username='cached', password='-')
+        self.header = f"Bearer {get_tokens_for_user(self.user)['access']}"
+
+    def authenticate(self):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=self.header)
+        with CaptureQueriesContext(connection) as ctx:
+            user, _ = CachedJWTAuthentication().authenticate(request)
+            user.patient, user.profile, hasattr(user, 'doctor')
+        return user, len(ctx.captured_queries)
+
+    def test_repeat_requests_make_no_auth_queries(self):
+        user, queries = self.authenticate()
+        self.assertEqual((user.pk, queries), (self.user.pk, 1))
+        user, queries = self.authenticate()
+        self.assertEqual((user.pk, queries), (self.user.pk, 0))
+        self.assertFalse(hasattr(user, 'doctor'))
+        self.assertEqual(authentication.get_stats()['hits'], 1)
+
+        # Changes to the user's rows are picked up on the next request.
+        self.user.first_name = 'Cached'
+        self.user.save()
+        user, queries = self.authenticate()
+        self.assertEqual((user.first_name, queries), ('Cached', 1))
+
+    def test_deactivated_user_is_rejected(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_expired_entries_are_reloaded(self):
+        self.authenticate()
+        # Another server's change: no version this worker can see moves.
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.authenticate()[1], 0)
+        with override_settings(AUTH_USER_CACHE_SECONDS=0):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate()
+
+
+@override_settings(TABLE_VERSION_DIR=tempfile.mkdtemp())
+class RoleClaimsTest(TransactionTestCase):
+    def setUp(self):
+        authentication.clear()
+        self.user = User.objects.create_user(username='claims', password='-')
+
+    def request(self, tokens):
+        request = Request(RequestFactory().get('/', HTTP_AUTHORIZATION=f"Bearer {tokens['access']}"))
+        request.authenticators = [CachedJWTAuthentication()]
+        request.user
+        return request
+
+    def test_tokens_carry_role_and_ids(self):
+        access = AccessToken(get_tokens_for_user(self.user)['access'])
+        self.assertEqual(
+            (access['role'], access['patient_id'], access['doctor_id']), ('patient', self.user.patient.pk, None),
+        )
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(AccessToken(get_tokens_for_user(self.user)['access'])['role'], 'staff')
+
+    def test_permissions_are_checked_without_queries(self):
+        request = self.request(get_tokens_for_user(self.user))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(IsPatientUser().has_permission(request, None))
+            self.assertFalse(IsDoctorUser().has_permission(request, None))
+            self.assertFalse(IsStaffUser().has_permission(request, None))
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_role_change_revokes_earlier_tokens(self):
+        tokens = get_tokens_for_user(self.user)
+        Doctor.objects.create(user=self.user, fee=500)
+        with self.assertRaises(AuthenticationFailed):
+            self.request(tokens)
+        response = APIClient().post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        tokens = get_tokens_for_user(self.user)
+        self.assertTrue(IsDoctorUser().has_permission(self.request(tokens), None))
+        response = APIClient().post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(AccessToken(response.data['access'])['role'], 'doctor')
+
+
+class BloomFilterTest(SimpleTestCase):
+    def test_no_false_negatives_and_few_false_positives(self):
+        bloom = BloomFilter(1000)
+        added = [f'jti-{i}' for i in range(1000)]
+        for jti in added:
+            bloom.add(jti)
+        self.assertTrue(all(jti in bloom for jti in added))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+        self.assertFalse(bloom.full)
+
+
+@override_settings(TABLE_VERSION_DIR=tempfile.mkdtemp())
+class TokenStoreTest(TransactionTestCase):
+    def setUp(self):
+        authentication.clear()
+        blacklist_filter.reset()
+        self.user = User.objects.create_user(username='tokens', password='-')
+
+    def test_blacklisted_tokens_are_refused_and_others_pass_without_a_query(self):
+        kept, revoked = get_tokens_for_user(self.user), get_tokens_for_user(self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {revoked['access']}")
+        response = client.post(reverse('logout'), {'refresh': revoked['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_205_RESET_CONTENT)
+
+        response = client.post(reverse('token_refresh'), {'refresh': revoked['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = client.post(reverse('token_refresh'), {'refresh': kept['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        jti = RefreshToken(kept['refresh'])['jti']
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertFalse(blacklist_filter.is_blacklisted(jti))
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_tokens_blacklisted_on_other_nodes_are_seen_within_seconds(self):
+        jti = RefreshToken(get_tokens_for_user(self.user)['refresh'])['jti']
+        self.assertFalse(blacklist_filter.is_blacklisted(jti))
+        # bulk_create sends no signals, so no version this worker can see moves.
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=OutstandingToken.objects.get(jti=jti))])
+        self.assertFalse(blacklist_filter.is_blacklisted(jti))
+        blacklist_filter.synced_at -= token_store.SYNC_SECONDS
+        self.assertTrue(blacklist_filter.is_blacklisted(jti))
+
+    def test_purge_deletes_expired_tokens_only(self):
+        now = timezone.now()
+        expired = [
+            OutstandingToken.objects.create(jti=f'old-{i}', token='-', expires_at=now - timedelta(hours=1)) for i in range(5)
+        ]
+        live = OutstandingToken.objects.create(jti='live', token='-', expires_at=now + timedelta(days=1))
+        BlacklistedToken.objects.create(token=expired[0])
+        BlacklistedToken.objects.create(token=live)
+
+        call_command('purge_tokens', batch_size=2, stdout=StringIO())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), ['live'])
+        self.assertEqual(BlacklistedToken.objects.get().token, live)
+
+
+def _hit_shared_store(path, attempts, results):
+    backend = SharedMemoryBackend(path)
+    results.put(sum(backend.hit('throttle_user_1', 15, 60, 30.0)[0] for _ in range(attempts)))
+
+
+class ThrottleTest(SimpleTestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'throttle')
+
+    def test_limit_and_sliding_window(self):
+        backend = SharedMemoryBackend(self.path)
+        self.assertEqual([backend.hit('a', 3, 60, 10.0)[0] for _ in range(4)], [True, True, True, False])
+        self.assertTrue(backend.hit('b', 3, 60, 10.0)[0])
+        # Half way through the next window half of the previous three still count.
+        self.assertTrue(backend.hit('a', 3, 60, 90.0)[0])
+        allowed, wait = backend.hit('a', 3, 60, 90.0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 10.0)
+        self.assertTrue(backend.hit('a', 3, 60, 100.0)[0])
+        self.assertTrue(backend.hit('a', 3, 60, 300.0)[0])
+
+    def test_shared_between_instances_and_processes(self):
+        SharedMemoryBackend(self.path).hit('throttle_user_1', 15, 60, 30.0)
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [context.Process(target=_hit_shared_store, args=(self.path, 10, results)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        allowed = sum(results.get(timeout=30) for _ in workers)
+        for worker in workers:
+            worker.join()
+        self.assertEqual(allowed, 14)
+
+    def test_full_bucket_reuses_oldest_record(self):
+        backend = SharedMemoryBackend(self.path, buckets=1)
+        for i in range(BUCKET_RECORDS + 1):
+            backend.hit(str(i), 1, 60, 60.0 * i)
+        # '0' was forgotten to make room, '8' wasn't.
+        self.assertTrue(backend.hit('0', 1, 60, 60.0 * BUCKET_RECORDS)[0])
+        self.assertFalse(backend.hit(str(BUCKET_RECORDS), 1, 60, 60.0 * BUCKET_RECORDS)[0])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'throttle-test'}})
+    def test_cache_backend(self):
+        backend = CacheBackend()
+        self.assertEqual([backend.hit('a', 2, 60, 10.0)[0] for _ in range(3)], [True, True, False])
+        # The refused request wasn't counted.
+        self.assertEqual(backend.cache.get('a:0'), 2)
+        self.assertFalse(backend.hit('a', 2, 60, 70.0)[0])
+        self.assertTrue(backend.hit('a', 2, 60, 100.0)[0])
+
+    def test_throttle_class(self):
+        with override_settings(THROTTLE_FILE=self.path):
+            throttle = type('TwoPerMinute', (UserRateThrottle,), {'rate': '2/min'})
+            request = RequestFactory().get('/')
+            request.user = User(pk=7)
+            self.assertEqual([throttle().allow_request(request, None) for _ in range(3)], [True, True, False])
+            denied = throttle()
+            self.assertFalse(denied.allow_request(request, None))
+            self.assertGreater(denied.wait(), 0)
+            request.user = User(pk=8)
+            self.assertTrue(throttle().allow_request(request, None))
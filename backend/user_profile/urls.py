@@ -8,7 +8,10 @@ router.register('profiles', views.UserProfileViewSet)
 
 urlpatterns = [
     path('users/', views.UserListView.as_view(), name='user-list'),
+    path('users/export/', views.UserExportView.as_view(), name='user-export'),
+    path('users/import/', views.UserImportView.as_view(), name='user-import'),
     path('register/', views.RegistrationAPIView.as_view(), name='register'),
+    path('verify/<str:uid>/<str:token>/', views.VerityEmailAPIView.as_view(), name='verify-email'),
     path('login/', views.LoginAPIView.as_view(), name='login'),
     path('logout/', views.LogoutAPIView.as_view(), name='logout'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
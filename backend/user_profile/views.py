@@ -3,28 +3,27 @@ from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, smart_str
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
+from django.db import transaction
 from rest_framework import viewsets, permissions, status, generics, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.throttling import UserRateThrottle, ScopedRateThrottle
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from hospital_management.throttling import UserRateThrottle, ScopedRateThrottle
 from patient.models import Patient
+from hospital_management.streaming import StreamingExportMixin
 
+from .importing import IMPORT_FORMATS, UserImport, guess_format, read_rows
 from .models import UserProfile
+from .tasks import send_verification_email
 from .serializers import UserProfileSerializer, UserListSerializer, RegistrationSerializer, LoginSerializer, LogoutSerializer, UserSerializer
 
-# Utility function for generating tokens
-def get_tokens_for_user(user):
-    refresh = RefreshToken.for_user(user)
-    return {
-        'refresh': str(refresh),
-        'access': str(refresh.access_token),
-    }
-from hospital_management.paginations import StandardResultsSetPagination
+from hospital_management.tokens import RefreshToken, get_tokens_for_user
+from hospital_management.paginations import StandardResultsSetPagination, KeysetOrPageNumberPagination
 from hospital_management.permissions import IsOwnerOrReadOnly
 
 class IsOwnerOrAdmin(permissions.BasePermission):
@@ -49,9 +48,10 @@ class UserProfileViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         # Admin can see all profiles, users can only see their own
+        queryset = UserProfile.objects.select_related('user')
         if self.request.user.is_staff:
-            return UserProfile.objects.all()
-        return UserProfile.objects.filter(user=self.request.user)
+            return queryset
+        return queryset.filter(user=self.request.user)
     
     @action(detail=False, methods=['get'])
     def me(self, request):
@@ -63,12 +63,12 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         except UserProfile.DoesNotExist:
             return Response({"detail": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
-class UserListView(generics.ListAPIView):
+class UserListView(StreamingExportMixin, generics.ListAPIView):
     queryset = User.objects.all()
     serializer_class = UserListSerializer
     permission_classes = [IsAuthenticated]
     throttle_classes = [UserRateThrottle]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetOrPageNumberPagination
     filter_backends = [DjangoFilterBackend, SearchFilter]
     search_fields = ['username', 'email', 'first_name', 'last_name']
     
@@ -77,6 +77,41 @@ class UserListView(generics.ListAPIView):
         queryset = User.objects.all()
         return queryset
 
+
+class UserExportView(UserListView):
+    """Every user matching the list filters, streamed as NDJSON or CSV (?as=csv)."""
+    permission_classes = [IsAdminUser]
+    pagination_class = None
+
+    def get(self, request, *args, **kwargs):
+        return self.export(request, *args, **kwargs)
+
+class UserImportView(APIView):
+    """
+    Create users (and doctors) from an uploaded CSV or NDJSON file, field "file".
+    The format is taken from the "format" field or the file extension.
+    Returns 200 if every row was imported, 207 if some were and 400 if none were.
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, format=None):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': 'Upload a CSV or NDJSON file.'})
+        file_format = request.data.get('format') or guess_format(upload.name)
+        if file_format not in IMPORT_FORMATS:
+            raise ValidationError({'format': f"Choose one of: {', '.join(IMPORT_FORMATS)}."})
+
+        report = UserImport().run(read_rows(upload.file, file_format))
+        if not report['failed']:
+            code = status.HTTP_200_OK
+        elif report['created']:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response(report, status=code)
+
 class RegistrationAPIView(APIView):
     throttle_classes = [ScopedRateThrottle]
     throttle_scope = 'Auth'
@@ -85,10 +120,12 @@ class RegistrationAPIView(APIView):
         serializer = RegistrationSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        # Set user as active by default
-        user = serializer.save(is_active=True)
-        
-        # UserProfile and Patient will be created automatically via signals
+        with transaction.atomic():
+            # Set user as active by default
+            user = serializer.save(is_active=True)
+            # UserProfile and Patient will be created automatically via signals
+            # The mail is sent by a run_tasks worker, not while the user waits.
+            send_verification_email.delay(user_id=user.pk, site=request.build_absolute_uri('/'))
         
         # Generate tokens for immediate login
         tokens = get_tokens_for_user(user)
@@ -103,15 +140,17 @@ class VerityEmailAPIView(APIView):
     throttle_classes = [ScopedRateThrottle]
     throttle_scope = 'Auth'
     def get(self, request, uid, token, format=None):
-        user_id = urlsafe_base64_decode(smart_str(uid))
-        user = User.objects.get(pk=user_id)
+        try:
+            user = User.objects.get(pk=int(urlsafe_base64_decode(smart_str(uid))))
+        except (ValueError, User.DoesNotExist):
+            user = None
 
         # validate the token
         if user is not None and default_token_generator.check_token(user, token):
             user.is_active = True
             user.save()
-            # create paint account
-            Patient.objects.create(user=user)
+            # create paint account, unless the signal already did
+            Patient.objects.get_or_create(user=user)
             return Response(status=status.HTTP_200_OK)
         else:
             return Response(